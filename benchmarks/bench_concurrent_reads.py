@@ -0,0 +1,112 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import models  # noqa: F401 - регистрирует таблицы в Base.metadata
+from benchmarks.corpus import generate_recipes
+from database import Base, ENGINE_PROFILES, make_engine
+from filters import RecipeFilter
+from hydration import get_recipes_data
+from loader import bulk_fill_database
+from models import Recipe
+from pipeline import batched
+
+# нагрузочный тест чтения во время заливки: несколько потоков-читателей делают то же, что
+# /api/generate-recipe (фильтр + загрузка рецепта с ингредиентами), а писатель в это время заливает
+# пачки рецептов, как refill_database. Сравниваются профили движка из database.py.
+# Запуск из корня репозитория: python -m benchmarks.bench_concurrent_reads --size 50000 --readers 8
+
+ANSWERS = {'cooking_time': 'средне', 'meal_type': 'обед', 'difficulty': ''}
+
+
+def reader(session_factory, max_id: int, deadline: float, results: dict, lock: threading.Lock):
+    rnd = random.Random()
+    recipe_filter = RecipeFilter()
+    done = errors = 0
+    latencies = []
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            with session_factory() as db:
+                recipe_filter.apply_filters(db.query(func.count(Recipe.id)), db, ANSWERS).scalar()
+                get_recipes_data(db, [rnd.randint(1, max_id)])
+            done += 1
+            latencies.append(time.perf_counter() - started)
+        except OperationalError:
+            errors += 1
+    with lock:
+        results['reads'] += done
+        results['errors'] += errors
+        results['latencies'].extend(latencies)
+
+
+def writer(session_factory, batch_size: int, deadline: float, results: dict):
+    seed = 1
+    with session_factory() as db, contextlib.redirect_stdout(io.StringIO()):
+        while time.perf_counter() < deadline:
+            bulk_fill_database(db, generate_recipes(batch_size, seed=seed))
+            seed += 1
+            db.expunge_all()
+            results['written'] += batch_size
+
+
+def run(profile_name: str, size: int, readers: int, duration: float, batch_size: int, write: bool) -> dict:
+    profile = ENGINE_PROFILES[profile_name]
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+        engine = make_engine(url, profile)
+        read_engine = make_engine(url, profile, read_only=True)
+        Base.metadata.create_all(bind=engine)
+        session_factory = sessionmaker(autoflush=False, bind=engine)
+        read_session_factory = sessionmaker(autoflush=False, bind=read_engine)
+        with session_factory() as db, contextlib.redirect_stdout(io.StringIO()):
+            for batch in batched(generate_recipes(size), 10000):
+                bulk_fill_database(db, batch)
+
+        results = {'reads': 0, 'errors': 0, 'written': 0, 'latencies': []}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+        threads = [threading.Thread(target=reader, args=(read_session_factory, size, deadline, results, lock))
+                   for _ in range(readers)]
+        if write:
+            threads.append(threading.Thread(target=writer, args=(session_factory, batch_size, deadline, results)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        read_engine.dispose()
+        engine.dispose()
+    return results
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--size', type=int, default=50000)
+    arg_parser.add_argument('--readers', type=int, default=8)
+    arg_parser.add_argument('--duration', type=float, default=10.0)
+    arg_parser.add_argument('--batch-size', type=int, default=500)
+    args = arg_parser.parse_args()
+
+    print(f"{'профиль':<10} {'заливка':<8} {'чтений/с':>10} {'p50':>9} {'p99':>9} {'ошибок':>7} {'записано':>9}")
+    for profile_name in ('legacy', 'default'):
+        for write in (False, True):
+            results = run(profile_name, args.size, args.readers, args.duration, args.batch_size, write)
+            latencies = sorted(results['latencies']) or [0.0]
+            p50 = latencies[len(latencies) // 2]
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(f"{profile_name:<10} {'да' if write else 'нет':<8} {results['reads'] / args.duration:>10.1f} "
+                  f"{p50 * 1000:>6.1f} мс {p99 * 1000:>6.1f} мс {results['errors']:>7} {results['written']:>9}")
+
+
+if __name__ == '__main__':
+    main()
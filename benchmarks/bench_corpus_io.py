@@ -0,0 +1,56 @@
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from benchmarks.corpus import generate_recipes
+from benchmarks.db import temporary_database
+from corpus_io import export_corpus, import_corpus
+from loader import bulk_fill_database
+from pipeline import batched
+
+# развертывание корпуса: заливка сгенерированных рецептов через bulk_fill_database против загрузки
+# готовой выгрузки (corpus_io). Печатает время выгрузки, загрузки и размер файла.
+# Запуск из корня репозитория: python -m benchmarks.bench_corpus_io --size 177000
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--size', type=int, default=100000)
+    arg_parser.add_argument('--batch-size', type=int, default=10000)
+    args = arg_parser.parse_args()
+
+    recipes = generate_recipes(args.size)
+    with tempfile.TemporaryDirectory() as directory, temporary_database() as source:
+        path = os.path.join(directory, 'corpus.jsonl.gz')
+
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for batch in batched(recipes, args.batch_size):
+                bulk_fill_database(source, batch)
+        fill_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with open(path, 'wb') as f:
+            counts = export_corpus(source, f, args.batch_size)
+        export_time = time.perf_counter() - started
+        size = os.path.getsize(path)
+
+        with temporary_database() as target:
+            started = time.perf_counter()
+            with open(path, 'rb') as f, contextlib.redirect_stdout(io.StringIO()):
+                imported = import_corpus(target, f)
+            import_time = time.perf_counter() - started
+
+    assert imported == counts, (imported, counts)
+    print(f"рецептов: {counts['recipes']}, строк связей: {counts['recipe_ingredient'] + counts['recipe_category']}")
+    print(f"размер выгрузки:       {size / 2 ** 20:.1f} МБ")
+    print(f"заливка bulk_fill:     {fill_time:.2f} с")
+    print(f"выгрузка:              {export_time:.2f} с")
+    print(f"загрузка выгрузки:     {import_time:.2f} с")
+
+
+if __name__ == '__main__':
+    main()
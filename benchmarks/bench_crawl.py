@@ -0,0 +1,37 @@
+import argparse
+import time
+
+from benchmarks.stub_server import StubServer
+from crawler import ConcurrentCrawler
+from parsing import RecipeParser
+
+# сравнение последовательного RecipeParser.parsing и ConcurrentCrawler на локальном стабе.
+# Запуск из корня репозитория: python -m benchmarks.bench_crawl --pages 500 --latency 0.05
+
+
+def measure(name: str, func, pages: int):
+    started = time.perf_counter()
+    recipes = func()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<28} {len(recipes):>6} рецептов за {elapsed:8.2f} с  ->  {pages / elapsed:8.1f} стр/с")
+    return recipes
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--pages', type=int, default=300)
+    arg_parser.add_argument('--latency', type=float, default=0.05, help='искусственная задержка ответа стаба, с')
+    arg_parser.add_argument('--concurrency', type=int, nargs='+', default=[4, 16, 64])
+    arg_parser.add_argument('--parse-workers', type=int, default=4)
+    args = arg_parser.parse_args()
+
+    with StubServer(pages=args.pages, latency=args.latency) as server:
+        measure('последовательно', lambda: RecipeParser(server.url).parsing(args.pages), args.pages)
+        for concurrency in args.concurrency:
+            crawler = ConcurrentCrawler(server.url, concurrency=concurrency, rate_per_host=0,
+                                        parse_workers=args.parse_workers)
+            measure(f'конкурентно, {concurrency} потоков', lambda: crawler.crawl(args.pages), args.pages)
+
+
+if __name__ == '__main__':
+    main()
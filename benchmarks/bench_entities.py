@@ -0,0 +1,98 @@
+import argparse
+import gc
+import pickle
+import tracemalloc
+
+from benchmarks.corpus import generate_corpus
+from entities import IngredientBase, RecipeBase
+from parsing import BASE_URL, RecipeParser, recipe_to_record
+
+# память под разобранные рецепты на каждые 10 тысяч: прежние классы с атрибутами на уровне класса
+# (у каждого экземпляра свой __dict__), классы со слотами из entities.py и кортежи RecipeRecord.
+# Строки у всех вариантов общие, поэтому отдельно считается память только под сами объекты.
+# Запуск из корня репозитория: python -m benchmarks.bench_entities --size 10000
+
+
+class LegacyIngredientBase:
+    ingredient_name = None
+    ingredient_quantity = None
+    ingredient_unit = None
+
+
+class LegacyRecipeBase:
+    recipe_name = None
+    ingredients = None
+    number_of_servings = None
+    cooking_time = None
+    categories = None
+    description = None
+    source_rid = None
+
+
+def to_legacy(recipe: RecipeBase) -> LegacyRecipeBase:
+    legacy = LegacyRecipeBase()
+    for field in ('recipe_name', 'number_of_servings', 'cooking_time', 'categories', 'description', 'source_rid'):
+        setattr(legacy, field, getattr(recipe, field))
+    legacy.ingredients = []
+    for ingredient in recipe.ingredients:
+        legacy_ingredient = LegacyIngredientBase()
+        legacy_ingredient.ingredient_name = ingredient.ingredient_name
+        legacy_ingredient.ingredient_quantity = ingredient.ingredient_quantity
+        legacy_ingredient.ingredient_unit = ingredient.ingredient_unit
+        legacy.ingredients.append(legacy_ingredient)
+    return legacy
+
+
+def to_slotted(recipe: RecipeBase) -> RecipeBase:
+    return RecipeBase(
+        recipe.recipe_name,
+        [IngredientBase(i.ingredient_name, i.ingredient_quantity, i.ingredient_unit) for i in recipe.ingredients],
+        recipe.number_of_servings, recipe.cooking_time, recipe.categories, recipe.description, recipe.source_rid
+    )
+
+
+# сколько байт выделяется под список convert(recipe) для всех рецептов
+def allocated(convert, recipes) -> int:
+    gc.collect()
+    tracemalloc.start()
+    converted = [convert(recipe) for recipe in recipes]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del converted
+    return size
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--size', type=int, default=10000)
+    args = arg_parser.parse_args()
+
+    parser = RecipeParser(BASE_URL)
+    pages = generate_corpus(args.size)
+    recipes = [parser.parse_html(html, rid) for rid, html in pages]
+    ingredients = sum(len(recipe.ingredients) for recipe in recipes)
+
+    gc.collect()
+    tracemalloc.start()
+    parsed = [parser.parse_html(html, rid) for rid, html in pages]
+    total = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del parsed
+
+    scale = 10000 / args.size
+    print(f"рецептов: {args.size}, ингредиентов: {ingredients}")
+    print(f"разобранные рецепты целиком (со строками): {total * scale / 2 ** 20:.1f} МБ на 10 тыс.")
+    print(f"{'представление':<32} {'объекты, МБ на 10 тыс.':>24} {'pickle, МБ':>12}")
+    rows = [
+        ('атрибуты класса + __dict__', to_legacy),
+        ('dataclass(slots=True)', to_slotted),
+        ('RecipeRecord (NamedTuple)', recipe_to_record),
+    ]
+    for name, convert in rows:
+        size = allocated(convert, recipes)
+        pickled = len(pickle.dumps([convert(recipe) for recipe in recipes[:1000]])) * args.size / min(1000, args.size)
+        print(f"{name:<32} {size * scale / 2 ** 20:>24.2f} {pickled * scale / 2 ** 20:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import statistics
+import tempfile
+import time
+
+from bs4 import BeautifulSoup
+
+from benchmarks.corpus import load_corpus, save_corpus
+from parsing import RecipeParser
+
+# время разбора одной страницы: построение дерева BeautifulSoup и извлечение рецепта из него.
+# Страницы берутся из папки с сохраненными html (--corpus) или генерируются во временную папку.
+# Запуск из корня репозитория: python -m benchmarks.bench_extract --pages 2000
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def run(pages) -> dict:
+    parser = RecipeParser('')
+    build, total = [], []
+    for rid, html in pages:
+        started = time.perf_counter()
+        BeautifulSoup(html, 'lxml')
+        build.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        parser.parse_html(html, rid)
+        total.append(time.perf_counter() - started)
+    extract = [t - b for t, b in zip(total, build)]
+    return {'build': build, 'extract': extract, 'total': total}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--corpus', help='папка с сохраненными страницами <rid>.html')
+    arg_parser.add_argument('--pages', type=int, default=2000)
+    args = arg_parser.parse_args()
+
+    if args.corpus:
+        pages = load_corpus(args.corpus)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            save_corpus(directory, args.pages)
+            pages = load_corpus(directory)
+
+    results = run(pages)
+    print(f"страниц: {len(pages)}")
+    for stage, title in (('build', 'дерево BeautifulSoup'), ('extract', 'извлечение рецепта'), ('total', 'всего')):
+        values = [v * 1000 for v in results[stage]]
+        print(f"{title:<22} среднее {statistics.mean(values):7.3f} мс  "
+              f"p50 {percentile(values, 0.5):7.3f} мс  p95 {percentile(values, 0.95):7.3f} мс")
+
+
+if __name__ == '__main__':
+    main()
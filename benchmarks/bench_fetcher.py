@@ -0,0 +1,68 @@
+import argparse
+import contextlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from benchmarks.stub_server import StubServer
+from fetcher import Fetcher, AIMDController, FETCH_OK, FETCH_MISSING, FETCH_FAILED
+from parsing import HEADERS
+
+# загрузка страниц со сбоящего стаба: без повторов и с фиксированным числом потоков (как качали раньше)
+# против Fetcher с повторами и окном AIMD. Стаб выдерживает capacity одновременных запросов, сверх
+# этого отвечает 503, и еще случайно отвечает 429/500 или зависает дольше таймаута клиента.
+# Печатает, сколько страниц скачано и потеряно, сколько запросов и сбоев было, итоговое окно
+# и наибольшее число одновременных запросов на стабе.
+# Запуск из корня репозитория: python -m benchmarks.bench_fetcher --pages 500 --capacity 8
+
+
+def run(name: str, server: StubServer, pages: int, threads: int, **fetcher_args):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=threads)
+    session.mount('http://', adapter)
+    fetcher = Fetcher(session, server.url, headers=HEADERS, seed=0, **fetcher_args)
+    requests_before = server.requests_served
+    faults_before = sum(server.faults.values())
+    server.peak_in_flight = 0
+
+    started = time.perf_counter()
+    # загрузчик печатает каждую неудачную попытку
+    with ThreadPoolExecutor(max_workers=threads) as pool, contextlib.redirect_stdout(io.StringIO()):
+        results = list(pool.map(fetcher.fetch, range(1, pages + 1)))
+    elapsed = time.perf_counter() - started
+
+    by_status = {status: sum(result.status == status for result in results)
+                 for status in (FETCH_OK, FETCH_MISSING, FETCH_FAILED)}
+    print(f"{name:<24} {by_status[FETCH_OK]:>8} {by_status[FETCH_FAILED]:>10} "
+          f"{server.requests_served - requests_before:>9} {sum(server.faults.values()) - faults_before:>7} "
+          f"{fetcher.controller.limit:>6} {server.peak_in_flight:>8} {elapsed:>8.2f}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--pages', type=int, default=500)
+    arg_parser.add_argument('--threads', type=int, default=32)
+    arg_parser.add_argument('--latency', type=float, default=0.02)
+    arg_parser.add_argument('--capacity', type=int, default=8)
+    arg_parser.add_argument('--throttle-rate', type=float, default=0.02)
+    arg_parser.add_argument('--error-rate', type=float, default=0.03)
+    arg_parser.add_argument('--stall-rate', type=float, default=0.01)
+    arg_parser.add_argument('--retry-after', type=int, default=1)
+    args = arg_parser.parse_args()
+
+    timeout = (1.0, 1.0)
+    with StubServer(args.pages, args.latency, capacity=args.capacity, throttle_rate=args.throttle_rate,
+                    error_rate=args.error_rate, stall_rate=args.stall_rate, stall=2 * timeout[1],
+                    retry_after=args.retry_after) as server:
+        print(f"{'способ':<24} {'скачано':>8} {'потеряно':>10} {'запросов':>9} {'сбоев':>7} {'окно':>6} {'пик':>8} {'время, с':>8}")
+        fixed = AIMDController(args.threads, minimum=args.threads, maximum=args.threads)
+        run('без повторов', server, args.pages, args.threads, timeout=timeout, retries=0, controller=fixed)
+        run('повторы и AIMD', server, args.pages, args.threads, timeout=timeout,
+            controller=AIMDController(4, maximum=args.threads))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+import argparse
+import contextlib
+import io
+import time
+
+from benchmarks.corpus import generate_recipes
+from benchmarks.db import temporary_database
+from loader import bulk_fill_database, fill_database_rowwise
+
+# сравнение построчного fill_database_rowwise и bulk_fill_database на синтетических рецептах.
+# Запуск из корня репозитория: python -m benchmarks.bench_fill --sizes 1000 10000 100000
+# Построчный путь квадратичный, поэтому по умолчанию на размерах больше --rowwise-max он пропускается
+
+
+def measure(fill, recipes) -> float:
+    with temporary_database() as db, contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        fill(db, recipes)
+        return time.perf_counter() - started
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    arg_parser.add_argument('--rowwise-max', type=int, default=10000)
+    args = arg_parser.parse_args()
+
+    print(f"{'рецептов':>10} {'построчно, с':>14} {'пачками, с':>12} {'ускорение':>10}")
+    for size in args.sizes:
+        recipes = generate_recipes(size)
+        bulk = measure(bulk_fill_database, recipes)
+        if size <= args.rowwise_max:
+            rowwise = measure(fill_database_rowwise, recipes)
+            print(f"{size:>10} {rowwise:>14.2f} {bulk:>12.2f} {rowwise / bulk:>9.1f}x")
+        else:
+            print(f"{size:>10} {'-':>14} {bulk:>12.2f} {'-':>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import contextlib
+import io
+import itertools
+import statistics
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import or_, func
+from sqlalchemy.orm import Session
+
+from benchmarks.corpus import generate_recipes
+from benchmarks.db import temporary_database
+from filters import FilterConfig, RecipeFilter
+from loader import bulk_fill_database
+from models import Recipe, Category, recipe_category, recipe_ingredient
+from pipeline import batched
+
+# задержка фильтров генератора на всех 27 комбинациях ответов: прежние LIKE/GROUP BY подзапросы
+# против индексируемых колонок, посчитанных при заливке.
+# Запуск из корня репозитория: python -m benchmarks.bench_filters --size 100000
+
+
+# фильтр в том виде, в котором он был до материализованных колонок
+class LegacyRecipeFilter(RecipeFilter):
+    def __init__(self):
+        self.filters = {
+            'cooking_time': FilterConfig(
+                name='cooking_time',
+                filter_func=self._filter_cooking_time,
+                requires_db=False
+            ),
+            'meal_type': FilterConfig(
+                name='meal_type',
+                filter_func=self._filter_meal_type,
+                requires_db=True
+            ),
+            'difficulty': FilterConfig(
+                name='difficulty',
+                filter_func=self._filter_difficulty,
+                requires_db=True
+            )
+        }
+
+        self._cooking_time_map = {
+            'быстро': ['15', '20', '25', '30', 'мин'],
+            'средне': ['40', '45', '50', '55', '60', 'час'],
+            'долго': ['1.5', '2', '3', 'час']
+        }
+
+        self._meal_type_map = {
+            'завтрак': ['завтрак', 'breakfast', 'утро'],
+            'обед': ['обед', 'lunch', 'первое', 'второе'],
+            'ужин': ['ужин', 'dinner', 'вечер']
+        }
+
+        self._difficulty_map = {
+            'легко': ('<=', 5),
+            'тяжело': ('>', 8)
+        }
+
+    def apply_filters(self, query, db: Session, answers: Dict[str, str]):
+        """Применяет все активные фильтры"""
+        for filter_key, filter_config in self.filters.items():
+            if filter_key in answers and answers[filter_key]:
+                query = filter_config.filter_func(
+                    query,
+                    db if filter_config.requires_db else None,
+                    answers[filter_key]
+                )
+        return query
+
+    def _filter_cooking_time(self, query, db: Optional[Session], cooking_time: str):
+        if cooking_time in self._cooking_time_map:
+            filters = [Recipe.cooking_time.contains(term)
+                       for term in self._cooking_time_map[cooking_time]]
+            return query.filter(or_(*filters))
+        return query
+
+    def _filter_meal_type(self, query, db: Session, meal_type: str):
+        if meal_type in self._meal_type_map:
+            category_filters = self._meal_type_map[meal_type]
+            meal_recipe_ids = db.query(Recipe.id) \
+                .join(recipe_category) \
+                .join(Category) \
+                .filter(or_(*[Category.name.ilike(f'%{cat}%') for cat in category_filters])) \
+                .distinct() \
+                .subquery()
+            return query.filter(Recipe.id.in_(meal_recipe_ids))
+        return query
+
+    def _filter_difficulty(self, query, db: Session, difficulty: str):
+        if difficulty in self._difficulty_map:
+            operator, threshold = self._difficulty_map[difficulty]
+            subquery = db.query(Recipe.id) \
+                .join(recipe_ingredient) \
+                .group_by(Recipe.id)
+
+            if operator == '<=':
+                subquery = subquery.having(func.count(func.distinct(recipe_ingredient.c.ingredient_id)) <= threshold)
+            else:
+                subquery = subquery.having(func.count(func.distinct(recipe_ingredient.c.ingredient_id)) > threshold)
+
+            return query.filter(Recipe.id.in_(subquery.subquery()))
+        return query
+
+
+def measure(recipe_filter, db, repeats: int) -> Dict[tuple, float]:
+    timings = {}
+    answers_grid = itertools.product(['быстро', 'средне', 'долго'], ['завтрак', 'обед', 'ужин'], ['легко', 'средне', 'тяжело'])
+    for cooking_time, meal_type, difficulty in answers_grid:
+        answers = {'cooking_time': cooking_time, 'meal_type': meal_type, 'difficulty': difficulty}
+        samples = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            recipe_filter.apply_filters(db.query(Recipe.id), db, answers).all()
+            samples.append(time.perf_counter() - started)
+        timings[(cooking_time, meal_type, difficulty)] = statistics.median(samples)
+    return timings
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--size', type=int, default=100000)
+    arg_parser.add_argument('--repeats', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    with temporary_database() as db:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for batch in batched(generate_recipes(args.size), 10000):
+                bulk_fill_database(db, batch)
+
+        before = measure(LegacyRecipeFilter(), db, args.repeats)
+        after = measure(RecipeFilter(), db, args.repeats)
+
+    print(f"рецептов: {args.size}, медиана по {args.repeats} запускам на комбинацию")
+    print(f"{'ответы':<32} {'LIKE/GROUP BY, мс':>18} {'колонки, мс':>12}")
+    for key in before:
+        print(f"{' / '.join(key):<32} {before[key] * 1000:>18.1f} {after[key] * 1000:>12.1f}")
+    print(f"{'среднее':<32} {statistics.mean(before.values()) * 1000:>18.1f} "
+          f"{statistics.mean(after.values()) * 1000:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
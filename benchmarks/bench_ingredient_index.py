@@ -0,0 +1,103 @@
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import time
+import tracemalloc
+
+from sqlalchemy import select, func
+
+from benchmarks.corpus import generate_recipes
+from benchmarks.db import temporary_database
+from ingredient_index import IngredientIndex
+from loader import bulk_fill_database
+from models import Recipe, recipe_ingredient
+from pipeline import batched
+
+# подбор рецептов по ингредиентам: GROUP BY по recipe_ingredient в SQLite против инвертированного
+# индекса из ingredient_index.py. Память индекса, время сборки и медианное время запроса.
+# Запуск из корня репозитория: python -m benchmarks.bench_ingredient_index --size 177000
+
+
+def sql_overlapping(db, ingredient_ids, min_matches: int):
+    matches = func.count(recipe_ingredient.c.ingredient_id)
+    return db.execute(
+        select(recipe_ingredient.c.recipe_id, matches)
+        .where(recipe_ingredient.c.ingredient_id.in_(ingredient_ids))
+        .group_by(recipe_ingredient.c.recipe_id)
+        .having(matches >= min_matches)
+    ).all()
+
+
+def sql_cookable(db, ingredient_ids):
+    matches = func.count(recipe_ingredient.c.ingredient_id)
+    return db.execute(
+        select(recipe_ingredient.c.recipe_id)
+        .join(Recipe, Recipe.id == recipe_ingredient.c.recipe_id)
+        .where(recipe_ingredient.c.ingredient_id.in_(ingredient_ids))
+        .group_by(recipe_ingredient.c.recipe_id)
+        .having(matches >= func.max(Recipe.ingredient_count))
+    ).all()
+
+
+def measure(func, queries, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        for query in queries:
+            started = time.perf_counter()
+            func(query)
+            times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--size', type=int, default=177000)
+    arg_parser.add_argument('--vocabulary', type=int, default=500)
+    arg_parser.add_argument('--queries', type=int, default=20)
+    arg_parser.add_argument('--repeats', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    rng = random.Random(0)
+    with temporary_database() as db:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for batch in batched(generate_recipes(args.size, args.vocabulary), 10000):
+                bulk_fill_database(db, batch)
+
+        index = IngredientIndex()
+        tracemalloc.start()
+        started = time.perf_counter()
+        index.build(db)
+        build_time = time.perf_counter() - started
+        build_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        stats = index.stats()
+        print(f"индекс: {stats['ingredients']} ингредиентов, {stats['postings']} связей, "
+              f"{stats['memory_bytes'] / 2 ** 20:.1f} МБ; сборка {build_time:.2f} с, пик {build_peak / 2 ** 20:.1f} МБ")
+
+        # ингредиенты в синтетическом корпусе равновероятны, поэтому берем случайные id словаря
+        vocabulary = list(range(1, stats['ingredients'] + 1))
+        small = [rng.sample(vocabulary, 3) for _ in range(args.queries)]
+        pantry = [rng.sample(vocabulary, 40) for _ in range(args.queries)]
+
+        rows = [
+            ('все из 3', lambda ids: db.execute(select(recipe_ingredient.c.recipe_id)
+                                               .where(recipe_ingredient.c.ingredient_id.in_(ids))
+                                               .group_by(recipe_ingredient.c.recipe_id)
+                                               .having(func.count() >= len(ids))).all(),
+             index.containing_all, small),
+            ('хотя бы 2 из 3', lambda ids: sql_overlapping(db, ids, 2),
+             lambda ids: index.overlapping(ids, 2), small),
+            ('из 40 продуктов', lambda ids: sql_cookable(db, ids),
+             lambda ids: index.cookable_with(ids), pantry),
+        ]
+        print(f"{'запрос':<20} {'SQL':>12} {'индекс':>12}")
+        for name, sql_func, index_func, queries in rows:
+            sql_time = measure(sql_func, queries, args.repeats)
+            index_time = measure(index_func, queries, args.repeats)
+            print(f"{name:<20} {sql_time * 1000:>9.2f} мс {index_time * 1000:>9.2f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import time
+
+from benchmarks.corpus import generate_recipes
+from normalize import canonical_ingredient
+from parsing import get_all_ingredients, get_ingredients_and_recipe_db_table
+
+# построение строк recipe|ingredient: прежний вариант через search_string_in_string_list
+# (линейный поиск по словарю на каждое вхождение) против NameIndex.
+# Запуск из корня репозитория: python -m benchmarks.bench_link_tables --sizes 1000 10000
+
+
+# прежняя parsing.search_string_in_string_list: индекс искомой строки в массиве + 1
+def search_string_in_string_list(list, finding_string: str) -> int:
+    if finding_string not in list:
+        raise RuntimeError('Array does not contain the given string')
+    for i in range(len(list)):
+        if list[i] == finding_string:
+            return i + 1
+
+
+def linear_scan_table(recipes) -> list:
+    result_list = []
+    ingredients_list = list(get_all_ingredients(recipes))
+    for i in range(len(recipes)):
+        for ingredient in recipes[i].ingredients:
+            result_list.append({
+                'recipe_id': i + 1,
+                'ingredient_id': search_string_in_string_list(ingredients_list,
+                                                              canonical_ingredient(ingredient.ingredient_name)),
+                'quantity': ingredient.ingredient_quantity,
+                'unit': ingredient.ingredient_unit
+            })
+    return result_list
+
+
+def timed(func, recipes) -> float:
+    started = time.perf_counter()
+    func(recipes)
+    return time.perf_counter() - started
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    arg_parser.add_argument('--vocabulary', type=int, default=5000)
+    args = arg_parser.parse_args()
+
+    print(f"{'рецептов':>10} {'линейный поиск, с':>18} {'NameIndex, с':>13} {'ускорение':>10}")
+    for size in args.sizes:
+        recipes = generate_recipes(size, args.vocabulary)
+        before = timed(linear_scan_table, recipes)
+        after = timed(get_ingredients_and_recipe_db_table, recipes)
+        print(f"{size:>10} {before:>18.3f} {after:>13.3f} {before / after:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import argparse
+import random
+import re
+import time
+
+from benchmarks.corpus import QUANTITIES, UNITS
+from normalize import parse_quantity, split_quantity_unit, canonical_unit, normalize_ingredients, canonical_units
+
+# разбор строк "количество единицы" нового формата ("1 ¼ ст. л."): прежние методы RecipeParser
+# против normalize.py по одной строке и столбцом. Печатает строки в секунду и число строк, на которых
+# разбор упал. Запуск из корня репозитория: python -m benchmarks.bench_normalize --size 1000000
+
+
+# прежний RecipeParser.__extract_quantity_and_unit
+def legacy_extract_quantity_and_unit(quantity_unit):
+    quantity, unit = '', ''
+    for i in range(len(quantity_unit) - 1):
+        if (quantity_unit[i] == ' ' or quantity_unit[i] == '\t') and (ord(quantity_unit[i + 1]) >= 1040 and ord(quantity_unit[i + 1]) <= 1103):
+            unit = quantity_unit[i+1:]
+            break
+        else:
+            quantity += quantity_unit[i]
+    return quantity, unit
+
+
+# прежний RecipeParser.__convert_quantity_from_str_to_float
+def legacy_convert_quantity(quantity):
+    result = 0
+    quantity = re.sub(r'[a-zA-Zа-яА-Я]', '', quantity)
+    quantity = quantity.replace(',', ' ')
+    quantity = quantity.replace('.', ' ')
+    quantity = quantity.strip()
+    quantity = quantity.replace(' ', '.')
+    if quantity == '':
+        return 0
+    if '-' in quantity:
+        parts = quantity.split('-', 1)
+        for part in parts:
+            result += float(part)
+        return result / len(parts)
+    elif '—' in quantity:
+        parts = quantity.split('—', 1)
+        for part in parts:
+            result += float(part)
+        return result / len(parts)
+    return float(quantity)
+
+
+def run_legacy(values):
+    failed = 0
+    for value in values:
+        quantity, unit = legacy_extract_quantity_and_unit(value)
+        try:
+            legacy_convert_quantity(quantity)
+        except ValueError:
+            failed += 1
+    return failed
+
+
+def run_scalar(values):
+    for value in values:
+        quantity, unit = split_quantity_unit(value)
+        parse_quantity(quantity)
+        canonical_unit(unit)
+    return 0
+
+
+def run_batch(values):
+    quantities, units = normalize_ingredients(values)
+    canonical_units(units)
+    return 0
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--size', type=int, default=1000000)
+    args = arg_parser.parse_args()
+
+    rnd = random.Random(0)
+    values = [f'{rnd.choice(QUANTITIES)} {rnd.choice(UNITS)}' for _ in range(args.size)]
+
+    print(f"строк: {len(values)}, различных: {len(set(values))}")
+    print(f"{'способ':<22} {'строк/с':>12} {'ошибок':>8}")
+    for name, func in (('прежние методы', run_legacy), ('normalize по строке', run_scalar),
+                       ('normalize столбцом', run_batch)):
+        started = time.perf_counter()
+        failed = func(values)
+        elapsed = time.perf_counter() - started
+        print(f"{name:<22} {len(values) / elapsed:>12,.0f} {failed:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import contextlib
+import io
+import statistics
+import time
+
+from benchmarks.corpus import generate_recipes
+from benchmarks.db import temporary_database
+from loader import bulk_fill_database
+from models import Recipe
+from pipeline import batched
+
+# страница списка рецептов на разной глубине: LIMIT/OFFSET против курсора по id (как в /api/recipes).
+# Запуск из корня репозитория: python -m benchmarks.bench_pagination --size 100000 --limit 50
+
+COLUMNS = (Recipe.id, Recipe.recipe_name, Recipe.number_of_servings, Recipe.cooking_time, Recipe.description)
+
+
+def page_by_offset(db, offset: int, limit: int):
+    return db.query(*COLUMNS).order_by(Recipe.id).offset(offset).limit(limit).all()
+
+
+def page_by_cursor(db, cursor: int, limit: int):
+    return db.query(*COLUMNS).filter(Recipe.id > cursor).order_by(Recipe.id).limit(limit).all()
+
+
+def measure(func, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--size', type=int, default=100000)
+    arg_parser.add_argument('--limit', type=int, default=50)
+    arg_parser.add_argument('--repeats', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    with temporary_database() as db:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for batch in batched(generate_recipes(args.size), 10000):
+                bulk_fill_database(db, batch)
+
+        print(f"{'глубина':>10} {'OFFSET':>12} {'курсор':>12}")
+        for depth in (0, args.size // 10, args.size // 2, args.size - args.limit):
+            # курсор для той же страницы - id последней строки перед ней
+            cursor = db.query(Recipe.id).order_by(Recipe.id).offset(depth - 1).limit(1).scalar() if depth else 0
+            offset_time = measure(lambda: page_by_offset(db, depth, args.limit), args.repeats)
+            cursor_time = measure(lambda: page_by_cursor(db, cursor, args.limit), args.repeats)
+            print(f"{depth:>10} {offset_time * 1000:>9.2f} мс {cursor_time * 1000:>9.2f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.corpus import load_corpus, save_corpus
+from parse_pool import ParseStage, parse_page
+
+# масштабирование стадии разбора по числу процессов на папке сохраненных страниц.
+# Запуск из корня репозитория: python -m benchmarks.bench_parse_pool --workers 1 2 4 8
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--corpus', help='папка с сохраненными страницами <rid>.html')
+    arg_parser.add_argument('--pages', type=int, default=4000)
+    arg_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1])
+    arg_parser.add_argument('--chunksize', type=int, default=16)
+    args = arg_parser.parse_args()
+
+    if args.corpus:
+        pages = load_corpus(args.corpus)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            save_corpus(directory, args.pages)
+            pages = load_corpus(directory)
+
+    started = time.perf_counter()
+    parsed = sum(1 for page in pages if parse_page(page))
+    baseline = len(pages) / (time.perf_counter() - started)
+    print(f"ядер: {os.cpu_count()}, страниц: {len(pages)}, разобрано: {parsed}")
+    print(f"{'без пула':<14} {baseline:9.1f} стр/с")
+
+    for workers in sorted(set(args.workers)):
+        with ParseStage(workers, args.chunksize) as stage:
+            started = time.perf_counter()
+            parsed = sum(1 for record in stage.map(pages) if record)
+            rate = len(pages) / (time.perf_counter() - started)
+        print(f"{workers:>2} процессов   {rate:9.1f} стр/с  ({rate / baseline:4.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import time
+import tracemalloc
+
+from benchmarks.corpus import generate_recipes
+from benchmarks.db import temporary_database
+from filters import RecipeFilter, pick_random_recipe
+from loader import bulk_fill_database
+from models import Recipe
+from pipeline import batched
+
+# выбор случайного рецепта для /api/generate-recipe: прежний query.all() + random.choice против
+# pick_random_recipe (count + случайное смещение). Время и пик памяти на один запрос.
+# Запуск из корня репозитория: python -m benchmarks.bench_random_pick --sizes 10000 100000
+
+ANSWERS = {'cooking_time': 'долго', 'meal_type': '', 'difficulty': ''}
+
+
+def pick_all_then_choice(db, query):
+    recipes = query.all()
+    return random.choice(recipes) if recipes else None
+
+
+def measure(pick, db, repeats: int):
+    recipe_filter = RecipeFilter()
+    times, peaks = [], []
+    for _ in range(repeats):
+        db.expunge_all()
+        query = recipe_filter.apply_filters(db.query(Recipe), db, ANSWERS)
+        tracemalloc.start()
+        started = time.perf_counter()
+        pick(db, query)
+        times.append(time.perf_counter() - started)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return statistics.median(times), max(peaks)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    arg_parser.add_argument('--repeats', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    print(f"{'рецептов':>10} {'all()+choice':>24} {'count+offset':>24}")
+    for size in args.sizes:
+        with temporary_database() as db:
+            with contextlib.redirect_stdout(io.StringIO()):
+                for batch in batched(generate_recipes(size), 10000):
+                    bulk_fill_database(db, batch)
+            old_time, old_peak = measure(pick_all_then_choice, db, args.repeats)
+            new_time, new_peak = measure(pick_random_recipe, db, args.repeats)
+        print(f"{size:>10} {old_time * 1000:>9.1f} мс {old_peak / 2 ** 20:>8.1f} МБ "
+              f"{new_time * 1000:>9.1f} мс {new_peak / 2 ** 20:>8.2f} МБ")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import generate_recipes
+from benchmarks.stub_server import StubServer
+
+# задержка /api/generate-recipe, пока идет перезаполнение БД. Приложение крутится в том же event loop,
+# что и клиент (httpx + ASGITransport), поэтому любая блокирующая работа в loop сразу видна в задержке.
+# Фазы: без заливки; заливка фоновой задачей (POST /refill_database/ + опрос GET /refill_database/{id});
+# та же заливка, вызванная прямо в event loop, как это делала прежняя async ручка.
+# Запуск из корня репозитория: python -m benchmarks.bench_refill_latency --pages 300
+
+ANSWERS = {'cooking_time': 'средне', 'meal_type': '', 'difficulty': ''}
+
+
+async def sample_latency(client, stop: asyncio.Event, interval: float) -> list:
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.post('/api/generate-recipe', json=ANSWERS)
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+def report(name: str, latencies: list, elapsed: float, output):
+    latencies = sorted(latencies) or [0.0]
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<28} {elapsed:>6.1f} с {len(latencies):>6} {p50 * 1000:>8.1f} мс {p99 * 1000:>8.1f} мс "
+          f"{latencies[-1] * 1000:>8.1f} мс", file=output)
+
+
+async def phase(client, name: str, work, interval: float, output):
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_latency(client, stop, interval))
+    started = time.perf_counter()
+    await work()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    report(name, await sampler, elapsed, output)
+
+
+async def run(args, main, output):
+    import httpx
+    from jobs import Job
+
+    params = {'count': args.pages, 'concurrency': 1, 'batch_size': 50, 'incremental': True,
+              'parse_processes': 0, 'cache_mode': None}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=600) as client:
+        async def idle():
+            await asyncio.sleep(args.idle)
+
+        async def background_refill():
+            query = {key: value for key, value in params.items() if value is not None}
+            response = await client.post('/refill_database/', params=query)
+            response.raise_for_status()
+            job_id = response.json()['job_id']
+            while True:
+                status = (await client.get(f'/refill_database/{job_id}')).json()
+                if status['status'] in ('done', 'failed'):
+                    break
+                await asyncio.sleep(0.2)
+
+        async def inline_refill():
+            # как прежняя async def ручка: вся заливка выполняется прямо в event loop
+            await asyncio.sleep(0)
+            main.run_refill(Job('refill', params), **params)
+
+        print(f"{'фаза':<28} {'время':>8} {'запросов':>6} {'p50':>11} {'p99':>11} {'max':>11}", file=output)
+        await phase(client, 'без заливки', idle, args.interval, output)
+        await phase(client, 'фоновая задача', background_refill, args.interval, output)
+        await phase(client, 'заливка в event loop', inline_refill, args.interval, output)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--pages', type=int, default=300)
+    arg_parser.add_argument('--latency', type=float, default=0.01, help='задержка ответа стаба, с')
+    arg_parser.add_argument('--recipes', type=int, default=20000, help='рецептов в БД до начала заливки')
+    arg_parser.add_argument('--idle', type=float, default=3.0)
+    arg_parser.add_argument('--interval', type=float, default=0.02, help='пауза между запросами, с')
+    args = arg_parser.parse_args()
+
+    repository = os.getcwd()
+    # каждая заливка дообходит по pages страниц после предыдущей, поэтому на стабе их вдвое больше
+    with tempfile.TemporaryDirectory() as directory, StubServer(args.pages * 2, args.latency) as server:
+        # main создает recipes.db в текущей папке и ищет рядом static и templates
+        os.symlink(os.path.join(repository, 'static'), os.path.join(directory, 'static'))
+        os.symlink(os.path.join(repository, 'templates'), os.path.join(directory, 'templates'))
+        os.chdir(directory)
+        os.environ['RECIPES_SOURCE_URL'] = server.url
+        sys.path.insert(0, repository)
+        try:
+            import main as app_main
+            from loader import bulk_fill_database
+            from pipeline import batched
+            with app_main.session_local() as db, contextlib.redirect_stdout(io.StringIO()):
+                for batch in batched(generate_recipes(args.recipes), 10000):
+                    bulk_fill_database(db, batch)
+            # сообщения заливки глушим, таблицу печатаем в настоящий stdout
+            output = sys.stdout
+            with contextlib.redirect_stdout(io.StringIO()):
+                asyncio.run(run(args, app_main, output))
+        finally:
+            os.chdir(repository)
+
+
+if __name__ == '__main__':
+    main()
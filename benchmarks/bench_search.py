@@ -0,0 +1,66 @@
+import argparse
+import contextlib
+import io
+import statistics
+import time
+
+from sqlalchemy import or_, exists
+
+from benchmarks.corpus import generate_recipes
+from benchmarks.db import temporary_database
+from loader import bulk_fill_database
+from models import Recipe, Ingredient, recipe_ingredient
+from pipeline import batched
+from search import search_recipes
+
+# поиск рецептов по слову: LIKE '%слово%' по названию, описанию и ингредиентам против FTS5 индекса
+# из search.py. Чтобы ранжировать результаты, LIKE должен найти все совпадения, поэтому он
+# выбирает их все (с LIMIT без сортировки он бы останавливался на первых попавшихся). Запуск из корня репозитория: python -m benchmarks.bench_search --size 177000
+
+QUERIES = ['Картофель', 'говядины', 'Лавровый лист', 'рецепт']
+
+
+def search_like(db, word: str):
+    pattern = f'%{word}%'
+    has_ingredient = exists().where(
+        recipe_ingredient.c.recipe_id == Recipe.id,
+        recipe_ingredient.c.ingredient_id == Ingredient.id,
+        Ingredient.ingredient_name.like(pattern)
+    )
+    return db.query(Recipe.id).filter(
+        or_(Recipe.recipe_name.like(pattern), Recipe.description.like(pattern), has_ingredient)
+    ).all()
+
+
+def measure(func, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--size', type=int, default=177000)
+    arg_parser.add_argument('--limit', type=int, default=20)
+    arg_parser.add_argument('--repeats', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    with temporary_database() as db:
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for batch in batched(generate_recipes(args.size), 10000):
+                bulk_fill_database(db, batch)
+        print(f"заливка {args.size} рецептов вместе с индексом: {time.perf_counter() - started:.1f} с")
+
+        print(f"{'запрос':<24} {'LIKE':>12} {'FTS5 + bm25':>14}")
+        for word in QUERIES:
+            like_time = measure(lambda: search_like(db, word), args.repeats)
+            fts_time = measure(lambda: search_recipes(db, word, args.limit), args.repeats)
+            print(f"{word:<24} {like_time * 1000:>9.2f} мс {fts_time * 1000:>11.2f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import random
+import time
+
+from benchmarks.corpus import INGREDIENTS
+from normalize import INGREDIENT_ALIASES, canonical_ingredient, canonical_ingredients
+
+# словарь ингредиентов: сколько различных названий остается после приведения к словарной форме и
+# сколько названий в секунду она обрабатывает. Названия - продукты из корпуса в разных написаниях
+# (регистр, ё, примечания в скобках, синонимы), как они встречаются на сайте.
+# Запуск из корня репозитория: python -m benchmarks.bench_vocabulary --size 1000000
+
+NOTES = ['по вкусу', 'для подачи', 'свежий', 'комнатной температуры', 'для смазывания', 'можно заменить']
+
+
+def spelling(rnd: random.Random, name: str) -> str:
+    aliases = INGREDIENT_ALIASES.get(name.lower(), [])
+    if aliases and rnd.random() < 0.3:
+        name = rnd.choice(aliases)
+    if rnd.random() < 0.3:
+        name = name.lower()
+    elif rnd.random() < 0.3:
+        name = name.capitalize()
+    if rnd.random() < 0.2:
+        name = name.replace('е', 'ё', 1)
+    if rnd.random() < 0.3:
+        name = f'{name} ({rnd.choice(NOTES)})'
+    return name
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--size', type=int, default=1000000)
+    args = arg_parser.parse_args()
+
+    rnd = random.Random(0)
+    names = [spelling(rnd, rnd.choice(INGREDIENTS)) for _ in range(args.size)]
+    print(f"названий: {len(names)}, различных: {len(set(names))}, "
+          f"в словарной форме: {len(set(canonical_ingredients(names).tolist()))}")
+
+    print(f"{'способ':<28} {'названий/с':>12}")
+    distinct = list(set(names))
+    canonical_ingredient.cache_clear()
+    started = time.perf_counter()
+    for name in distinct:
+        canonical_ingredient(name)
+    print(f"{'по одному, без кэша':<28} {len(distinct) / (time.perf_counter() - started):>12,.0f}")
+
+    started = time.perf_counter()
+    for name in names:
+        canonical_ingredient(name)
+    print(f"{'по одному, с кэшем':<28} {len(names) / (time.perf_counter() - started):>12,.0f}")
+
+    canonical_ingredient.cache_clear()
+    started = time.perf_counter()
+    canonical_ingredients(names)
+    print(f"{'столбцом':<28} {len(names) / (time.perf_counter() - started):>12,.0f}")
+
+
+if __name__ == '__main__':
+    main()
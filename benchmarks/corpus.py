@@ -0,0 +1,130 @@
+import os
+import random
+from html import escape
+from typing import List, Tuple
+
+from entities import IngredientBase, RecipeBase
+
+# генератор синтетических страниц в разметке russianfood: нужен стабу сервера и бенчмаркам,
+# чтобы не ходить на настоящий сайт. Страница с одним и тем же rid всегда одинаковая
+
+INGREDIENTS = [
+    'Мука пшеничная', 'Сахар', 'Соль', 'Яйца', 'Молоко', 'Масло сливочное', 'Масло растительное',
+    'Картофель', 'Морковь', 'Лук репчатый', 'Чеснок', 'Капуста белокочанная', 'Свекла', 'Говядина',
+    'Свинина', 'Куриное филе', 'Фарш мясной', 'Сметана', 'Сыр твердый', 'Творог', 'Рис', 'Гречка',
+    'Томатная паста', 'Перец черный молотый', 'Лавровый лист', 'Укроп', 'Петрушка', 'Сода',
+    'Разрыхлитель', 'Ванильный сахар', 'Мед', 'Лимон', 'Яблоки', 'Кефир', 'Дрожжи сухие', 'Вода',
+]
+UNITS = ['г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'стакан', 'зубчик', 'по вкусу']
+QUANTITIES = ['1', '2', '3', '0,5', '1,5', '1 ¼', '½', '100', '200', '250', '300', '500', '2-3']
+CATEGORIES = [
+    'Завтрак', 'Обед', 'Ужин', 'Первые блюда', 'Вторые блюда', 'Выпечка', 'Десерты', 'Салаты',
+    'Супы', 'Блюда из мяса', 'Блюда из курицы', 'Каши', 'Закуски', 'Праздничный стол',
+]
+TIMES = ['15 мин', '20 мин', '30 мин', '40 мин', '45 мин', '1 час', '1 час 30 мин', '2 часа', '3 часа']
+
+
+# формат ингредиентов: 'old' - три ячейки на строку (первые ~115000 рецептов), 'new' - одна ячейка
+def page_format(rid: int, new_format_from: int = 115000) -> str:
+    return 'new' if rid >= new_format_from else 'old'
+
+
+def _ingredient_rows(rnd: random.Random, fmt: str) -> List[str]:
+    rows = []
+    for name in rnd.sample(INGREDIENTS, rnd.randint(3, 12)):
+        quantity, unit = rnd.choice(QUANTITIES), rnd.choice(UNITS)
+        if fmt == 'old':
+            rows.append(
+                f'<tr><td><span>{escape(name)}</span></td><td>{quantity}</td>'
+                f'<td><nobr>{escape(unit)}</nobr></td></tr>'
+            )
+        else:
+            rows.append(f'<tr><td><span>{escape(name)} — {quantity} {escape(unit)}</span></td></tr>')
+    return rows
+
+
+# функция генерации html страницы рецепта с заданным rid
+def render_recipe_page(rid: int, fmt: str = None) -> str:
+    rnd = random.Random(rid)
+    fmt = fmt or page_format(rid)
+    title = f'Рецепт №{rid}: {rnd.choice(INGREDIENTS).lower()} с {rnd.choice(INGREDIENTS).lower()}'
+    description = ' '.join(rnd.choice(INGREDIENTS).lower() for _ in range(rnd.randint(10, 40)))
+    categories = ''.join(
+        f'<a href="/recipes/bytype/?fid={CATEGORIES.index(c) + 1}">{escape(c)}</a>, '
+        for c in rnd.sample(CATEGORIES, rnd.randint(1, 4))
+    )
+    ingredients = ''.join(_ingredient_rows(rnd, fmt))
+    return f'''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{escape(title)}</title></head>
+<body>
+<div class="recipe_new">
+  <h1 class="title">{escape(title)}</h1>
+  <p>{escape(description)}</p>
+  <div class="sub_info">
+    Порций: <span class="hl">{rnd.randint(1, 10)}</span>
+    Время приготовления: <span class="hl">{rnd.choice(TIMES)}</span>
+    Ваше время: <span class="hl">{rnd.choice(TIMES)}</span>
+  </div>
+  <div class="razdels padding_l">
+    <a href="/recipes/recipe.php?rid={rid}">Ссылка на рецепт</a>
+    <a href="/search/?tag=1">Поиск</a>
+    {categories}
+  </div>
+  <table class="ingr">
+    <tr><td colspan="3"><span>Продукты (на {rnd.randint(1, 10)} порций)</span></td></tr>
+    {ingredients}
+  </table>
+</div>
+</body></html>'''
+
+
+# набор страниц (rid, html) для офлайн бенчмарков: половина в старом формате, половина в новом
+def generate_corpus(size: int, start_rid: int = 1) -> List[Tuple[int, str]]:
+    return [
+        (rid, render_recipe_page(rid, 'old' if rid % 2 else 'new'))
+        for rid in range(start_rid, start_rid + size)
+    ]
+
+
+# уже разобранные рецепты (RecipeBase) без html: для бенчмарков загрузки в БД и сводных таблиц.
+# vocabulary - сколько различных названий ингредиентов встречается в корпусе
+def generate_recipes(size: int, vocabulary: int = 5000, seed: int = 0) -> List[RecipeBase]:
+    rnd = random.Random(seed)
+    names = [f'{INGREDIENTS[i % len(INGREDIENTS)]} {i // len(INGREDIENTS)}' for i in range(vocabulary)]
+    recipes = []
+    for i in range(size):
+        recipe = RecipeBase()
+        recipe.recipe_name = f'Рецепт №{i + 1}'
+        recipe.number_of_servings = rnd.randint(1, 10)
+        recipe.cooking_time = rnd.choice(TIMES)
+        recipe.description = 'Описание рецепта ' * rnd.randint(1, 10)
+        recipe.categories = rnd.sample(CATEGORIES, rnd.randint(1, 4))
+        recipe.ingredients = []
+        for name in rnd.sample(names, rnd.randint(3, 12)):
+            ingredient = IngredientBase()
+            ingredient.ingredient_name = name
+            ingredient.ingredient_quantity = float(rnd.randint(1, 500))
+            ingredient.ingredient_unit = rnd.choice(UNITS)
+            recipe.ingredients.append(ingredient)
+        recipes.append(recipe)
+    return recipes
+
+
+# сохранение синтетического корпуса в папку (по файлу <rid>.html на страницу), чтобы гонять
+# бенчмарки разбора на одном и том же наборе страниц
+def save_corpus(directory: str, size: int, start_rid: int = 1):
+    os.makedirs(directory, exist_ok=True)
+    for rid, html in generate_corpus(size, start_rid):
+        with open(os.path.join(directory, f'{rid}.html'), 'w', encoding='utf-8') as f:
+            f.write(html)
+
+
+# чтение сохраненных страниц из папки: список (rid, html) по возрастанию rid
+def load_corpus(directory: str) -> List[Tuple[int, bytes]]:
+    pages = []
+    for name in os.listdir(directory):
+        stem, ext = os.path.splitext(name)
+        if ext == '.html' and stem.isdigit():
+            with open(os.path.join(directory, name), 'rb') as f:
+                pages.append((int(stem), f.read()))
+    return sorted(pages)
@@ -0,0 +1,23 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import models  # noqa: F401 - регистрирует таблицы в Base.metadata
+from database import Base
+
+
+# временная файловая SQLite база со схемой проекта, чтобы бенчмарки не трогали recipes.db
+@contextmanager
+def temporary_database():
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(autoflush=False, autocommit=False, bind=engine)()
+        try:
+            yield session
+        finally:
+            session.close()
+            engine.dispose()
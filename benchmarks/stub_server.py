@@ -0,0 +1,182 @@
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from benchmarks.corpus import render_recipe_page
+
+# локальный стаб russianfood: отдает синтетические страницы по /recipes/recipe.php?rid=N.
+# Страниц ровно pages штук, на остальные rid отвечает 404 (как сайт на удаленные рецепты).
+# latency добавляет искусственную задержку ответа, чтобы имитировать сеть. Страницы отдаются с ETag,
+# на совпавший If-None-Match стаб отвечает 304.
+# Сбои для проверки загрузчика (fetcher.py), с воспроизводимой случайностью от seed:
+# capacity - сколько запросов стаб тянет одновременно, сверх этого отвечает 503 (перегрузка);
+# throttle_rate - доля ответов 429; error_rate - доля ответов 500; stall_rate - доля ответов, которые
+# "зависают" на stall секунд (чтобы сработал таймаут клиента). На 429/503 стаб присылает Retry-After,
+# если задан retry_after
+
+# страницы стаба не меняются, поэтому дата изменения у всех одна
+LAST_MODIFIED = 'Mon, 01 Jan 2024 00:00:00 GMT'
+
+
+class StubServer:
+    def __init__(self, pages: int = 1000, latency: float = 0.0, host: str = '127.0.0.1', port: int = 0,
+                 capacity: int = 0, throttle_rate: float = 0.0, error_rate: float = 0.0,
+                 stall_rate: float = 0.0, stall: float = 5.0, retry_after: int = None, seed: int = 0):
+        self.pages = pages
+        self.latency = latency
+        self.capacity = capacity
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.retry_after = retry_after
+        self.requests_served = 0
+        self.not_modified = 0
+        # ответы со сбоем по видам: 'overloaded' (503), 'throttled' (429), 'error' (500), 'stalled'
+        self.faults = {'overloaded': 0, 'throttled': 0, 'error': 0, 'stalled': 0}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+        self.__server = ThreadingHTTPServer((host, port), self.__make_handler())
+        self.__server.daemon_threads = True
+        self.__thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}/recipes/recipe.php"
+
+    def count_request(self):
+        with self.__lock:
+            self.requests_served += 1
+
+    def count_not_modified(self):
+        with self.__lock:
+            self.not_modified += 1
+
+    # начало обработки запроса: вид сбоя, который надо изобразить, или None
+    def enter(self):
+        with self.__lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if self.capacity and self.in_flight > self.capacity:
+                fault = 'overloaded'
+            else:
+                roll = self.__random.random()
+                fault = None
+                for name, rate in (('throttled', self.throttle_rate), ('error', self.error_rate),
+                                   ('stalled', self.stall_rate)):
+                    if roll < rate:
+                        fault = name
+                        break
+                    roll -= rate
+            if fault:
+                self.faults[fault] += 1
+            return fault
+
+    def leave(self):
+        with self.__lock:
+            self.in_flight -= 1
+
+    def __make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                stub.count_request()
+                fault = stub.enter()
+                try:
+                    if stub.latency:
+                        time.sleep(stub.latency)
+                    if fault == 'stalled':
+                        time.sleep(stub.stall)
+                    if fault in ('overloaded', 'throttled'):
+                        self.__send(503 if fault == 'overloaded' else 429, b'slow down')
+                    elif fault == 'error':
+                        self.__send(500, b'internal error')
+                    else:
+                        self.__serve_page()
+                finally:
+                    stub.leave()
+
+            def __serve_page(self):
+                parsed = urlparse(self.path)
+                rid = parse_qs(parsed.query).get('rid', ['0'])[0]
+                if parsed.path != '/recipes/recipe.php' or not rid.isdigit() or not 1 <= int(rid) <= stub.pages:
+                    self.__send(404, b'not found')
+                    return
+                body = render_recipe_page(int(rid)).encode('utf-8')
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    stub.count_not_modified()
+                    self.__send(304, b'', etag)
+                    return
+                self.__send(200, body, etag)
+
+            def __send(self, status: int, body: bytes, etag: str = None):
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                if etag:
+                    self.send_header('ETag', etag)
+                    self.send_header('Last-Modified', LAST_MODIFIED)
+                if status in (429, 503) and stub.retry_after is not None:
+                    self.send_header('Retry-After', str(stub.retry_after))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # клиент не дождался ответа (таймаут)
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'StubServer':
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description='Локальный стаб russianfood')
+    arg_parser.add_argument('--pages', type=int, default=1000)
+    arg_parser.add_argument('--latency', type=float, default=0.0)
+    arg_parser.add_argument('--port', type=int, default=8081)
+    arg_parser.add_argument('--capacity', type=int, default=0)
+    arg_parser.add_argument('--throttle-rate', type=float, default=0.0)
+    arg_parser.add_argument('--error-rate', type=float, default=0.0)
+    arg_parser.add_argument('--stall-rate', type=float, default=0.0)
+    arg_parser.add_argument('--retry-after', type=int, default=None)
+    args = arg_parser.parse_args()
+
+    server = StubServer(args.pages, args.latency, port=args.port, capacity=args.capacity,
+                        throttle_rate=args.throttle_rate, error_rate=args.error_rate,
+                        stall_rate=args.stall_rate, retry_after=args.retry_after)
+    print(f"Стаб запущен: {server.url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
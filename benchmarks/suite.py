@@ -0,0 +1,226 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from benchmarks.corpus import generate_recipes, render_recipe_page
+
+# сводный прогон бенчмарков, результаты которого можно сравнивать между коммитами: разбор страниц
+# RecipeParser (старый формат с тремя ячейками и новый с одной), fill_database, RecipeFilter.apply_filters
+# и /api/generate-recipe через ASGI клиент в том же процессе - на нескольких размерах корпуса.
+# Приложение поднимается во временной папке, поэтому recipes.db в репозитории не трогается.
+# Запуск из корня репозитория:
+#   python -m benchmarks.suite --sizes 1000 10000 100000 --output bench-results.json
+# сравнение двух прогонов (код выхода 1, если что-то стало хуже больше чем на --threshold):
+#   python -m benchmarks.suite --compare old.json new.json
+
+ANSWER_GRID = list(itertools.product(['быстро', 'средне', 'долго'], ['завтрак', 'обед', 'ужин'],
+                                     ['легко', 'средне', 'тяжело']))
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def latency_metrics(samples: List[float]) -> Dict[str, float]:
+    return {
+        'p50_ms': percentile(samples, 0.5) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'mean_ms': statistics.mean(samples) * 1000,
+    }
+
+
+def git_revision(repository: str) -> Dict[str, object]:
+    def git(*args) -> str:
+        return subprocess.run(['git', *args], cwd=repository, capture_output=True, text=True).stdout.strip()
+    try:
+        return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+    except OSError:
+        return {'commit': None, 'dirty': None}
+
+
+def bench_extract(pages: int, fmt: str) -> Dict[str, float]:
+    from parsing import RecipeParser
+    parser = RecipeParser('')
+    html_pages = [(rid, render_recipe_page(rid, fmt)) for rid in range(1, pages + 1)]
+    samples = []
+    for rid, html in html_pages:
+        started = time.perf_counter()
+        parser.parse_html(html, rid)
+        samples.append(time.perf_counter() - started)
+    return {'pages_per_s': len(samples) / sum(samples), **latency_metrics(samples)}
+
+
+# заливка size рецептов пачками batch_size в новую теневую БД приложения, которая потом становится рабочей
+def bench_fill(app_main, size: int, batch_size: int) -> Dict[str, float]:
+    from database import shadow_database
+    from loader import fill_database
+    from pipeline import batched
+
+    recipes = generate_recipes(size)
+    with shadow_database() as db, contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        for batch in batched(recipes, batch_size):
+            fill_database(db, batch)
+            db.expunge_all()
+        elapsed = time.perf_counter() - started
+    app_main._reload_database_state()
+    return {'seconds': elapsed, 'recipes_per_s': size / elapsed}
+
+
+def bench_filters(repeats: int) -> Dict[str, float]:
+    from database import read_session_local
+    from filters import RecipeFilter
+    from models import Recipe
+
+    recipe_filter = RecipeFilter()
+    samples = []
+    with read_session_local() as db:
+        for cooking_time, meal_type, difficulty in ANSWER_GRID:
+            answers = {'cooking_time': cooking_time, 'meal_type': meal_type, 'difficulty': difficulty}
+            for _ in range(repeats):
+                started = time.perf_counter()
+                recipe_filter.apply_filters(db.query(Recipe.id), db, answers).all()
+                samples.append(time.perf_counter() - started)
+    return latency_metrics(samples)
+
+
+# requests запросов со случайными ответами при пустом кэше фильтров: первый запрос на каждую комбинацию
+# ответов считается холодным (идет в БД), остальные - теплыми (id из кэша)
+async def bench_generate(app_main, requests: int) -> Dict[str, float]:
+    import httpx
+
+    app_main.filter_cache.invalidate()
+    rnd = random.Random(0)
+    seen, cold, warm = set(), [], []
+    transport = httpx.ASGITransport(app=app_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        for _ in range(requests):
+            key = rnd.choice(ANSWER_GRID)
+            answers = dict(zip(('cooking_time', 'meal_type', 'difficulty'), key))
+            started = time.perf_counter()
+            response = await client.post('/api/generate-recipe', json=answers)
+            elapsed = time.perf_counter() - started
+            response.raise_for_status()
+            (warm if key in seen else cold).append(elapsed)
+            seen.add(key)
+    result = {f'cold_{name}': value for name, value in latency_metrics(cold).items()}
+    if warm:
+        result.update({f'warm_{name}': value for name, value in latency_metrics(warm).items()})
+    return result
+
+
+def run(args, repository: str) -> dict:
+    entries = []
+
+    def record(name: str, params: dict, result: Dict[str, float]):
+        entries.append({'name': name, 'params': params, 'metrics': result})
+        shown = ', '.join(f'{key}={value:.2f}' for key, value in result.items())
+        print(f"{name:<10} {json.dumps(params, ensure_ascii=False):<36} {shown}", file=sys.stderr)
+
+    for fmt in ('old', 'new'):
+        record('extract', {'format': fmt, 'pages': args.pages}, bench_extract(args.pages, fmt))
+
+    # main при импорте открывает recipes.db в текущей папке и ищет рядом static и templates
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ('static', 'templates'):
+            os.symlink(os.path.join(repository, name), os.path.join(directory, name))
+        os.chdir(directory)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                import main as app_main
+            for size in args.sizes:
+                record('fill', {'size': size, 'batch_size': args.batch_size},
+                       bench_fill(app_main, size, args.batch_size))
+                record('filters', {'size': size}, bench_filters(args.repeats))
+                record('generate', {'size': size, 'requests': args.requests},
+                       asyncio.run(bench_generate(app_main, args.requests)))
+            app_main.job_runner.shutdown()
+        finally:
+            os.chdir(repository)
+
+    return {
+        'meta': {
+            **git_revision(repository),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': {'sizes': args.sizes, 'pages': args.pages, 'batch_size': args.batch_size,
+                     'repeats': args.repeats, 'requests': args.requests},
+        },
+        'results': entries,
+    }
+
+
+# меньше - лучше для времени (_ms, seconds), больше - для скорости (_per_s)
+def _higher_is_better(metric: str) -> bool:
+    return metric.endswith('_per_s')
+
+
+# сравнение двух прогонов: по каждой метрике отношение нового к старому и отметка, если стало хуже
+# больше чем на threshold. Возвращает число таких ухудшений
+def compare(old: dict, new: dict, threshold: float) -> int:
+    def index(run_result: dict) -> dict:
+        return {(entry['name'], json.dumps(entry['params'], sort_keys=True)): entry['metrics']
+                for entry in run_result['results']}
+
+    old_results, new_results = index(old), index(new)
+    print(f"было: {old['meta'].get('commit')}, стало: {new['meta'].get('commit')}")
+    regressions = 0
+    for key in sorted(old_results.keys() & new_results.keys()):
+        name, params = key
+        for metric, old_value in old_results[key].items():
+            new_value = new_results[key].get(metric)
+            if new_value is None or not old_value:
+                continue
+            ratio = new_value / old_value
+            worse = ratio < 1 - threshold if _higher_is_better(metric) else ratio > 1 + threshold
+            regressions += worse
+            print(f"{'!' if worse else ' '} {name:<10} {params:<40} {metric:<16} "
+                  f"{old_value:>12.2f} -> {new_value:>12.2f} ({ratio:5.2f}x)")
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    arg_parser.add_argument('--pages', type=int, default=1000, help='страниц каждого формата для разбора')
+    arg_parser.add_argument('--batch-size', type=int, default=500)
+    arg_parser.add_argument('--repeats', type=int, default=3, help='повторов каждой комбинации фильтров')
+    arg_parser.add_argument('--requests', type=int, default=300, help='запросов к /api/generate-recipe')
+    arg_parser.add_argument('--output', default='bench-results.json')
+    arg_parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    arg_parser.add_argument('--threshold', type=float, default=0.1)
+    args = arg_parser.parse_args()
+
+    if args.compare:
+        runs = []
+        for path in args.compare:
+            with open(path, encoding='utf-8') as f:
+                runs.append(json.load(f))
+        sys.exit(1 if compare(*runs, args.threshold) else 0)
+
+    repository = os.getcwd()
+    sys.path.insert(0, repository)
+    output = os.path.abspath(args.output)
+    result = run(args, repository)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+import argparse
+import gzip
+import io
+import json
+import time
+import zlib
+from typing import BinaryIO, Dict, Iterator
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database import session_local, shadow_database, read_db_pointer, begin_read
+from loader import backfill_unit_ids, backfill_ingredient_vocabulary
+from models import Recipe, Ingredient, Category, CrawlState, DeadLetter, Unit, recipe_ingredient, recipe_category
+from search import rebuild_search_index, search_table
+
+# выгрузка и загрузка всего корпуса рецептов одним файлом: gzip поверх JSONL, где первая строка -
+# заголовок, дальше пачки строк таблиц по столбцам ({"table": ..., "columns": {столбец: [значения]}}),
+# а последняя строка - число строк каждой таблицы для проверки. И выгрузка, и загрузка держат в памяти
+# не больше одной пачки, поэтому размер корпуса ограничен только диском.
+# Запуск из корня репозитория: python -m corpus_io export corpus.jsonl.gz / python -m corpus_io import corpus.jsonl.gz
+
+EXPORT_FORMAT = 'zavoz-corpus'
+EXPORT_VERSION = 1
+DEFAULT_EXPORT_BATCH = 10000
+
+# таблицы в порядке загрузки: сначала справочники, потом рецепты, потом связи. Поисковый индекс
+# выгружается уже со стеммингом: загрузить его в несколько раз быстрее, чем построить заново
+EXPORT_TABLES = [
+    Category.__table__,
+    Ingredient.__table__,
+    Unit.__table__,
+    Recipe.__table__,
+    recipe_category,
+    recipe_ingredient,
+    CrawlState.__table__,
+    DeadLetter.__table__,
+    search_table,
+]
+
+
+class CorpusFormatError(ValueError):
+    pass
+
+
+# строки выгрузки (bytes с переводом строки) для всех таблиц из сессии db. Все таблицы читаются в одной
+# явно открытой транзакции (begin_read), поэтому выгрузка согласована, даже если в это время идет
+# дообход: связи не ссылаются на рецепты, которых нет в выгрузке. Транзакция остается открытой до
+# закрытия сессии. В counts (если передан) записывается число выгруженных строк по таблицам
+def iter_export_lines(db: Session, batch_size: int = DEFAULT_EXPORT_BATCH, counts: dict = None) -> Iterator[bytes]:
+    def line(data: dict) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+    begin_read(db)
+
+    yield line({
+        'format': EXPORT_FORMAT,
+        'version': EXPORT_VERSION,
+        'created_at': time.time(),
+        'tables': {table.name: [column.name for column in table.columns] for table in EXPORT_TABLES},
+    })
+    counts = {} if counts is None else counts
+    for table in EXPORT_TABLES:
+        names = [column.name for column in table.columns]
+        counts[table.name] = 0
+        # связующие таблицы без первичного ключа выгружаем в порядке вставки
+        order = list(table.primary_key.columns) or [table.c.recipe_id]
+        result = db.execute(select(table).order_by(*order).execution_options(yield_per=batch_size))
+        for rows in result.partitions():
+            counts[table.name] += len(rows)
+            yield line({'table': table.name, 'columns': {name: [row[i] for row in rows]
+                                                         for i, name in enumerate(names)}})
+    yield line({'end': True, 'rows': counts})
+
+
+# выгрузка в файловый объект (открытый на запись в бинарном режиме); возвращает число строк по таблицам
+def export_corpus(db: Session, fileobj: BinaryIO, batch_size: int = DEFAULT_EXPORT_BATCH) -> Dict[str, int]:
+    counts = {}
+    with gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=6) as out:
+        for chunk in iter_export_lines(db, batch_size, counts):
+            out.write(chunk)
+    return counts
+
+
+# выгрузка, сжатая на лету, кусками для потоковой отдачи по HTTP
+def iter_export_gzip(db: Session, batch_size: int = DEFAULT_EXPORT_BATCH) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in iter_export_lines(db, batch_size):
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+# загрузка выгрузки в пустую БД сессии db: каждая пачка вставляется одним executemany с исходными id,
+# поэтому связи переносятся как есть, без повторного сопоставления имен. Если в выгрузке нет поискового
+# индекса, единиц измерения или словарных названий ингредиентов, они досчитываются после загрузки.
+# Возвращает число строк по таблицам
+def import_corpus(db: Session, fileobj: BinaryIO) -> Dict[str, int]:
+    tables = {table.name: table for table in EXPORT_TABLES}
+    counts = {name: 0 for name in tables}
+    expected = None
+    try:
+        with gzip.GzipFile(fileobj=fileobj, mode='rb') as source:
+            lines = io.TextIOWrapper(source, encoding='utf-8')
+            header = json.loads(next(lines, 'null') or 'null')
+            if not isinstance(header, dict) or header.get('format') != EXPORT_FORMAT:
+                raise CorpusFormatError("Файл не является выгрузкой рецептов")
+            if header.get('version') != EXPORT_VERSION:
+                raise CorpusFormatError(f"Неподдерживаемая версия выгрузки: {header.get('version')}")
+
+            for raw in lines:
+                data = json.loads(raw)
+                if data.get('end'):
+                    expected = data['rows']
+                    break
+                table = tables.get(data['table'])
+                if table is None:
+                    continue
+                # столбцы, которых в текущей схеме нет, пропускаем; недостающие получат значения по умолчанию
+                columns = {name: values for name, values in data['columns'].items() if name in table.c}
+                rows = [dict(zip(columns, values)) for values in zip(*columns.values())]
+                if rows:
+                    db.execute(table.insert(), rows)
+                    counts[table.name] += len(rows)
+
+        if expected is None:
+            raise CorpusFormatError("Выгрузка оборвана: нет завершающей строки")
+        mismatched = {name: (counts.get(name, 0), rows) for name, rows in expected.items()
+                      if name in tables and counts.get(name, 0) != rows}
+        if mismatched:
+            raise CorpusFormatError(f"Число строк не совпадает с заголовком выгрузки: {mismatched}")
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    # выгрузки, сделанные до появления словарей ингредиентов и единиц, приходят без них
+    backfill_ingredient_vocabulary(db)
+    backfill_unit_ids(db)
+    rebuild_search_index(db)
+    print(f"Корпус загружен: {counts}")
+    return counts
+
+
+# загрузка выгрузки в новую теневую БД и переключение рабочей БД на нее (см. database.shadow_database);
+# если загрузка не удалась, рабочая БД не меняется. Возвращает число строк по таблицам
+def import_into_shadow(fileobj: BinaryIO) -> Dict[str, int]:
+    with shadow_database() as db:
+        return import_corpus(db, fileobj)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Выгрузка и загрузка корпуса рецептов')
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help='выгрузить рабочую БД в файл')
+    export_parser.add_argument('path')
+    export_parser.add_argument('--batch-size', type=int, default=DEFAULT_EXPORT_BATCH)
+    import_parser = commands.add_parser('import', help='загрузить файл в новую БД и сделать ее рабочей')
+    import_parser.add_argument('path')
+    args = arg_parser.parse_args()
+
+    started = time.perf_counter()
+    if args.command == 'export':
+        with session_local() as db, open(args.path, 'wb') as f:
+            counts = export_corpus(db, f, args.batch_size)
+        print(f"Выгружено в {args.path}: {counts}")
+    else:
+        with open(args.path, 'rb') as f:
+            import_into_shadow(f)
+        print(f"Рабочая БД: {read_db_pointer()[0]}")
+    print(f"Готово за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == '__main__':
+    main()
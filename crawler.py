@@ -0,0 +1,148 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import ExitStack
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from entities import RecipeBase
+from parsing import RecipeParser, HEADERS
+from parse_pool import ParseStage
+from page_cache import PageCache, CACHE_USE
+from fetcher import Fetcher, AIMDController, DeadLetters, DEFAULT_TIMEOUT
+
+
+# ограничитель частоты запросов: к одному хосту уходит не больше rate запросов в секунду.
+# Каждый поток резервирует себе следующий свободный слот и спит до него, поэтому запросы
+# равномерно размазываются по времени, а не уходят пачками
+class HostRateLimiter:
+    def __init__(self, rate: float):
+        self.__interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self.__next_slot = {}
+        self.__lock = threading.Lock()
+
+    def wait(self, host: str):
+        if not self.__interval:
+            return
+        with self.__lock:
+            now = time.monotonic()
+            slot = max(now, self.__next_slot.get(host, now))
+            self.__next_slot[host] = slot + self.__interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+# конкурентный обходчик сайта: страницы ?rid=N качаются параллельно через общий пул соединений,
+# а скачанные страницы сразу уходят в пул разборщиков, которые прогоняют их через RecipeParser.parse_html.
+# При parse_processes > 0 разбор идет не в потоках, а в пуле процессов ParseStage, и вместо RecipeBase
+# обходчик отдает RecipeRecord. Страницы качает fetcher.Fetcher: с повторами, а число одновременных
+# запросов подстраивается под сайт (AIMDController) от initial_concurrency до concurrency
+class ConcurrentCrawler:
+    def __init__(self, url, concurrency: int = 16, rate_per_host: float = 10.0,
+                 parse_workers: int = 4, timeout=DEFAULT_TIMEOUT, parse_processes: int = 0,
+                 cache: PageCache = None, cache_mode: str = CACHE_USE, initial_concurrency: int = 4,
+                 retries: int = 4, dead_letters: DeadLetters = None):
+        self.__concurrency = max(1, concurrency)
+        self.__parse_workers = max(1, parse_workers)
+        self.__parse_processes = parse_processes
+        self.__limiter = HostRateLimiter(rate_per_host)
+        self.__parser = RecipeParser(url)
+        # одна сессия на весь обход: keep-alive соединения переиспользуются всеми потоками
+        self.__session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.__concurrency)
+        self.__session.mount('http://', adapter)
+        self.__session.mount('https://', adapter)
+        host = urlparse(url).netloc
+        # страницы из кэша отдаются без ограничения частоты: оно нужно только для запросов к сайту
+        self.__fetcher = Fetcher(self.__session, url, cache, cache_mode, HEADERS, timeout, retries,
+                                 controller=AIMDController(initial_concurrency, maximum=self.__concurrency),
+                                 throttle=lambda: self.__limiter.wait(host), dead_letters=dead_letters)
+
+    # rid, которые не удалось скачать за все попытки
+    @property
+    def dead_letters(self) -> DeadLetters:
+        return self.__fetcher.dead_letters
+
+    # текущее окно конкурентности
+    @property
+    def concurrency_limit(self) -> int:
+        return self.__fetcher.controller.limit
+
+    # функция получения html страницы рецепта по его rid (None - рецепта нет или страницу не удалось скачать)
+    def __fetch(self, rid: int) -> Optional[str]:
+        return self.__fetcher.fetch(rid).html
+
+    # генератор рецептов: отдает пары (rid, рецепт) строго по возрастанию rid, пока не наберется count
+    # рецептов (или пока не дойдем до stop_rid, если он задан). Страницы, скачанные раньше предыдущих,
+    # ждут в буфере ready, поэтому все рецепты до последнего отданного rid уже обработаны - на этом
+    # держится контрольная точка дообхода
+    def iter_recipes(self, count: int, start_rid: int = 1,
+                     stop_rid: Optional[int] = None) -> Iterator[Tuple[int, RecipeBase]]:
+        found = 0
+        next_rid = start_rid
+        next_to_yield = start_rid
+        fetching = {}  # future загрузки -> rid
+        parsing = {}   # future разбора -> rid
+        ready = {}     # rid -> рецепт (None, если страницы нет или разобрать ее не удалось)
+        ready_recipes = 0
+
+        with ExitStack() as stack:
+            fetch_pool = stack.enter_context(ThreadPoolExecutor(max_workers=self.__concurrency))
+            submit_parse = self.__start_parse_pool(stack)
+            while True:
+                # добиваем очередь загрузок до лимита, но не запрашиваем больше страниц, чем еще может понадобиться
+                while (len(fetching) < self.__concurrency
+                       and found + ready_recipes + len(fetching) + len(parsing) < count
+                       and (stop_rid is None or next_rid <= stop_rid)):
+                    fetching[fetch_pool.submit(self.__fetch, next_rid)] = next_rid
+                    next_rid += 1
+
+                if not fetching and not parsing:
+                    break
+
+                done, _ = wait(list(fetching) + list(parsing), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in fetching:
+                        rid = fetching.pop(future)
+                        html = future.result()
+                        if html:
+                            parsing[submit_parse(rid, html)] = rid
+                        else:
+                            ready[rid] = None
+                        continue
+
+                    rid = parsing.pop(future)
+                    try:
+                        recipe = future.result()
+                    except Exception as e:
+                        print(f"Ошибка при разборе страницы rid={rid}: {e}")
+                        recipe = None
+                    if recipe is not None and not recipe.recipe_name:
+                        recipe = None
+                    ready[rid] = recipe
+                    if recipe is not None:
+                        ready_recipes += 1
+
+                while next_to_yield in ready:
+                    recipe = ready.pop(next_to_yield)
+                    if recipe is not None:
+                        ready_recipes -= 1
+                        found += 1
+                        yield next_to_yield, recipe
+                    next_to_yield += 1
+
+    # запуск пула разбора; возвращает функцию submit(rid, html) -> future
+    def __start_parse_pool(self, stack: ExitStack):
+        if self.__parse_processes > 0:
+            stage = stack.enter_context(ParseStage(self.__parse_processes))
+            return stage.submit
+        pool = stack.enter_context(ThreadPoolExecutor(max_workers=self.__parse_workers))
+        return lambda rid, html: pool.submit(self.__parser.parse_html, html, rid)
+
+    # аналог RecipeParser.parsing: возвращает список рецептов, упорядоченный по rid
+    def crawl(self, count: int, start_rid: int = 1) -> List[RecipeBase]:
+        return [recipe for _, recipe in self.iter_recipes(count, start_rid)]
@@ -1,9 +1,416 @@
-from sqlalchemy import create_engine
+import glob
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+try:
+    import fcntl
+except ImportError:  # Windows: блокировок файлов нет, файлы БД удаляются как раньше, без проверки
+    fcntl = None
+
 SQL_DB_URL = 'sqlite:///./recipes.db'
 
-engine = create_engine(SQL_DB_URL, connect_args={"check_same_thread": False})
+# папка с файлами БД и файл-указатель на рабочую БД. Полное перезаполнение строит новую БД в отдельном
+# файле (теневая БД) и только потом переключает на нее указатель; прежний файл остается для отката.
+# Пока указателя нет, рабочая БД - recipes.db
+DB_DIR = '.'
+DB_POINTER = os.path.join(DB_DIR, 'recipes.current')
+# путь к теневой БД, заливка которой не дошла до переключения: следующее полное перезаполнение продолжает ее
+SHADOW_POINTER = os.path.join(DB_DIR, 'recipes.shadow')
+# блокировка на время сборки теневой БД (см. shadow_database и working_database_write)
+BUILD_LOCK = os.path.join(DB_DIR, 'recipes.build.lock')
+
+# сколько значений отправляем в один запрос WHERE ... IN (...): у SQLite есть лимит на число параметров
+IN_CHUNK_SIZE = 900
+
+
+# профиль подключения к SQLite: прагмы, которые выставляются на каждом новом соединении, и размеры пула
+@dataclass
+class EngineProfile:
+    # wal - читатели не блокируются пишущей транзакцией (и наоборот), delete - журнал SQLite по умолчанию
+    journal_mode: str = 'wal'
+    # в режиме WAL normal не теряет целостность при падении процесса, а fsync делается только на checkpoint
+    synchronous: str = 'normal'
+    # сколько байт файла БД читать через mmap (0 - не использовать)
+    mmap_size: int = 256 * 1024 ** 2
+    # кэш страниц на соединение: отрицательное число - в КиБ
+    cache_size: int = -64 * 1024
+    # сколько мс ждать освободившейся блокировки вместо немедленной ошибки "database is locked"
+    busy_timeout: int = 5000
+    pool_size: int = 8
+    max_overflow: int = 8
+    pool_timeout: float = 30.0
+
+
+# default - для обслуживания запросов во время заливки; legacy - настройки SQLite и SQLAlchemy по умолчанию
+ENGINE_PROFILES = {
+    'default': EngineProfile(),
+    'legacy': EngineProfile(journal_mode='delete', synchronous='full', mmap_size=0, cache_size=-2000,
+                            busy_timeout=5000, pool_size=5, max_overflow=10),
+}
+
+
+# движок с прагмами профиля. read_only=True включает query_only: через такие соединения SQLite не даст
+# ничего записать, поэтому их спокойно можно раздавать обработчикам, которые только читают
+def make_engine(url: str = SQL_DB_URL, profile: EngineProfile = None, read_only: bool = False):
+    profile = profile or ENGINE_PROFILES['default']
+    new_engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        pool_size=profile.pool_size,
+        max_overflow=profile.max_overflow,
+        pool_timeout=profile.pool_timeout,
+    )
+
+    @event.listens_for(new_engine, 'connect')
+    def set_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        # режим журнала хранится в самом файле, поэтому его выставляет только пишущий движок
+        if not read_only:
+            cursor.execute(f'PRAGMA journal_mode = {profile.journal_mode}')
+        cursor.execute(f'PRAGMA synchronous = {profile.synchronous}')
+        cursor.execute(f'PRAGMA mmap_size = {int(profile.mmap_size)}')
+        cursor.execute(f'PRAGMA cache_size = {int(profile.cache_size)}')
+        cursor.execute(f'PRAGMA busy_timeout = {int(profile.busy_timeout)}')
+        if read_only:
+            cursor.execute('PRAGMA query_only = ON')
+        cursor.close()
+
+    return new_engine
+
+
+# профиль выбирается переменной окружения RECIPES_DB_PROFILE (по умолчанию default)
+db_profile = ENGINE_PROFILES[os.environ.get('RECIPES_DB_PROFILE', 'default')]
+
+def sqlite_url(path: str) -> str:
+    return f'sqlite:///{path}'
+
+
+# (рабочая, предыдущая) БД из файла-указателя; предыдущей может не быть
+def read_db_pointer() -> tuple:
+    try:
+        with open(DB_POINTER, encoding='utf-8') as f:
+            lines = [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        lines = []
+    current = lines[0] if lines else os.path.join(DB_DIR, 'recipes.db')
+    previous = lines[1] if len(lines) > 1 else None
+    return current, previous
+
+
+def _write_db_pointer(current: str, previous: Optional[str]):
+    # через временный файл и os.replace: указатель меняется атомарно даже при падении посреди записи
+    with open(DB_POINTER + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(current + '\n' + (previous or '') + '\n')
+    os.replace(DB_POINTER + '.tmp', DB_POINTER)
+
+
+# путь для новой теневой БД рядом с рабочей; несколько сборок за одну секунду получают разные файлы
+def new_shadow_db_path() -> str:
+    stem = os.path.join(DB_DIR, f"recipes-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+    path, n = stem + '.db', 1
+    while os.path.exists(path):
+        n += 1
+        path = f"{stem}-{n}.db"
+    return path
+
+
+# удаление файла БД вместе с файлами WAL журнала и файлом блокировки
+def remove_db_file(path: str):
+    for suffix in ('', '-wal', '-shm', '-journal', '.lock'):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+# Приложение может работать в нескольких процессах (воркеры uvicorn), а переключает БД только тот, где шла
+# фоновая задача. Остальные замечают смену файла-указателя по его inode и mtime (refresh_database) и
+# переподключаются. Пока процесс работает с файлом БД, он держит разделяемую блокировку flock на файле
+# path + '.lock' (не на самой БД: закрытие ее дескриптора сняло бы POSIX блокировки SQLite), и файл,
+# который еще кто-то держит, не удаляется
+def _lock_db_file(path: str) -> Optional[int]:
+    if fcntl is None:
+        return None
+    fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+    fcntl.flock(fd, fcntl.LOCK_SH)
+    return fd
+
+
+def _unlock_db_file(fd: Optional[int]):
+    if fd is not None:
+        os.close(fd)
+
+
+# удаление файла БД, если его не держит ни один процесс; False - файл еще используется
+def _remove_unused_db_file(path: str) -> bool:
+    if fcntl is None:
+        remove_db_file(path)
+        return True
+    fd = os.open(path + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return False
+    try:
+        remove_db_file(path)
+    finally:
+        os.close(fd)
+    return True
+
+
+def _read_pointer_stamp() -> Optional[tuple]:
+    try:
+        stat = os.stat(DB_POINTER)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+# отметка указателя снимается до его чтения: смена между ними заметится при следующем refresh_database
+_pointer_stamp = _read_pointer_stamp()
+db_path, previous_db_path = read_db_pointer()
+
+# engine - для заливки и прочих записей, read_engine - для ручек, которые только читают
+engine = make_engine(sqlite_url(db_path), db_profile)
+read_engine = make_engine(sqlite_url(db_path), db_profile, read_only=True)
 session_local = sessionmaker(autoflush=False, autocommit=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+read_session_local = sessionmaker(autoflush=False, autocommit=False, bind=read_engine)
+_db_lock_fd = _lock_db_file(db_path)
+_switch_lock = threading.Lock()
+
+
+# переподключение сессий этого процесса к файлу path: сессии, открытые после него, идут уже в новую БД,
+# а начатые до него дорабатывают со старой (их соединения закроются, когда вернутся в старый пул)
+def _bind_database(path: str, previous: Optional[str]):
+    global engine, read_engine, db_path, previous_db_path, _db_lock_fd
+    new_lock_fd = _lock_db_file(path)
+    new_engine = make_engine(sqlite_url(path), db_profile)
+    new_read_engine = make_engine(sqlite_url(path), db_profile, read_only=True)
+    old_engine, old_read_engine, old_lock_fd = engine, read_engine, _db_lock_fd
+
+    session_local.configure(bind=new_engine)
+    read_session_local.configure(bind=new_read_engine)
+    engine, read_engine, _db_lock_fd = new_engine, new_read_engine, new_lock_fd
+    db_path, previous_db_path = path, previous
+
+    old_engine.dispose()
+    old_read_engine.dispose()
+    _unlock_db_file(old_lock_fd)
+
+
+# переключение рабочей БД на файл path. Прежняя рабочая БД становится предыдущей (для отката), а файл,
+# который был предыдущим, и брошенные теневые БД удаляются, если их уже не держит ни один процесс
+# (иначе удалятся при одном из следующих переключений). Возвращает путь прежней рабочей БД
+def switch_database(path: str) -> str:
+    global _pointer_stamp
+    with _switch_lock:
+        # указатель мог сменить другой процесс, поэтому прежние БД берем из файла, а не из памяти
+        old_path, stale_path = read_db_pointer()
+        _write_db_pointer(path, old_path)
+        _pointer_stamp = _read_pointer_stamp()
+        _bind_database(path, old_path)
+
+        keep = {path, old_path, unfinished_shadow_path()}
+        stale = set(glob.glob(os.path.join(DB_DIR, 'recipes-*.db')))
+        if stale_path:
+            stale.add(stale_path)
+        for unused_path in sorted(stale - keep):
+            _remove_unused_db_file(unused_path)
+    return old_path
+
+
+# переподключение к рабочей БД, если ее переключил другой процесс. Проверка - один stat файла-указателя,
+# поэтому ее можно делать на каждом запросе. True - рабочая БД сменилась (надо сбросить все, что
+# посчитано по старой)
+def refresh_database() -> bool:
+    global _pointer_stamp, previous_db_path
+    if _read_pointer_stamp() == _pointer_stamp:
+        return False
+    with _switch_lock:
+        stamp = _read_pointer_stamp()
+        if stamp == _pointer_stamp:
+            return False
+        current, previous = read_db_pointer()
+        _pointer_stamp = stamp
+        if current == db_path:
+            previous_db_path = previous
+            return False
+        _bind_database(current, previous)
+        return True
+
+
+# теневая БД, которую не дозалили (упало полное перезаполнение); None, если такой нет
+def unfinished_shadow_path() -> Optional[str]:
+    try:
+        with open(SHADOW_POINTER, encoding='utf-8') as f:
+            path = f.read().strip()
+    except FileNotFoundError:
+        return None
+    # указатель мог остаться от переключения, которое успело сделать файл рабочей или предыдущей БД
+    if not path or not os.path.exists(path) or path in (db_path, previous_db_path):
+        return None
+    return path
+
+
+def _write_shadow_pointer(path: Optional[str]):
+    if path is None:
+        try:
+            os.remove(SHADOW_POINTER)
+        except FileNotFoundError:
+            pass
+        return
+    with open(SHADOW_POINTER + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(path + '\n')
+    os.replace(SHADOW_POINTER + '.tmp', SHADOW_POINTER)
+
+
+_shadow_builds = 0
+
+
+# запись в рабочую БД мимо заливки (например, новый ингредиент из API). Пока в каком-либо процессе
+# собирается теневая БД, такая запись потеряется при переключении, поэтому блок получает False
+# и ничего писать не должен. С True сборка не начнется, пока блок не закончится. Без fcntl видны
+# только сборки в этом процессе
+@contextmanager
+def working_database_write():
+    if fcntl is None:
+        yield _shadow_builds == 0
+        return
+    fd = os.open(BUILD_LOCK, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+        else:
+            yield True
+    finally:
+        os.close(fd)
+
+
+# удаление недозалитой теневой БД, чтобы сборка начала с пустого файла. Вызывается только под блокировкой
+# сборки (BUILD_LOCK); файл, который все-таки кто-то держит, не удаляется, а остается брошенным
+# и удаляется одним из следующих переключений БД
+def _discard_unfinished_shadow():
+    path = unfinished_shadow_path()
+    if path is not None:
+        _remove_unused_db_file(path)
+    _write_shadow_pointer(None)
+
+
+# сборка новой БД в теневом файле: отдает сессию к БД со схемой (модели к этому моменту должны быть
+# импортированы, чтобы их таблицы были в Base.metadata). Если блок with выполнился без ошибок, рабочая БД
+# переключается на новый файл, иначе рабочая БД остается как была, а файл удаляется. С resumable=True
+# упавшая сборка оставляет файл вместе с закоммиченными пачками и контрольной точкой, и следующая
+# сборка с resumable=True продолжает его, а не начинает с пустого файла (fresh=True выбрасывает его).
+# Сборки идут по одной на все процессы, а записи в рабочую БД мимо сборки на это время запрещены
+# (working_database_write)
+@contextmanager
+def shadow_database(resumable: bool = False, fresh: bool = False):
+    global _shadow_builds
+    build_fd = None
+    if fcntl is not None:
+        build_fd = os.open(BUILD_LOCK, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(build_fd, fcntl.LOCK_EX)
+    with _switch_lock:
+        _shadow_builds += 1
+    try:
+        # недозалитую БД может продолжать только сборка, держащая BUILD_LOCK, поэтому выбрасываем ее под ним
+        if fresh:
+            _discard_unfinished_shadow()
+        with _build_shadow_database(resumable) as db:
+            yield db
+    finally:
+        with _switch_lock:
+            _shadow_builds -= 1
+        _unlock_db_file(build_fd)
+
+
+@contextmanager
+def _build_shadow_database(resumable: bool):
+    path = unfinished_shadow_path() if resumable else None
+    if path is None:
+        path = new_shadow_db_path()
+        if resumable:
+            _write_shadow_pointer(path)
+    # пока идет сборка, файл держим, чтобы его не удалило переключение БД в другом процессе
+    lock_fd = _lock_db_file(path)
+    shadow_engine = make_engine(sqlite_url(path), db_profile)
+    try:
+        Base.metadata.create_all(bind=shadow_engine)
+        migrate(shadow_engine)
+        with sessionmaker(autoflush=False, autocommit=False, bind=shadow_engine)() as db:
+            yield db
+    except BaseException:
+        shadow_engine.dispose()
+        _unlock_db_file(lock_fd)
+        if not resumable:
+            remove_db_file(path)
+        raise
+    shadow_engine.dispose()
+    switch_database(path)
+    _unlock_db_file(lock_fd)
+    if resumable:
+        _write_shadow_pointer(None)
+
+
+# начало транзакции сессии db сразу с блокировкой на запись (BEGIN IMMEDIATE). Драйвер sqlite3 сам
+# открывает транзакцию только перед первым INSERT/UPDATE, поэтому SELECT до него (например, max(id) при
+# раздаче id новым строкам) идут вне транзакции, и другой писатель может закоммитить между ними.
+# Если транзакция уже открыта, ничего не делает
+def begin_write(db):
+    connection = db.connection()
+    if not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+# начало читающей транзакции сессии db. Драйвер sqlite3 не открывает транзакцию перед SELECT, и каждый
+# запрос видит свой снимок БД; после BEGIN все запросы до конца транзакции (закрытия сессии) читают
+# один снимок, даже если в это время в БД пишут (в режиме WAL писатель читателей не ждет).
+# Если транзакция уже открыта, ничего не делает
+def begin_read(db):
+    connection = db.connection()
+    if not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN')
+
+
+# откат на предыдущую БД; None, если откатываться некуда
+def rollback_database() -> Optional[str]:
+    _, previous = read_db_pointer()
+    if not previous or not os.path.exists(previous):
+        return None
+    return switch_database(previous)
+
+
+Base = declarative_base()
+
+
+# create_all не трогает уже существующие таблицы, поэтому новые колонки моделей в старую recipes.db
+# добавляем сами через ALTER TABLE, а затем создаем недостающие индексы
+def migrate(bind):
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=bind.dialect)
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                connection.execute(text(ddl))
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
@@ -1,24 +1,49 @@
+from dataclasses import dataclass
+from typing import List, NamedTuple, Optional
 
+
+# классы со слотами: у экземпляров нет __dict__, поэтому сотни тысяч разобранных рецептов
+# занимают в памяти заметно меньше (см. benchmarks/bench_entities.py)
+@dataclass(slots=True)
 class IngredientBase:
     # название ингридиента
-    ingredient_name     = None     # предполагается тип данных string
+    ingredient_name: Optional[str] = None
     # количество ингридиента
-    ingredient_quantity = None     # предполагается тип данных int, но из-за того, что админы сайта иногда не умеют писать 
-                                   # 1.25, а пишут 1 ¼, рассматривается вариант с типом данных string. Есть еще вариант 
-                                   # по unicode коду распознавать дроби и складывать с целой частью, но это ту мач
+    ingredient_quantity: Optional[float] = None  # админы сайта иногда не умеют писать 1.25, а пишут 1 ¼,
+                                                 # такие дроби разбирает normalize.py
     # единицы измерения ингридиента
-    ingredient_unit     = None     # предполагается тип данных string
+    ingredient_unit: Optional[str] = None
 
+@dataclass(slots=True)
 class RecipeBase:
     # название рецепта
-    recipe_name         = None     # предполагается тип данных string
+    recipe_name: Optional[str] = None
     # список ингредиентов
-    ingredients         = None     # предполагается тип данных list<Ingredient>
+    ingredients: Optional[List[IngredientBase]] = None
     # на какое количество персон рецепт
-    number_of_servings  = None     # предполагается тип данных int
+    number_of_servings: Optional[int] = None
     # время приготовления
-    cooking_time        = None     # предполагается тип int в минутах
+    cooking_time: Optional[str] = None           # строкой, как на сайте; минуты считает recipe_features.py
     # категории под которые попадает рецепт
-    categories          = None     # предполагается тип list<string>
+    categories: Optional[List[str]] = None
     # описание рецепта
-    description         = None     # предполагается тип string
+    description: Optional[str] = None
+    # rid страницы на russianfood, с которой взят рецепт
+    source_rid: Optional[int] = None
+
+# компактные неизменяемые записи для передачи разобранных рецептов между процессами (см. parse_pool.py):
+# обычные кортежи, которые дешево пиклятся, с теми же именами полей, что и у классов выше,
+# поэтому функции из parsing.py и loader.py принимают их наравне с RecipeBase
+class IngredientRecord(NamedTuple):
+    ingredient_name: str
+    ingredient_quantity: Optional[float]
+    ingredient_unit: Optional[str]
+
+class RecipeRecord(NamedTuple):
+    recipe_name: str
+    ingredients: List[IngredientRecord]
+    number_of_servings: Optional[int]
+    cooking_time: Optional[str]
+    categories: List[str]
+    description: Optional[str]
+    source_rid: Optional[int]
@@ -0,0 +1,244 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional
+
+import requests
+
+import metrics
+from page_cache import PageCache, CACHE_USE, fetch_with_cache
+
+# загрузка страниц рецептов с повторами. Раньше любая ошибка сети превращалась в None, и обход молча
+# шел к следующему rid. Теперь ответы делятся на три исхода:
+# ok - страница скачана (или взята из кэша)
+# missing - рецепта нет (404/410): повторять бесполезно
+# failed - страницу не удалось скачать за все попытки: rid попадает в список недокачанных (DeadLetters),
+#   откуда его можно перекачать позже (Fetcher.refetch_dead_letters); список хранится в БД рядом
+#   с контрольной точкой обхода (loader.save_dead_letters)
+# Между попытками - экспоненциальная задержка со случайным разбросом (full jitter), а если сайт прислал
+# Retry-After - столько, сколько он просит. Число одновременных запросов регулирует AIMDController
+
+FETCH_OK = 'ok'
+FETCH_MISSING = 'missing'
+FETCH_FAILED = 'failed'
+
+# (на соединение, на чтение ответа), с
+DEFAULT_TIMEOUT = (5.0, 30.0)
+
+# рецепта с таким rid нет
+MISSING_STATUSES = {404, 410}
+# сайт просит сбавить темп - сигнал уменьшить окно конкурентности
+THROTTLE_STATUSES = {429, 503}
+# временные ошибки, после которых имеет смысл повторить запрос
+RETRY_STATUSES = THROTTLE_STATUSES | {500, 502, 504}
+
+
+class FetchResult(NamedTuple):
+    rid: int
+    html: Optional[str]
+    status: str
+    attempts: int
+    reason: Optional[str] = None
+
+
+# значение заголовка Retry-After в секундах: он бывает числом секунд или HTTP датой.
+# None - заголовка нет или его не удалось разобрать
+def parse_retry_after(value: Optional[str], now: float = None) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment is None:
+        return None
+    return max(0.0, moment.timestamp() - (time.time() if now is None else now))
+
+
+# окно конкурентности по схеме AIMD (как у TCP): пока сайт отвечает нормально, окно растет - сначала
+# удваивается за каждое окно успешных ответов (медленный старт), после первого троттлинга - на increase
+# за окно; на троттлинг (429/503, таймаут) окно умножается на decrease. Все ответы, отправленные до
+# уменьшения, несут один и тот же сигнал перегрузки, поэтому окно уменьшается не больше раза на эпоху.
+# pause останавливает выдачу слотов всем потокам, пока не истечет Retry-After
+class AIMDController:
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 64,
+                 increase: float = 1.0, decrease: float = 0.5):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.__increase = increase
+        self.__decrease = decrease
+        self.__limit = float(min(self.maximum, max(self.minimum, initial)))
+        self.__slow_start = True
+        self.__active = 0
+        self.__epoch = 0
+        self.__paused_until = 0.0
+        self.__condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self.__limit)
+
+    # ожидание свободного слота; возвращает эпоху, которую надо передать в release
+    def acquire(self) -> int:
+        with self.__condition:
+            while True:
+                delay = self.__paused_until - time.monotonic()
+                if delay > 0:
+                    self.__condition.wait(delay)
+                elif self.__active >= self.limit:
+                    self.__condition.wait()
+                else:
+                    break
+            self.__active += 1
+            return self.__epoch
+
+    # освобождение слота. healthy=True - сайт ответил нормально, False - троттлинг,
+    # None - ошибка, которая ничего не говорит о нагрузке на сайт
+    def release(self, epoch: int, healthy: Optional[bool] = None):
+        with self.__condition:
+            self.__active -= 1
+            if healthy:
+                step = 1.0 if self.__slow_start else self.__increase / self.__limit
+                self.__limit = min(float(self.maximum), self.__limit + step)
+            elif healthy is False and epoch == self.__epoch:
+                self.__slow_start = False
+                self.__limit = max(float(self.minimum), self.__limit * self.__decrease)
+                self.__epoch += 1
+            metrics.FETCH_CONCURRENCY.set(self.limit)
+            self.__condition.notify_all()
+
+    def pause(self, seconds: float):
+        with self.__condition:
+            self.__paused_until = max(self.__paused_until, time.monotonic() + seconds)
+
+
+# список rid, которые не удалось скачать: rid -> (причина последней неудачи, число попыток, время).
+# entries - сохраненные ранее записи (loader.load_dead_letters). rid из списка, которые потом скачались
+# или оказались удаленными, копятся в resolved(), чтобы их можно было убрать и из БД
+class DeadLetters:
+    def __init__(self, entries: Iterable[dict] = ()):
+        self.__entries = {entry['rid']: dict(entry) for entry in entries}
+        self.__resolved = set()
+        self.__lock = threading.Lock()
+
+    def add(self, rid: int, reason: Optional[str], attempts: int):
+        with self.__lock:
+            self.__entries[rid] = {'rid': rid, 'reason': reason, 'attempts': attempts, 'failed_at': time.time()}
+            self.__resolved.discard(rid)
+        metrics.FETCH_DEAD_LETTERS.inc()
+
+    def discard(self, rid: int):
+        with self.__lock:
+            if self.__entries.pop(rid, None) is not None:
+                self.__resolved.add(rid)
+
+    def rids(self) -> List[int]:
+        with self.__lock:
+            return sorted(self.__entries)
+
+    def entries(self) -> List[dict]:
+        with self.__lock:
+            return [dict(self.__entries[rid]) for rid in sorted(self.__entries)]
+
+    def resolved(self) -> List[int]:
+        with self.__lock:
+            return sorted(self.__resolved)
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__entries)
+
+
+# загрузчик страниц ?rid=N через кэш (page_cache.fetch_with_cache) с повторами и окном конкурентности.
+# session - requests или requests.Session; throttle вызывается перед каждым походом в сеть
+# (ограничение частоты, см. crawler.HostRateLimiter). Один загрузчик можно звать из многих потоков
+class Fetcher:
+    def __init__(self, session, url: str, cache: PageCache = None, cache_mode: str = CACHE_USE,
+                 headers: dict = None, timeout=DEFAULT_TIMEOUT, retries: int = 4,
+                 backoff_base: float = 0.5, backoff_cap: float = 30.0, max_retry_after: float = 120.0,
+                 controller: AIMDController = None, throttle: Callable[[], None] = None,
+                 dead_letters: DeadLetters = None, sleep: Callable[[float], None] = time.sleep,
+                 seed: int = None):
+        self.__session = session
+        self.__url = url
+        self.__cache = cache
+        self.__cache_mode = cache_mode
+        self.__headers = headers
+        self.__timeout = timeout
+        self.__retries = max(0, retries)
+        self.__backoff_base = backoff_base
+        self.__backoff_cap = backoff_cap
+        self.__max_retry_after = max_retry_after
+        self.__throttle = throttle
+        self.__sleep = sleep
+        self.__random = random.Random(seed)
+        self.controller = controller or AIMDController(initial=1, maximum=1)
+        self.dead_letters = dead_letters if dead_letters is not None else DeadLetters()
+
+    # задержка перед попыткой attempt + 1: случайная от 0 до base * 2^attempt (но не больше cap), чтобы
+    # потоки, упавшие одновременно, не пришли повторять тоже одновременно. Retry-After важнее: ждем
+    # сколько просят (не больше max_retry_after) плюс небольшой разброс
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.__max_retry_after) + self.__random.uniform(0, self.__backoff_base)
+        return self.__random.uniform(0, min(self.__backoff_cap, self.__backoff_base * 2 ** attempt))
+
+    # загрузка страницы rid. Исключений наружу не бросает: неудача - это FetchResult со статусом failed
+    def fetch(self, rid: int) -> FetchResult:
+        url = f"{self.__url}?rid={rid}"
+        reason = None
+        attempt = 0
+        while True:
+            attempt += 1
+            retry_after = None
+            retryable = True
+            epoch = self.controller.acquire()
+            healthy = None
+            try:
+                html = fetch_with_cache(self.__session, url, rid, self.__cache, self.__cache_mode,
+                                        self.__headers, self.__timeout, self.__throttle)
+                healthy = True
+                # страницы нет в кэше в режиме offline
+                status = FETCH_OK if html is not None else FETCH_MISSING
+                self.dead_letters.discard(rid)
+                return FetchResult(rid, html, status, attempt)
+            except requests.exceptions.HTTPError as e:
+                status_code = e.response.status_code
+                if status_code in MISSING_STATUSES:
+                    healthy = True
+                    self.dead_letters.discard(rid)
+                    return FetchResult(rid, None, FETCH_MISSING, attempt, str(status_code))
+                reason = str(status_code)
+                retryable = status_code in RETRY_STATUSES
+                if status_code in THROTTLE_STATUSES:
+                    healthy = False
+                    retry_after = parse_retry_after(e.response.headers.get('Retry-After'))
+            except requests.exceptions.Timeout as e:
+                # таймаут чаще всего значит, что сайт не справляется с нагрузкой
+                reason = type(e).__name__
+                healthy = False
+            except requests.exceptions.RequestException as e:
+                reason = type(e).__name__
+            finally:
+                self.controller.release(epoch, healthy)
+
+            print(f"Ошибка при загрузке страницы rid={rid} (попытка {attempt}): {reason}")
+            if not retryable or attempt > self.__retries:
+                self.dead_letters.add(rid, reason, attempt)
+                return FetchResult(rid, None, FETCH_FAILED, attempt, reason)
+            delay = self.backoff_delay(attempt - 1, retry_after)
+            if retry_after is not None:
+                # сайт просит подождать всех, а не только этот поток
+                self.controller.pause(delay)
+            metrics.FETCH_RETRIES.inc(reason=reason)
+            self.__sleep(delay)
+
+    # повторная загрузка всех недокачанных rid по возрастанию; отдает результаты по мере загрузки.
+    # Скачанные rid уходят из списка, а снова не скачанные остаются в нем с новой причиной
+    def refetch_dead_letters(self) -> Iterator[FetchResult]:
+        for rid in self.dead_letters.rids():
+            yield self.fetch(rid)
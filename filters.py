@@ -0,0 +1,155 @@
+import random
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from models import Recipe
+from recipe_features import MEAL_TYPE_TERMS, COOKING_TIME_RANGES, DIFFICULTY_RANGES
+
+
+@dataclass
+class FilterConfig:
+    name: str
+    filter_func: Callable
+    requires_db: bool = False
+
+
+class RecipeFilter:
+    def __init__(self):
+        self.filters = {
+            'cooking_time': FilterConfig(
+                name='cooking_time',
+                filter_func=self._filter_cooking_time,
+                requires_db=False
+            ),
+            'meal_type': FilterConfig(
+                name='meal_type',
+                filter_func=self._filter_meal_type,
+                requires_db=False
+            ),
+            'difficulty': FilterConfig(
+                name='difficulty',
+                filter_func=self._filter_difficulty,
+                requires_db=False
+            )
+        }
+
+        # все признаки посчитаны при заливке (см. recipe_features.py) и лежат в индексируемых колонках
+        self._cooking_time_map = COOKING_TIME_RANGES
+        self._meal_type_map = {meal_type: getattr(Recipe, column) for meal_type, (column, _) in MEAL_TYPE_TERMS.items()}
+        self._difficulty_map = DIFFICULTY_RANGES
+
+    def apply_filters(self, query, db: Session, answers: Dict[str, str]):
+        """Применяет все активные фильтры"""
+        for filter_key, filter_config in self.filters.items():
+            if filter_key in answers and answers[filter_key]:
+                query = filter_config.filter_func(
+                    query,
+                    db if filter_config.requires_db else None,
+                    answers[filter_key]
+                )
+        return query
+
+    def normalize_answers(self, answers: Dict[str, str]) -> tuple:
+        """Ключ кэша: значения известных фильтров, неизвестные ответы (их фильтры игнорируют) -> ''"""
+        value_maps = {
+            'cooking_time': self._cooking_time_map,
+            'meal_type': self._meal_type_map,
+            'difficulty': self._difficulty_map,
+        }
+        return tuple(
+            (key, answers.get(key) if answers.get(key) in value_maps[key] else '')
+            for key in self.filters
+        )
+
+    def _filter_cooking_time(self, query, db: Optional[Session], cooking_time: str):
+        if cooking_time in self._cooking_time_map:
+            return self._filter_range(query, Recipe.cooking_minutes, self._cooking_time_map[cooking_time])
+        return query
+
+    def _filter_meal_type(self, query, db: Optional[Session], meal_type: str):
+        if meal_type in self._meal_type_map:
+            return query.filter(self._meal_type_map[meal_type].is_(True))
+        return query
+
+    def _filter_difficulty(self, query, db: Optional[Session], difficulty: str):
+        if difficulty in self._difficulty_map:
+            return self._filter_range(query, Recipe.ingredient_count, self._difficulty_map[difficulty])
+        return query
+
+    @staticmethod
+    def _filter_range(query, column, bounds):
+        low, high = bounds
+        if low is not None:
+            query = query.filter(column >= low)
+        if high is not None:
+            query = query.filter(column <= high)
+        return query
+
+
+# случайный рецепт из результата запроса без загрузки всех подходящих рецептов в память: считаем
+# подходящие строки и берем id со случайным смещением (по индексу, без чтения самих строк),
+# а затем загружаем один рецепт по первичному ключу. None - под запрос ничего не подходит
+def pick_random_recipe(db: Session, query) -> Optional[Recipe]:
+    ids_query = query.with_entities(Recipe.id).order_by(None)
+    total = ids_query.count()
+    if not total:
+        return None
+    recipe_id = ids_query.order_by(Recipe.id).offset(random.randrange(total)).limit(1).scalar()
+    return db.get(Recipe, recipe_id)
+
+
+# кэш id рецептов под каждую комбинацию ответов генератора (их всего 3 x 3 x 3 плюс пустые ответы).
+# Записи живут не дольше ttl секунд и вытесняются по LRU; invalidate() атомарно сбрасывает весь кэш,
+# а запрос, который начал считаться до сброса, свой результат в кэш уже не положит
+class FilterResultCache:
+    def __init__(self, max_entries: int = 64, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.__entries = OrderedDict()  # ключ -> (время записи, массив id)
+        self.__generation = 0
+        self.__lock = threading.Lock()
+
+    # id рецептов по ключу; при промахе они считаются через load() и запоминаются
+    def get_ids(self, key, load: Callable[[], Sequence[int]]) -> array:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self.__generation
+
+        ids = array('q', load())
+
+        with self.__lock:
+            if generation == self.__generation:
+                self.__entries[key] = (time.monotonic(), ids)
+                self.__entries.move_to_end(key)
+                while len(self.__entries) > self.max_entries:
+                    self.__entries.popitem(last=False)
+        return ids
+
+    def invalidate(self):
+        with self.__lock:
+            self.__generation += 1
+            self.__entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self.__lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'entries': len(self.__entries),
+            }
@@ -0,0 +1,70 @@
+import json
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from database import IN_CHUNK_SIZE
+from models import Recipe, Ingredient, Category, recipe_ingredient, recipe_category
+
+# загрузка рецептов вместе с ингредиентами (количество, единицы) и категориями одним запросом:
+# связанные строки собираются в JSON массивы прямо в SQLite коррелированными подзапросами,
+# поэтому на N рецептов уходит один запрос (на каждые IN_CHUNK_SIZE id), а не 1 + N
+
+_ingredients_json = (
+    select(func.json_group_array(func.json_object(
+        'ingredient_name', func.coalesce(recipe_ingredient.c.raw_name, Ingredient.ingredient_name),
+        'quantity', recipe_ingredient.c.quantity,
+        'unit', func.coalesce(recipe_ingredient.c.unit, '')
+    )))
+    .select_from(recipe_ingredient.join(Ingredient, Ingredient.id == recipe_ingredient.c.ingredient_id))
+    .where(recipe_ingredient.c.recipe_id == Recipe.id)
+    .scalar_subquery()
+)
+
+_categories_json = (
+    select(func.json_group_array(Category.name))
+    .select_from(recipe_category.join(Category, Category.id == recipe_category.c.category_id))
+    .where(recipe_category.c.recipe_id == Recipe.id)
+    .scalar_subquery()
+)
+
+
+def _hydrate_query(ids: List[int]):
+    return select(
+        Recipe.id,
+        Recipe.recipe_name,
+        Recipe.cooking_time,
+        Recipe.number_of_servings,
+        Recipe.description,
+        _ingredients_json.label('ingredients'),
+        _categories_json.label('categories'),
+    ).where(Recipe.id.in_(ids))
+
+
+def get_recipes_data(db: Session, ids: List[int]) -> List[Dict]:
+    """Полные данные рецептов по id в том же порядке, что и ids (несуществующие id пропускаются)"""
+    found = {}
+    for i in range(0, len(ids), IN_CHUNK_SIZE):
+        for row in db.execute(_hydrate_query(ids[i:i + IN_CHUNK_SIZE])):
+            found[row.id] = {
+                "id": row.id,
+                "recipe_name": row.recipe_name,
+                "cooking_time": row.cooking_time,
+                "number_of_servings": row.number_of_servings,
+                "description": row.description,
+                "ingredients": json.loads(row.ingredients),
+                "categories": json.loads(row.categories),
+            }
+    return [found[recipe_id] for recipe_id in ids if recipe_id in found]
+
+
+def get_recipe_data_by_id(db: Session, recipe_id: int) -> Optional[Dict]:
+    """Полные данные одного рецепта одним запросом (None, если рецепта нет)"""
+    recipes = get_recipes_data(db, [recipe_id])
+    return recipes[0] if recipes else None
+
+
+def get_recipe_data(db: Session, recipe: Recipe) -> Dict:
+    """Получает полные данные рецепта включая ингредиенты"""
+    return get_recipe_data_by_id(db, recipe.id)
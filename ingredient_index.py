@@ -0,0 +1,164 @@
+import threading
+from itertools import chain
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from database import IN_CHUNK_SIZE
+from models import recipe_ingredient
+
+# инвертированный индекс ингредиентов в памяти: id ингредиента -> отсортированный numpy массив id
+# рецептов, в которых он есть, плюс число ингредиентов каждого рецепта. Запросы вида "рецепты хотя бы
+# с k из этих ингредиентов" и "что приготовить из того, что есть" считаются пересечениями и подсчетом
+# совпадений по этим массивам, без JOIN по recipe_ingredient на каждый ингредиент
+
+# id рецептов в массивах; int32 вдвое экономнее int64, а до 2^31 рецептов нам далеко
+ID_DTYPE = np.int32
+
+
+# пары (ингредиент, рецепт) из запроса в массив формы (N, 2); через fromiter в разы быстрее, чем np.array
+# от списка строк
+def _fetch_pairs(db: Session, statement) -> np.ndarray:
+    return np.fromiter(chain.from_iterable(db.execute(statement)), dtype=ID_DTYPE).reshape(-1, 2)
+
+
+# группировка пар (ингредиент, рецепт) в словарь ингредиент -> отсортированный массив рецептов
+def _group_postings(ingredient_ids: np.ndarray, recipe_ids: np.ndarray) -> Dict[int, np.ndarray]:
+    order = np.lexsort((recipe_ids, ingredient_ids))
+    ingredient_ids, recipe_ids = ingredient_ids[order], recipe_ids[order]
+    keys, starts = np.unique(ingredient_ids, return_index=True)
+    return {int(key): np.unique(part) for key, part in zip(keys, np.split(recipe_ids, starts[1:]))}
+
+
+class IngredientIndex:
+    def __init__(self):
+        self.__postings: Dict[int, np.ndarray] = {}
+        # число различных ингредиентов рецепта по его id (0 - рецепта нет)
+        self.__counts = np.zeros(0, dtype=np.int16)
+        self.__max_recipe_id = 0
+        self.__lock = threading.Lock()
+
+    # полная сборка индекса по таблице recipe_ingredient
+    def build(self, db: Session):
+        pairs = _fetch_pairs(db, select(recipe_ingredient.c.ingredient_id, recipe_ingredient.c.recipe_id))
+        postings = _group_postings(pairs[:, 0], pairs[:, 1])
+        counts = self.__count_ingredients(postings, int(pairs[:, 1].max()) if len(pairs) else 0)
+        with self.__lock:
+            self.__postings = postings
+            self.__counts = counts
+            self.__max_recipe_id = len(counts) - 1 if len(counts) else 0
+
+    def clear(self):
+        with self.__lock:
+            self.__postings = {}
+            self.__counts = np.zeros(0, dtype=np.int16)
+            self.__max_recipe_id = 0
+
+    # обновление индекса после записи рецептов recipe_ids (новых или перезаписанных). Новые рецепты
+    # получают id больше всех уже известных, поэтому их достаточно дописать в конец массивов - порядок
+    # сохраняется. Перезаписанные сначала вычищаются из всех массивов
+    def update(self, db: Session, recipe_ids: Iterable[int]):
+        recipe_ids = np.unique(np.fromiter(recipe_ids, dtype=ID_DTYPE))
+        if not len(recipe_ids):
+            return
+        pairs = np.concatenate([np.zeros((0, 2), dtype=ID_DTYPE)] + [
+            _fetch_pairs(db, select(recipe_ingredient.c.ingredient_id, recipe_ingredient.c.recipe_id)
+                         .where(recipe_ingredient.c.recipe_id.in_(recipe_ids[i:i + IN_CHUNK_SIZE].tolist())))
+            for i in range(0, len(recipe_ids), IN_CHUNK_SIZE)
+        ])
+        added = _group_postings(pairs[:, 0], pairs[:, 1])
+
+        with self.__lock:
+            postings = dict(self.__postings)
+            rewritten = recipe_ids[recipe_ids <= self.__max_recipe_id]
+            if len(rewritten):
+                for ingredient_id, recipes in postings.items():
+                    postings[ingredient_id] = recipes[~np.isin(recipes, rewritten, assume_unique=True)]
+            for ingredient_id, recipes in added.items():
+                current = postings.get(ingredient_id)
+                if current is None:
+                    postings[ingredient_id] = recipes
+                elif len(rewritten):
+                    postings[ingredient_id] = np.union1d(current, recipes)
+                else:
+                    postings[ingredient_id] = np.concatenate((current, recipes))
+            postings = {ingredient_id: recipes for ingredient_id, recipes in postings.items() if len(recipes)}
+
+            max_recipe_id = max(self.__max_recipe_id, int(recipe_ids[-1]))
+            counts = np.zeros(max_recipe_id + 1, dtype=np.int16)
+            counts[:len(self.__counts)] = self.__counts
+            counts[recipe_ids] = 0
+            for recipes in added.values():
+                counts[recipes] += 1
+
+            self.__postings = postings
+            self.__counts = counts
+            self.__max_recipe_id = max_recipe_id
+
+    @staticmethod
+    def __count_ingredients(postings: Dict[int, np.ndarray], max_recipe_id: int) -> np.ndarray:
+        counts = np.zeros(max_recipe_id + 1, dtype=np.int16) if max_recipe_id else np.zeros(0, dtype=np.int16)
+        for recipes in postings.values():
+            counts[recipes] += 1
+        return counts
+
+    def __snapshot(self, ingredient_ids: Iterable[int]) -> Tuple[List[np.ndarray], np.ndarray]:
+        with self.__lock:
+            postings = self.__postings
+            counts = self.__counts
+        empty = np.zeros(0, dtype=ID_DTYPE)
+        return [postings.get(ingredient_id, empty) for ingredient_id in set(ingredient_ids)], counts
+
+    # рецепты, в которых есть все перечисленные ингредиенты, с числом совпадений и недостающих
+    # ингредиентов (как у overlapping); по возрастанию недостающих
+    def containing_all(self, ingredient_ids: Iterable[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        arrays, counts = self.__snapshot(ingredient_ids)
+        if not arrays:
+            empty = np.zeros(0, dtype=ID_DTYPE)
+            return empty, empty, empty
+        # пересекаем начиная с самых коротких массивов, чтобы промежуточный результат быстро сжимался
+        arrays.sort(key=len)
+        recipes = arrays[0]
+        for other in arrays[1:]:
+            if not len(recipes):
+                break
+            recipes = np.intersect1d(recipes, other, assume_unique=True)
+        matches = np.full(len(recipes), len(arrays))
+        missing = counts[recipes] - matches
+        order = np.lexsort((recipes, missing))
+        return recipes[order], matches[order], missing[order]
+
+    # рецепты хотя бы с min_matches из перечисленных ингредиентов и у каждого - число совпадений
+    # и число недостающих ингредиентов; по убыванию совпадений, затем по возрастанию недостающих
+    def overlapping(self, ingredient_ids: Iterable[int],
+                    min_matches: int = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        arrays, counts = self.__snapshot(ingredient_ids)
+        if not arrays:
+            empty = np.zeros(0, dtype=ID_DTYPE)
+            return empty, empty, empty
+        recipes, matches = np.unique(np.concatenate(arrays), return_counts=True)
+        keep = matches >= min_matches
+        recipes, matches = recipes[keep], matches[keep]
+        missing = counts[recipes] - matches
+        order = np.lexsort((recipes, missing, -matches))
+        return recipes[order], matches[order], missing[order]
+
+    # "что приготовить из того, что есть": рецепты, которым не хватает не больше max_missing ингредиентов
+    def cookable_with(self, ingredient_ids: Iterable[int],
+                      max_missing: int = 0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        recipes, matches, missing = self.overlapping(ingredient_ids)
+        keep = missing <= max_missing
+        return recipes[keep], matches[keep], missing[keep]
+
+    def stats(self) -> Dict[str, int]:
+        with self.__lock:
+            postings = self.__postings
+            counts = self.__counts
+        return {
+            'ingredients': len(postings),
+            'recipes': int(np.count_nonzero(counts)),
+            'postings': int(sum(len(recipes) for recipes in postings.values())),
+            'memory_bytes': int(sum(recipes.nbytes for recipes in postings.values()) + counts.nbytes),
+        }
@@ -0,0 +1,121 @@
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
+
+# фоновые задачи (сейчас это перезаполнение БД): задача выполняется в отдельном потоке, а ручка
+# сразу возвращает ее id, по которому потом можно узнать состояние и прогресс
+
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+# задачу не запустить, потому что уже идет задача, с которой она не может идти одновременно
+class JobConflict(Exception):
+    def __init__(self, job: 'Job'):
+        super().__init__(f"Уже идет задача {job.kind}: {job.id}")
+        self.job = job
+
+
+class Job:
+    def __init__(self, kind: str, params: dict):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = JOB_PENDING
+        # прогресс задача обновляет сама (например, сколько рецептов уже сохранено)
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JOB_DONE, JOB_FAILED)
+
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'params': self.params,
+            'status': self.status,
+            'progress': dict(self.progress),
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+# исполнитель задач: не больше max_workers задач одновременно, остальные ждут в очереди.
+# Помнит последние keep_finished завершенных задач, чтобы их состояние можно было запросить
+class JobRunner:
+    def __init__(self, max_workers: int = 1, keep_finished: int = 100):
+        self.keep_finished = keep_finished
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.__jobs: Dict[str, Job] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    # запуск задачи func(job); возвращает задачу сразу, не дожидаясь выполнения
+    def submit(self, kind: str, params: dict, func: Callable[[Job], object]) -> Job:
+        job = Job(kind, params)
+        with self.__lock:
+            self.__jobs[job.id] = job
+            self.__forget_finished()
+        self.__executor.submit(self.__run, job, func)
+        return job
+
+    # то же, но задача не запускается (JobConflict), если уже идет задача одного из видов kinds.
+    # Проверка и постановка в очередь делаются под одной блокировкой, поэтому из двух одновременных
+    # вызовов задачу запускает только один
+    def submit_exclusive(self, kinds: Iterable[str], kind: str, params: dict, func: Callable[[Job], object]) -> Job:
+        job = Job(kind, params)
+        with self.__lock:
+            active = self.__active(kinds)
+            if active is not None:
+                raise JobConflict(active)
+            self.__jobs[job.id] = job
+            self.__forget_finished()
+        self.__executor.submit(self.__run, job, func)
+        return job
+
+    def __run(self, job: Job, func: Callable[[Job], object]):
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = func(job)
+            job.status = JOB_DONE
+        except Exception as e:
+            job.error = str(e) or type(e).__name__
+            job.status = JOB_FAILED
+            traceback.print_exc()
+        finally:
+            job.finished_at = time.time()
+
+    def __forget_finished(self):
+        finished = [job_id for job_id, job in self.__jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self.__jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.__lock:
+            return self.__jobs.get(job_id)
+
+    # еще не завершенная задача одного из видов kinds (None, если такой нет)
+    def active(self, *kinds: str) -> Optional[Job]:
+        with self.__lock:
+            return self.__active(kinds)
+
+    def __active(self, kinds) -> Optional[Job]:
+        return next((job for job in self.__jobs.values() if job.kind in kinds and not job.finished), None)
+
+    def shutdown(self, wait: bool = True):
+        self.__executor.shutdown(wait=wait)
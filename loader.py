@@ -0,0 +1,478 @@
+import time
+from typing import Dict, Iterable, List
+from sqlalchemy.orm import Session
+from sqlalchemy import text, select, func, exists, bindparam, case
+from models import Ingredient, Recipe, Category, CrawlState, DeadLetter, Unit, recipe_category, recipe_ingredient
+
+from recipe_features import MEAL_TYPE_TERMS, parse_cooking_minutes, meal_type_flags
+from search import index_recipes
+from normalize import canonical_units, canonical_ingredients
+import metrics
+from database import IN_CHUNK_SIZE, begin_write
+from fetcher import DeadLetters
+from parsing import (
+    NameIndex,
+    get_all_categories, get_all_recipes, get_all_ingredients,
+    get_categories_and_recipe_db_table, get_ingredients_and_recipe_db_table
+)
+
+# имя обхода russianfood в таблице crawl_state
+CRAWL_SOURCE = 'russianfood'
+
+
+def fill_database(db: Session, parsed_recipes: List, dead_letters: DeadLetters = None) -> List[int]:
+    return bulk_fill_database(db, parsed_recipes, dead_letters)
+
+
+# старый путь заполнения: по запросу на каждую категорию, ингредиент и строку сводных таблиц.
+# Оставлен для сравнения в benchmarks/bench_fill.py
+def fill_database_rowwise(db: Session, parsed_recipes: List):
+    try:
+        # 1. Добавляем категории (с проверкой на существование)
+        categories_set = get_all_categories(parsed_recipes)
+        category_map = {}
+
+        for category_name in categories_set:
+            # Проверяем, существует ли категория
+            existing_category = db.query(Category).filter(Category.name == category_name).first()
+            if existing_category:
+                category_map[category_name] = existing_category.id
+            else:
+                db_category = Category(name=category_name)
+                db.add(db_category)
+                db.flush()
+                category_map[category_name] = db_category.id
+
+        # 2. Добавляем ингредиенты (с проверкой на существование)
+        ingredients_set = get_all_ingredients(parsed_recipes)
+        ingredient_map = {}
+
+        for ingredient_name in ingredients_set:
+            # Проверяем, существует ли ингредиент
+            existing_ingredient = db.query(Ingredient).filter(Ingredient.ingredient_name == ingredient_name).first()
+            if existing_ingredient:
+                ingredient_map[ingredient_name] = existing_ingredient.id
+            else:
+                db_ingredient = Ingredient(ingredient_name=ingredient_name)
+                db.add(db_ingredient)
+                db.flush()
+                ingredient_map[ingredient_name] = db_ingredient.id
+
+        # 3. Добавляем рецепты
+        recipes_data = get_all_recipes(parsed_recipes)
+        db_recipes = []
+
+        for recipe_data in recipes_data:
+            db_recipe = Recipe(**recipe_data)
+            db.add(db_recipe)
+            db_recipes.append(db_recipe)
+        db.flush()  # Получаем ID для всех рецептов
+
+        # ID добавленных рецептов в порядке parsed_recipes: в сводных таблицах recipe_id - это номер
+        # рецепта в переданной пачке, а не в БД, где уже могут лежать рецепты из прошлых пачек
+        recipe_ids = [db_recipe.id for db_recipe in db_recipes]
+
+        # 4. Добавляем связи рецепт-ингредиент
+        ingredient_index = NameIndex()
+        recipe_ingr_data = get_ingredients_and_recipe_db_table(parsed_recipes, ingredient_index)
+        # id из индекса -> название, чтобы по нему взять реальный ID из нашего словаря
+        ingredient_names = {name_id: name for name, name_id in ingredient_index.ids().items()}
+        for row in recipe_ingr_data:
+            if row['recipe_id'] <= len(recipe_ids):
+
+                recipe_id = recipe_ids[row['recipe_id'] - 1]
+                ingredient_name = ingredient_names[row['ingredient_id']]
+
+                # каждая строка рецепта сохраняется, даже если ее ингредиент уже встречался в рецепте
+                stmt = recipe_ingredient.insert().values(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_map[ingredient_name],
+                    raw_name=row['raw_name'],
+                    quantity=row['quantity'],
+                    unit=row['unit'],
+                    position=row['position']
+                )
+                db.execute(stmt)
+
+        # 5. Добавляем связи рецепт-категория  
+        category_index = NameIndex()
+        recipe_category_data = get_categories_and_recipe_db_table(parsed_recipes, category_index)
+        category_names = {name_id: name for name, name_id in category_index.ids().items()}
+        for row in recipe_category_data:
+            if row['recipe_id'] <= len(recipe_ids):
+
+                recipe_id = recipe_ids[row['recipe_id'] - 1]
+                category_name = category_names[row['category_id']]
+
+                # Проверяем, существует ли уже такая связь
+                existing_link = db.execute(
+                    text("SELECT 1 FROM recipe_category WHERE recipe_id = :recipe_id AND category_id = :category_id"),
+                    {"recipe_id": recipe_id, "category_id": category_map[category_name]}
+                ).first()
+
+                if not existing_link:
+                    stmt = recipe_category.insert().values(
+                        recipe_id=recipe_id,
+                        category_id=category_map[category_name]
+                    )
+                    db.execute(stmt)
+
+        # 6. Поисковый индекс
+        index_recipes(db, recipe_ids)
+
+        db.commit()
+        print("База данных успешно заполнена")
+
+    except Exception as e:
+        db.rollback()
+        print(f"Ошибка при заполнении базы данных: {e}")
+        raise
+
+
+# функция получения словаря имя -> id для уже записанных в таблицу имен
+def _resolve_ids(db: Session, table, name_column, names: List[str]) -> Dict[str, int]:
+    mapping = {}
+    for i in range(0, len(names), IN_CHUNK_SIZE):
+        chunk = names[i:i + IN_CHUNK_SIZE]
+        rows = db.execute(select(table.c.id, name_column).where(name_column.in_(chunk)))
+        mapping.update({name: row_id for row_id, name in rows})
+    return mapping
+
+
+# индекс имен для пачки: имена, уже лежащие в таблице, получают свои id из БД, а новые - id,
+# начиная со следующего за максимальным. Поэтому id из индекса совпадают с тем, что окажется в БД
+def _load_name_index(db: Session, table, column_name: str, names: Iterable[str]) -> NameIndex:
+    existing = _resolve_ids(db, table, table.c[column_name], list(names))
+    next_id = (db.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+    return NameIndex(existing, next_id)
+
+
+# вставка имен, которым id выдал индекс, сразу с этими id одним executemany
+def _insert_new_names(db: Session, table, column_name: str, index: NameIndex):
+    new_names = index.new_names()
+    if new_names:
+        db.execute(table.insert(), [{'id': name_id, column_name: name} for name_id, name in new_names])
+
+
+# строки сводной таблицы без повторов пары (рецепт, key): на одном рецепте одна категория
+def _unique_rows(rows: List[dict], key: str) -> List[dict]:
+    unique = {}
+    for row in rows:
+        unique.setdefault((row['recipe_id'], row[key]), row)
+    return list(unique.values())
+
+
+# уже сохраненные рецепты пачки: source_rid -> (id, content_hash)
+def _existing_recipes(db: Session, parsed_recipes: List) -> Dict[int, tuple]:
+    rids = [recipe.source_rid for recipe in parsed_recipes if recipe.source_rid is not None]
+    existing = {}
+    for i in range(0, len(rids), IN_CHUNK_SIZE):
+        rows = db.execute(
+            select(Recipe.source_rid, Recipe.id, Recipe.content_hash)
+            .where(Recipe.source_rid.in_(rids[i:i + IN_CHUNK_SIZE]))
+        )
+        existing.update({rid: (recipe_id, content_hash) for rid, recipe_id, content_hash in rows})
+    return existing
+
+
+# функция получения контрольной точки обхода: rid, до которого все рецепты уже лежат в БД
+def get_checkpoint(db: Session, source: str = CRAWL_SOURCE) -> int:
+    state = db.get(CrawlState, source)
+    return state.last_rid if state else 0
+
+
+# сдвиг контрольной точки вперед (назад она не двигается); коммитится вместе с пачкой рецептов
+def _advance_checkpoint(db: Session, rid: int, source: str = CRAWL_SOURCE):
+    state = db.get(CrawlState, source)
+    if state is None:
+        db.add(CrawlState(source=source, last_rid=rid))
+    elif rid > state.last_rid:
+        state.last_rid = rid
+    db.flush()
+
+
+# недокачанные страницы обхода (таблица dead_letters), например для повторной загрузки
+def load_dead_letters(db: Session, source: str = CRAWL_SOURCE) -> DeadLetters:
+    rows = db.execute(
+        select(DeadLetter.rid, DeadLetter.reason, DeadLetter.attempts, DeadLetter.failed_at)
+        .where(DeadLetter.source == source)
+    )
+    return DeadLetters(dict(row._mapping) for row in rows)
+
+
+# запись недокачанных страниц в транзакцию db: скачавшиеся (dead_letters.resolved()) удаляются, а из
+# остальных пишутся только rid не дальше контрольной точки. Страницы за ней следующий дообход все равно
+# запросит снова, а до нее обход уже не вернется, и без записи в таблице они потерялись бы
+def _store_dead_letters(db: Session, dead_letters: DeadLetters, source: str = CRAWL_SOURCE):
+    checkpoint = get_checkpoint(db, source)
+    rows = [dict(entry, source=source) for entry in dead_letters.entries() if entry['rid'] <= checkpoint]
+    stale = dead_letters.resolved() + [row['rid'] for row in rows]
+    for i in range(0, len(stale), IN_CHUNK_SIZE):
+        db.execute(DeadLetter.__table__.delete().where(
+            DeadLetter.source == source, DeadLetter.rid.in_(stale[i:i + IN_CHUNK_SIZE])))
+    if rows:
+        db.execute(DeadLetter.__table__.insert(), rows)
+
+
+# сохранение недокачанных страниц отдельной транзакцией (когда пачки рецептов, с которой они
+# записались бы, нет: например, при повторной загрузке ни одна страница не скачалась)
+def save_dead_letters(db: Session, dead_letters: DeadLetters, source: str = CRAWL_SOURCE):
+    try:
+        begin_write(db)
+        _store_dead_letters(db, dead_letters, source)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+# быстрый путь заполнения: имена разрешаются в id в памяти через NameIndex, все таблицы пишутся пачками
+# через executemany, и вся пачка рецептов коммитится одной транзакцией.
+# Рецепты с source_rid работают как upsert: уже сохраненный и не изменившийся рецепт пропускается,
+# изменившийся перезаписывается под своим прежним id. Id новых рецептов и имен раздаются от max(id) + 1,
+# поэтому блокировка на запись берется до первого чтения: иначе запись из другого соединения (например,
+# POST /ingredients/ во время дообхода) могла бы занять тот же id или имя между чтением и вставкой.
+# dead_letters (если задан) - недокачанные страницы обхода, они пишутся вместе с контрольной точкой.
+# Возвращает id записанных (новых и перезаписанных) рецептов
+def bulk_fill_database(db: Session, parsed_recipes: List, dead_letters: DeadLetters = None) -> List[int]:
+    started = time.perf_counter()
+    try:
+        begin_write(db)
+        existing = _existing_recipes(db, parsed_recipes)
+        next_id = (db.execute(select(func.max(Recipe.id))).scalar() or 0) + 1
+
+        to_write, recipes_data, recipe_ids, changed_ids = [], [], [], []
+        for recipe, recipe_data in zip(parsed_recipes, get_all_recipes(parsed_recipes)):
+            known = existing.get(recipe.source_rid)
+            if known and known[1] == recipe_data['content_hash']:
+                continue
+            if known:
+                recipe_data['id'] = known[0]
+                changed_ids.append(known[0])
+            else:
+                # id новых рецептов раздаем сами, начиная со следующего за максимальным
+                recipe_data['id'] = next_id
+                next_id += 1
+            to_write.append(recipe)
+            recipes_data.append(recipe_data)
+            recipe_ids.append(recipe_data['id'])
+
+        category_index = _load_name_index(db, Category.__table__, 'name', get_all_categories(to_write))
+        ingredient_index = _load_name_index(db, Ingredient.__table__, 'ingredient_name',
+                                            get_all_ingredients(to_write))
+
+        ingredient_rows = get_ingredients_and_recipe_db_table(to_write, ingredient_index, recipe_ids)
+        category_rows = get_categories_and_recipe_db_table(to_write, category_index, recipe_ids)
+
+        # единицы измерения из словаря units: канонические названия считаются сразу для всего столбца
+        unit_names = canonical_units([row['unit'] for row in ingredient_rows])
+        unit_index = _load_name_index(db, Unit.__table__, 'name', set(unit_names.tolist()) - {None})
+        for row, unit_name in zip(ingredient_rows, unit_names.tolist()):
+            row['unit_id'] = unit_index.id_of(unit_name) if unit_name else None
+
+        # 1-2. Новые категории, ингредиенты и единицы измерения
+        _insert_new_names(db, Category.__table__, 'name', category_index)
+        _insert_new_names(db, Ingredient.__table__, 'ingredient_name', ingredient_index)
+        _insert_new_names(db, Unit.__table__, 'name', unit_index)
+
+        # 3. Рецепты: у изменившихся сначала удаляем старые строку и связи, потом пишем все одним executemany
+        for i in range(0, len(changed_ids), IN_CHUNK_SIZE):
+            chunk = changed_ids[i:i + IN_CHUNK_SIZE]
+            db.execute(recipe_ingredient.delete().where(recipe_ingredient.c.recipe_id.in_(chunk)))
+            db.execute(recipe_category.delete().where(recipe_category.c.recipe_id.in_(chunk)))
+            db.execute(Recipe.__table__.delete().where(Recipe.id.in_(chunk)))
+        if recipes_data:
+            db.execute(Recipe.__table__.insert(), recipes_data)
+
+        # 4-5. Сводные таблицы. Строки ингредиентов пишутся все, даже если несколько строк рецепта ведут
+        # к одному словарному ингредиенту: у каждой свои исходное название, количество и единица.
+        # Повторы категорий внутри одного рецепта отбрасываем, как и построчный путь
+        category_rows = _unique_rows(category_rows, 'category_id')
+        if ingredient_rows:
+            db.execute(recipe_ingredient.insert(), ingredient_rows)
+        if category_rows:
+            db.execute(recipe_category.insert(), category_rows)
+
+        # 6. Поисковый индекс по новым и перезаписанным рецептам
+        index_recipes(db, recipe_ids)
+
+        # 7. Контрольная точка обхода и недокачанные страницы до нее - в той же транзакции, что и сами рецепты
+        rids = [recipe.source_rid for recipe in parsed_recipes if recipe.source_rid is not None]
+        if rids:
+            _advance_checkpoint(db, max(rids))
+        if dead_letters is not None:
+            _store_dead_letters(db, dead_letters)
+
+        metrics.DB_FILL_SECONDS.observe(time.perf_counter() - started)
+        with metrics.DB_COMMIT_SECONDS.time():
+            db.commit()
+        inserted = {
+            'categories': len(category_index.new_names()),
+            'ingredients': len(ingredient_index.new_names()),
+            'units': len(unit_index.new_names()),
+            'recipes': len(recipes_data),
+            'recipe_ingredient': len(ingredient_rows),
+            'recipe_category': len(category_rows),
+        }
+        for table_name, rows in inserted.items():
+            metrics.DB_ROWS_INSERTED.inc(rows, table=table_name)
+        metrics.DB_RECIPES.inc(len(recipes_data) - len(changed_ids), result='new')
+        metrics.DB_RECIPES.inc(len(changed_ids), result='rewritten')
+        metrics.DB_RECIPES.inc(len(parsed_recipes) - len(recipes_data), result='unchanged')
+        print(f"База данных успешно заполнена ({len(recipes_data)} рецептов, "
+              f"из них перезаписано {len(changed_ids)}, без изменений {len(parsed_recipes) - len(recipes_data)})")
+        return recipe_ids
+
+    except Exception as e:
+        db.rollback()
+        print(f"Ошибка при заполнении базы данных: {e}")
+        raise
+
+
+# досчет признаков для фильтров (см. recipe_features.py) у рецептов, залитых до появления этих колонок.
+# Признаком "не посчитано" служит пустой ingredient_count: у новых рецептов он заполняется при заливке
+def backfill_recipe_features(db: Session) -> int:
+    table = Recipe.__table__
+    pending = db.execute(select(table.c.id, table.c.cooking_time).where(table.c.ingredient_count.is_(None))).all()
+    if not pending:
+        return 0
+    try:
+        db.execute(
+            table.update().where(table.c.id == bindparam('recipe_id')).values(cooking_minutes=bindparam('minutes')),
+            [{'recipe_id': recipe_id, 'minutes': parse_cooking_minutes(cooking_time)}
+             for recipe_id, cooking_time in pending]
+        )
+
+        # флаги приема пищи: сначала размечаем словарь категорий, потом рецепты по их категориям
+        flag_categories = {column: [] for column, _ in MEAL_TYPE_TERMS.values()}
+        for category_id, name in db.execute(select(Category.id, Category.name)):
+            for column, flag in meal_type_flags([name]).items():
+                if flag:
+                    flag_categories[column].append(category_id)
+
+        values = {
+            'ingredient_count': select(func.count(func.distinct(recipe_ingredient.c.ingredient_id)))
+            .where(recipe_ingredient.c.recipe_id == table.c.id)
+            .scalar_subquery()
+        }
+        for column, category_ids in flag_categories.items():
+            values[column] = exists().where(
+                recipe_category.c.recipe_id == table.c.id,
+                recipe_category.c.category_id.in_(category_ids)
+            ) if category_ids else False
+        db.execute(table.update().where(table.c.ingredient_count.is_(None)).values(**values))
+
+        db.commit()
+        print(f"Признаки для фильтров досчитаны у {len(pending)} рецептов")
+        return len(pending)
+
+    except Exception as e:
+        db.rollback()
+        print(f"Ошибка при досчете признаков рецептов: {e}")
+        raise
+
+
+# заполнение unit_id у строк recipe_ingredient, залитых до появления словаря единиц: различных
+# написаний единиц немного, поэтому все строки обновляются одним UPDATE с CASE по написанию.
+# Возвращает число обработанных написаний
+def backfill_unit_ids(db: Session) -> int:
+    raw_units = db.execute(
+        select(recipe_ingredient.c.unit).distinct()
+        .where(recipe_ingredient.c.unit_id.is_(None), recipe_ingredient.c.unit.is_not(None))
+    ).scalars().all()
+    unit_names = dict(zip(raw_units, canonical_units(raw_units).tolist()))
+    unit_names = {raw_unit: unit_name for raw_unit, unit_name in unit_names.items() if unit_name}
+    if not unit_names:
+        return 0
+    try:
+        begin_write(db)
+        unit_index = _load_name_index(db, Unit.__table__, 'name', set(unit_names.values()))
+        unit_ids = {raw_unit: unit_index.id_of(unit_name) for raw_unit, unit_name in unit_names.items()}
+        _insert_new_names(db, Unit.__table__, 'name', unit_index)
+        raw_units = list(unit_ids)
+        for i in range(0, len(raw_units), IN_CHUNK_SIZE):
+            chunk = {raw_unit: unit_ids[raw_unit] for raw_unit in raw_units[i:i + IN_CHUNK_SIZE]}
+            db.execute(
+                recipe_ingredient.update()
+                .where(recipe_ingredient.c.unit_id.is_(None), recipe_ingredient.c.unit.in_(list(chunk)))
+                .values(unit_id=case(chunk, value=recipe_ingredient.c.unit))
+            )
+        db.commit()
+        print(f"Единицы измерения проставлены для {len(unit_ids)} написаний")
+        return len(unit_ids)
+
+    except Exception as e:
+        db.rollback()
+        print(f"Ошибка при заполнении единиц измерения: {e}")
+        raise
+
+
+# перевод таблицы ingredients на словарные формы названий (normalize.canonical_ingredient) в базе,
+# залитой до их появления: исходные названия переезжают в recipe_ingredient.raw_name, варианты одного
+# продукта ("Мука пшеничная", "мука") сливаются в одну строку ingredients, у затронутых рецептов
+# пересчитывается ingredient_count. Возвращает число строк ingredients, которые слились с другими
+def backfill_ingredient_vocabulary(db: Session) -> int:
+    table = Ingredient.__table__
+    rows = db.execute(select(table.c.id, table.c.ingredient_name)).all()
+    canonical = dict(zip([ingredient_id for ingredient_id, _ in rows],
+                         canonical_ingredients([name for _, name in rows]).tolist()))
+    if all(canonical[ingredient_id] == name for ingredient_id, name in rows):
+        return 0
+    try:
+        # 1. Исходные названия - в связи рецептов, пока они еще есть в ingredients
+        db.execute(
+            recipe_ingredient.update().where(recipe_ingredient.c.raw_name.is_(None))
+            .values(raw_name=select(table.c.ingredient_name)
+                    .where(table.c.id == recipe_ingredient.c.ingredient_id).scalar_subquery())
+        )
+
+        # 2. Для каждой словарной формы одна строка: та, где название уже совпадает, иначе с меньшим id
+        names = {ingredient_id: name for ingredient_id, name in rows}
+        targets = {}
+        for ingredient_id, _ in sorted(rows, key=lambda row: (canonical[row[0]] != row[1], row[0])):
+            targets.setdefault(canonical[ingredient_id], ingredient_id)
+        merged = {ingredient_id: targets[canonical[ingredient_id]] for ingredient_id, _ in rows
+                  if targets[canonical[ingredient_id]] != ingredient_id}
+        renamed = [ingredient_id for name, ingredient_id in targets.items() if names[ingredient_id] != name]
+
+        # 3. Связи слитых строк переводим на оставшиеся. Строки рецептов не удаляем, даже если теперь
+        # несколько из них ведут к одному ингредиенту: у каждой свои исходное название и количество
+        merged_ids = list(merged)
+        for i in range(0, len(merged_ids), IN_CHUNK_SIZE):
+            chunk = {ingredient_id: merged[ingredient_id] for ingredient_id in merged_ids[i:i + IN_CHUNK_SIZE]}
+            db.execute(
+                recipe_ingredient.update().where(recipe_ingredient.c.ingredient_id.in_(list(chunk)))
+                .values(ingredient_id=case(chunk, value=recipe_ingredient.c.ingredient_id))
+            )
+        if merged:
+            for i in range(0, len(merged_ids), IN_CHUNK_SIZE):
+                db.execute(table.delete().where(table.c.id.in_(merged_ids[i:i + IN_CHUNK_SIZE])))
+
+        # 4. Оставшимся строкам - словарные названия
+        if renamed:
+            db.execute(
+                table.update().where(table.c.id == bindparam('ingredient_id')).values(ingredient_name=bindparam('name')),
+                [{'ingredient_id': ingredient_id, 'name': canonical[ingredient_id]} for ingredient_id in renamed]
+            )
+
+        # 5. Число различных ингредиентов у рецептов, где что-то слилось
+        target_ids = sorted(set(merged.values()))
+        for i in range(0, len(target_ids), IN_CHUNK_SIZE):
+            affected = select(recipe_ingredient.c.recipe_id).where(
+                recipe_ingredient.c.ingredient_id.in_(target_ids[i:i + IN_CHUNK_SIZE]))
+            db.execute(
+                Recipe.__table__.update().where(Recipe.id.in_(affected)).values(
+                    ingredient_count=select(func.count(func.distinct(recipe_ingredient.c.ingredient_id)))
+                    .where(recipe_ingredient.c.recipe_id == Recipe.id)
+                    .scalar_subquery()
+                )
+            )
+
+        db.commit()
+        print(f"Словарь ингредиентов: {len(rows)} названий -> {len(targets)}, слито {len(merged)}")
+        return len(merged)
+
+    except Exception as e:
+        db.rollback()
+        print(f"Ошибка при переводе ингредиентов на словарные названия: {e}")
+        raise
@@ -1,33 +1,77 @@
-from fastapi import FastAPI, Depends, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Depends, HTTPException, Request, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from sqlalchemy import text, or_, func
 from typing import List, Dict, Optional
+import os
 import random
+import tempfile
+import time
 from models import Base, Ingredient, Recipe, Category, recipe_category, recipe_ingredient
-from database import engine, session_local
-from schemas import IngredientCreate, CategoryCreate, RecipeCreate, Ingredient as db_ingr, Recipe as db_recipe
+from database import (
+    engine, session_local, read_session_local, migrate, shadow_database, rollback_database, read_db_pointer,
+    refresh_database, working_database_write
+)
+from schemas import IngredientCreate, CategoryCreate, RecipeCreate, RecipePage, RecipeSearchHit, RecipeIngredientMatch, Ingredient as db_ingr, Recipe as db_recipe
 from typing import Dict, List, Callable, Any
-from dataclasses import dataclass
 
-from parsing import (
-    RecipeParser,
-    get_all_categories, get_all_recipes, get_all_ingredients,
-    get_categories_and_recipe_db_table, get_ingredients_and_recipe_db_table
+from filters import RecipeFilter, FilterResultCache, pick_random_recipe
+from hydration import get_recipe_data, get_recipe_data_by_id, get_recipes_data
+from loader import (
+    fill_database, get_checkpoint, load_dead_letters, backfill_recipe_features, backfill_unit_ids,
+    backfill_ingredient_vocabulary
 )
+from pipeline import ingest, iter_parsed_recipes, iter_cached_recipes, iter_refetched_recipes, DEFAULT_BATCH_SIZE
+from ingredient_index import IngredientIndex
+from search import rebuild_search_index, search_recipes
+from normalize import canonical_ingredient
+from page_cache import PageCache, CACHE_MODES, CACHE_USE, CACHE_OFFLINE
+from fetcher import DeadLetters
+from parsing import BASE_URL
+from jobs import Job, JobConflict, JobRunner
+from corpus_io import iter_export_gzip, import_into_shadow
+import metrics
 
 app = FastAPI()
+# время обработки каждого запроса к API - в метрики (GET /metrics)
+app.add_middleware(metrics.RequestMetricsMiddleware)
 
 # Подключаем статические файлы и шаблоны
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
 Base.metadata.create_all(bind=engine)
+migrate(engine)
+with session_local() as startup_db:
+    backfill_recipe_features(startup_db)
+    backfill_ingredient_vocabulary(startup_db)
+    backfill_unit_ids(startup_db)
+    rebuild_search_index(startup_db)
+
+
+# сайт, с которого перезаполняется БД (переопределяется переменной окружения RECIPES_SOURCE_URL)
+SOURCE_URL = os.environ.get('RECIPES_SOURCE_URL', BASE_URL)
+
+# фоновые задачи; перезаполнение БД - задача вида REFILL_JOB, загрузка корпуса из выгрузки - IMPORT_JOB
+REFILL_JOB = 'refill'
+IMPORT_JOB = 'import'
+job_runner = JobRunner(max_workers=1)
 
 
+# рабочую БД мог переключить другой процесс приложения: тогда переподключаемся к ней и сбрасываем все,
+# что в памяти посчитано по старой
+def _sync_database():
+    if refresh_database():
+        _reload_database_state()
+
+
+# ручки, которые ходят в БД, объявлены обычными def, а не async def: FastAPI выполняет их в пуле потоков,
+# и синхронная сессия SQLAlchemy не блокирует event loop и остальные запросы
 def get_db():
+    _sync_database()
     db = session_local()
     try:
         yield db
@@ -35,6 +79,26 @@ def get_db():
         db.close()
 
 
+# сессия для ручек, которые пишут в рабочую БД мимо заливки. Пока собирается новая БД (полное
+# перезаполнение или загрузка корпуса), запись потерялась бы при переключении, поэтому отвечаем 409
+def get_write_db():
+    with working_database_write() as writable:
+        if not writable:
+            raise HTTPException(status_code=409, detail="Идет сборка новой БД, запись в рабочую БД недоступна")
+        yield from get_db()
+
+
+# сессия для ручек, которые только читают: соединения из отдельного пула read_engine (query_only),
+# в режиме WAL они не ждут пишущую транзакцию заливки
+def get_read_db():
+    _sync_database()
+    db = read_session_local()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 @app.get("/", response_class=HTMLResponse)
 async def main_page(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -42,19 +106,21 @@ async def main_page(request: Request):
 
 # ручка для добавления ингридиента
 @app.post("/ingredients/", response_model=db_ingr)
-async def create_ingredient(ingredient: IngredientCreate, db: Session = Depends(get_db)):
+def create_ingredient(ingredient: IngredientCreate, db: Session = Depends(get_write_db)):
     try:
-        # Проверяем, существует ли уже такой ингредиент
+        # Проверяем, существует ли уже такой ингредиент (в словаре названия хранятся в словарной форме)
+        ingredient_name = canonical_ingredient(ingredient.ingredient_name)
         existing_ingredient = db.query(Ingredient).filter(
-            Ingredient.ingredient_name == ingredient.ingredient_name
+            Ingredient.ingredient_name == ingredient_name
         ).first()
 
         if existing_ingredient:
             raise HTTPException(status_code=400, detail="Ингредиент уже существует")
 
-        db_ingredient = Ingredient(ingredient_name=ingredient.ingredient_name)
+        db_ingredient = Ingredient(ingredient_name=ingredient_name)
         db.add(db_ingredient)
         db.commit()
+        filter_cache.invalidate()
         db.refresh(db_ingredient)
         return db_ingredient
     except Exception as e:
@@ -62,324 +128,413 @@ async def create_ingredient(ingredient: IngredientCreate, db: Session = Depends(
         raise HTTPException(status_code=500, detail=f"Ошибка при создании ингредиента: {str(e)}")
 
 
-# ручка для перезаполнения БД (допустим захотели получить актуальную информацию или расширить базу рецептов)
-@app.post("/refill_database/")
-async def refill_database(count: int, db: Session = Depends(get_db)):
+# заливка рецептов пачками в сессию db. live=True - db это рабочая БД: после каждой пачки сбрасываем кэш
+# фильтров и дописываем индекс ингредиентов. rid страниц, которые не удалось скачать за все попытки,
+# сохраняются в БД вместе с контрольной точкой (см. loader.save_dead_letters) и попадают
+# в job.progress['dead_letters']
+def _ingest_into(job: Job, db: Session, recipes, dead_letters: DeadLetters, live: bool, batch_size: int) -> int:
+    def on_batch(stored: int):
+        if live:
+            filter_cache.invalidate()
+        job.progress['stored'] = stored
+        job.progress['dead_letters'] = dead_letters.rids()
+
+    on_recipes = (lambda recipe_ids: ingredient_index.update(db, recipe_ids)) if live else None
     try:
-        print(f"Начало обновления базы данных. Количество рецептов: {count}")
+        return ingest(db, recipes, batch_size, on_batch=on_batch, on_recipes=on_recipes,
+                      dead_letters=dead_letters)
+    finally:
+        job.progress['dead_letters'] = dead_letters.rids()
 
-        # 1. Очищаем БД
-        clear_database(db)
 
-        # 2. Парсим рецепты
+# обход сайта (или кэша страниц) и заливка рецептов пачками в сессию db, начиная со start_rid
+def _crawl_into(job: Job, db: Session, start_rid: int, live: bool, count: int, concurrency: int,
+                batch_size: int, parse_processes: int, cache_mode: Optional[str]) -> int:
+    job.progress['start_rid'] = start_rid
+    cache = PageCache() if cache_mode else None
+    dead_letters = DeadLetters()
+    try:
+        # concurrency > 1 включает конкурентный обход (см. crawler.py), иначе качаем по одной странице
         print("Начало парсинга рецептов...")
-        parser = RecipeParser("https://www.russianfood.com/recipes/recipe.php")
-        parsed_recipes = parser.parsing(count)
+        if cache_mode == CACHE_OFFLINE:
+            recipes = iter_cached_recipes(cache, count, parse_processes, start_rid)
+        else:
+            recipes = iter_parsed_recipes(count, concurrency, SOURCE_URL, start_rid=start_rid,
+                                          parse_processes=parse_processes,
+                                          cache=cache, cache_mode=cache_mode or CACHE_USE,
+                                          dead_letters=dead_letters)
+        return _ingest_into(job, db, recipes, dead_letters, live, batch_size)
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+# сброс всего, что в памяти посчитано по рабочей БД, после переключения на другой файл
+def _reload_database_state():
+    filter_cache.invalidate()
+    with read_session_local() as db:
+        ingredient_index.build(db)
+
+
+# перезаполнение БД (допустим захотели получить актуальную информацию или расширить базу рецептов).
+# Выполняется фоновой задачей в отдельном потоке со своими сессиями; прогресс пишется в job.progress.
+# Дообход пишет прямо в рабочую БД. Полное перезаполнение строит новую теневую БД в отдельном файле,
+# а рабочая все это время отвечает на запросы со старыми данными; после успешной заливки указатель
+# атомарно переключается на новый файл, а прежний остается для отката (POST /refill_database/rollback).
+# Если полное перезаполнение упало, теневая БД с уже закоммиченными пачками остается, и следующее полное
+# перезаполнение дообходит ее с контрольной точки до count рецептов (resume=False начинает с пустой БД)
+def run_refill(job: Job, count: int, concurrency: int, batch_size: int, incremental: bool,
+               parse_processes: int, cache_mode: Optional[str], resume: bool = True) -> dict:
+    print(f"Начало обновления базы данных. Количество рецептов: {count}")
+    _sync_database()
+    params = dict(count=count, concurrency=concurrency, batch_size=batch_size,
+                  parse_processes=parse_processes, cache_mode=cache_mode)
+
+    if incremental:
+        with session_local() as db:
+            start_rid = get_checkpoint(db) + 1
+            print(f"Дообход с rid={start_rid}")
+            stored = _crawl_into(job, db, start_rid, True, **params)
+        if not stored:
+            raise RuntimeError("Не удалось спарсить рецепты")
+    else:
+        previous, _ = read_db_pointer()
+        with shadow_database(resumable=True, fresh=not resume) as db:
+            start_rid = get_checkpoint(db) + 1
+            stored = db.query(func.count(Recipe.id)).scalar()
+            if stored:
+                job.progress['resumed'] = stored
+                print(f"Продолжаем теневую БД: уже сохранено {stored} рецептов, дообход с rid={start_rid}")
+            if count > stored:
+                stored += _crawl_into(job, db, start_rid, False, **dict(params, count=count - stored))
+            if not stored:
+                raise RuntimeError("Не удалось спарсить рецепты")
+        _reload_database_state()
+        current, _ = read_db_pointer()
+        job.progress['database'] = current
+        print(f"Рабочая БД переключена на {current}, предыдущая: {previous}")
+
+    print(f"Успешно спарсили {stored} рецептов")
+    return {
+        "message": "База данных успешно обновлена!",
+        "parsed_recipes": stored,
+    }
 
-        if not parsed_recipes:
-            raise HTTPException(status_code=500, detail="Не удалось спарсить рецепты")
 
-        print(f"Успешно спарсили {len(parsed_recipes)} рецептов")
+# повторная загрузка страниц, которые обходы не смогли скачать (таблица dead_letters рабочей БД):
+# скачавшиеся рецепты дописываются в рабочую БД, а снова не скачавшиеся остаются в таблице
+def run_retry_failed(job: Job, batch_size: int, cache_mode: Optional[str]) -> dict:
+    _sync_database()
+    cache = PageCache() if cache_mode else None
+    try:
+        with session_local() as db:
+            dead_letters = load_dead_letters(db)
+            job.progress['retried'] = len(dead_letters)
+            print(f"Повторная загрузка недокачанных страниц: {len(dead_letters)}")
+            recipes = iter_refetched_recipes(dead_letters, SOURCE_URL, cache, cache_mode or CACHE_USE)
+            stored = _ingest_into(job, db, recipes, dead_letters, True, batch_size)
+    finally:
+        if cache is not None:
+            cache.close()
 
-        # 3. Заполняем БД
-        fill_database(db, parsed_recipes)
+    print(f"Со второй попытки сохранено {stored} рецептов, не скачалось {len(dead_letters)} страниц")
+    return {
+        "message": "Недокачанные страницы загружены повторно",
+        "parsed_recipes": stored,
+        "dead_letters": len(dead_letters),
+    }
 
-        return {
-            "message": f"База данных успешно обновлена!",
-            "parsed_recipes": len(parsed_recipes),
-        }
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка при обновлении базы данных: {str(e)}")
+# перезаполнение, загрузка корпуса и откат меняют рабочую БД, поэтому одновременно идет не больше одной такой операции
+DATABASE_JOBS = (REFILL_JOB, IMPORT_JOB)
 
 
-def clear_database(db: Session):
-    try:
-        metadata = Base.metadata
-        # Очищаем связующие таблицы первыми (из-за внешних ключей)
-        if 'recipe_ingredient' in metadata.tables:
-            db.execute(text("DELETE FROM recipe_ingredient"))
-        if 'recipe_category' in metadata.tables:
-            db.execute(text("DELETE FROM recipe_category"))
-
-        # Очищаем основные таблицы
-        db.execute(text("DELETE FROM recipes"))
-        db.execute(text("DELETE FROM ingredients"))
-        db.execute(text("DELETE FROM categories"))
-
-        # Сбрасываем автоинкрементные счетчики для SQLite
-        try:
-            db.execute(text("DELETE FROM sqlite_sequence"))
-        except Exception as e:
-            print(f"Таблица sqlite_sequence не существует или недоступна: {e}")
+def _ensure_no_database_job():
+    active = job_runner.active(*DATABASE_JOBS)
+    if active is not None:
+        raise HTTPException(status_code=409, detail=str(JobConflict(active)))
 
-        db.commit()
-        print("База данных успешно очищена")
 
-    except Exception as e:
-        db.rollback()
-        print(f"Ошибка при очистке базы данных: {e}")
+# запуск задачи, меняющей рабочую БД: проверка, что другой такой задачи нет, и запуск делаются
+# атомарно, так что два одновременных запроса не запустят две задачи
+def _submit_database_job(kind: str, params: dict, func) -> Job:
+    try:
+        return job_runner.submit_exclusive(DATABASE_JOBS, kind, params, func)
+    except JobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+# границы параметров перезаполнения: concurrency и parse_processes - это размеры пулов потоков и процессов
+MAX_REFILL_COUNT = 1_000_000
+MAX_REFILL_CONCURRENCY = 64
+MAX_REFILL_BATCH_SIZE = 10_000
+MAX_REFILL_PARSE_PROCESSES = 16
+
+
+# ручка для запуска перезаполнения БД: сразу возвращает id фоновой задачи, ее состояние и прогресс
+# отдает GET /refill_database/{job_id}. Одновременно идет не больше одного перезаполнения.
+# incremental=true не очищает БД, а дообходит count рецептов, начиная со следующего после сохраненной
+# контрольной точки rid (уже сохраненные и не изменившиеся рецепты при этом не перезаписываются).
+# cache_mode включает локальный кэш страниц: use - брать из кэша, refresh - перепроверять кэш на сайте,
+# offline - переразобрать то, что уже лежит в кэше, не ходя в сеть.
+# Полное перезаполнение после упавшего продолжает его теневую БД; resume=false выбрасывает ее
+@app.post("/refill_database/", status_code=202)
+def refill_database(count: int = Query(..., ge=1, le=MAX_REFILL_COUNT),
+                    concurrency: int = Query(1, ge=1, le=MAX_REFILL_CONCURRENCY),
+                    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=MAX_REFILL_BATCH_SIZE),
+                    incremental: bool = False,
+                    parse_processes: int = Query(0, ge=0, le=MAX_REFILL_PARSE_PROCESSES),
+                    cache_mode: Optional[str] = None,
+                    resume: bool = True):
+    if cache_mode is not None and cache_mode not in CACHE_MODES:
+        raise HTTPException(status_code=400, detail=f"Неизвестный режим кэша: {cache_mode}")
+
+    params = {'count': count, 'concurrency': concurrency, 'batch_size': batch_size, 'incremental': incremental,
+              'parse_processes': parse_processes, 'cache_mode': cache_mode, 'resume': resume}
+    job = _submit_database_job(REFILL_JOB, params, lambda job: run_refill(job, **params))
+    return job.to_dict()
+
+
+# ручка повторной загрузки страниц, которые обходы не смогли скачать за все попытки (их rid хранятся
+# в рабочей БД рядом с контрольной точкой, а дообход до них уже не вернется). Как и перезаполнение,
+# идет фоновой задачей: состояние и прогресс отдает GET /refill_database/{job_id}
+@app.post("/refill_database/retry_failed", status_code=202)
+def retry_failed_pages(batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=MAX_REFILL_BATCH_SIZE),
+                       cache_mode: Optional[str] = None):
+    if cache_mode is not None and cache_mode not in CACHE_MODES:
+        raise HTTPException(status_code=400, detail=f"Неизвестный режим кэша: {cache_mode}")
+    if cache_mode == CACHE_OFFLINE:
+        raise HTTPException(status_code=400, detail="Недокачанных страниц нет в кэше, нужен доступ к сайту")
+
+    params = {'batch_size': batch_size, 'cache_mode': cache_mode}
+    job = _submit_database_job(REFILL_JOB, params, lambda job: run_retry_failed(job, **params))
+    return job.to_dict()
+
+
+# ручка отката на БД, которая была рабочей до последнего переключения (повторный вызов возвращает обратно)
+@app.post("/refill_database/rollback")
+def rollback_refill():
+    _ensure_no_database_job()
+    previous = rollback_database()
+    if previous is None:
+        raise HTTPException(status_code=404, detail="Нет предыдущей БД для отката")
+    _reload_database_state()
+    current, _ = read_db_pointer()
+    return {"message": "Рабочая БД возвращена к предыдущей", "database": current, "previous": previous}
+
+
+@app.get("/refill_database/{job_id}")
+def refill_status(job_id: str):
+    job = job_runner.get(job_id)
+    if job is None or job.kind != REFILL_JOB:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job.to_dict()
+
+
+# ручка выгрузки всего корпуса (рецепты, ингредиенты, категории, связи, контрольная точка обхода,
+# недокачанные страницы) в формате corpus_io.py; файл сжимается и отдается потоком, не собираясь
+# в памяти целиком
+@app.get("/api/export")
+def export_database():
+    _sync_database()
+
+    def stream():
+        with read_session_local() as db:
+            yield from iter_export_gzip(db)
+
+    filename = f"recipes-{time.strftime('%Y%m%d-%H%M%S')}.jsonl.gz"
+    return StreamingResponse(stream(), media_type="application/gzip",
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+def run_import(job: Job, path: str) -> dict:
+    try:
+        with open(path, 'rb') as f:
+            counts = import_into_shadow(f)
+    finally:
+        os.remove(path)
+    _reload_database_state()
+    job.progress['database'], _ = read_db_pointer()
+    return {"message": "Корпус загружен", "rows": counts}
+
+
+# ручка загрузки корпуса из выгрузки (тело запроса - файл из /api/export или python -m corpus_io export).
+# Файл сохраняется во временный, а загрузка идет фоновой задачей в новую теневую БД, на которую рабочая
+# переключается только после успешной загрузки; состояние задачи - GET /api/import/{job_id}
+@app.post("/api/import", status_code=202)
+async def import_database(request: Request):
+    # ранний отказ, чтобы не принимать тело зря; пока оно принимается, задачу мог запустить другой
+    # запрос, поэтому решает атомарный _submit_database_job
+    _ensure_no_database_job()
+    f = tempfile.NamedTemporaryFile(suffix='.jsonl.gz', delete=False)
+    try:
+        with f:
+            async for chunk in request.stream():
+                await run_in_threadpool(f.write, chunk)
+        job = _submit_database_job(IMPORT_JOB, {}, lambda job: run_import(job, f.name))
+    except BaseException:
+        # временный файл удаляет run_import, а до него дело не дошло
+        os.remove(f.name)
         raise
+    return job.to_dict()
+
+
+@app.get("/api/import/{job_id}")
+def import_status(job_id: str):
+    job = job_runner.get(job_id)
+    if job is None or job.kind != IMPORT_JOB:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job.to_dict()
+
+
+# глобальный экземпляр фильтра
+recipe_filter = RecipeFilter()
+# кэш id рецептов по комбинациям ответов; сбрасывается при любом изменении рецептов в БД
+filter_cache = FilterResultCache()
+# инвертированный индекс ингредиентов для подбора рецептов по продуктам; строится при старте
+ingredient_index = IngredientIndex()
+with session_local() as startup_db:
+    ingredient_index.build(startup_db)
+
+
+def _recipe_ids(query) -> List[int]:
+    return [recipe_id for recipe_id, in query.with_entities(Recipe.id)]
+
+
+# метрики обхода, разбора, заливки и ручек API в текстовом формате Prometheus (см. metrics.py)
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/api/cache-stats")
+async def cache_stats():
+    return filter_cache.stats()
+
+
+@app.get("/api/ingredient-index-stats")
+async def ingredient_index_stats():
+    return ingredient_index.stats()
+
 
+# максимальный размер страницы в /api/recipes
+MAX_PAGE_SIZE = 100
 
-def fill_database(db: Session, parsed_recipes: List):
+
+# ручка для постраничного просмотра рецептов. Пагинация по курсору: cursor - id последнего рецепта
+# предыдущей страницы, следующая страница - это WHERE id > cursor ORDER BY id LIMIT limit по первичному
+# ключу, поэтому любая страница отдается одинаково быстро (OFFSET пришлось бы пролистывать все предыдущие).
+# Фильтры те же, что у генератора
+@app.get("/api/recipes", response_model=RecipePage)
+def list_recipes(cursor: Optional[int] = None, limit: int = 20, cooking_time: Optional[str] = None,
+                 meal_type: Optional[str] = None, difficulty: Optional[str] = None,
+                 db: Session = Depends(get_read_db)):
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit должен быть от 1 до {MAX_PAGE_SIZE}")
     try:
-        # 1. Добавляем категории (с проверкой на существование)
-        categories_set = get_all_categories(parsed_recipes)
-        category_map = {}
-
-        for category_name in categories_set:
-            # Проверяем, существует ли категория
-            existing_category = db.query(Category).filter(Category.name == category_name).first()
-            if existing_category:
-                category_map[category_name] = existing_category.id
-            else:
-                db_category = Category(name=category_name)
-                db.add(db_category)
-                db.flush()
-                category_map[category_name] = db_category.id
-
-        # 2. Добавляем ингредиенты (с проверкой на существование)
-        ingredients_set = get_all_ingredients(parsed_recipes)
-        ingredient_map = {}
-
-        for ingredient_name in ingredients_set:
-            # Проверяем, существует ли ингредиент
-            existing_ingredient = db.query(Ingredient).filter(Ingredient.ingredient_name == ingredient_name).first()
-            if existing_ingredient:
-                ingredient_map[ingredient_name] = existing_ingredient.id
-            else:
-                db_ingredient = Ingredient(ingredient_name=ingredient_name)
-                db.add(db_ingredient)
-                db.flush()
-                ingredient_map[ingredient_name] = db_ingredient.id
-
-        # 3. Добавляем рецепты
-        recipes_data = get_all_recipes(parsed_recipes)
-        recipe_map = {}
-
-        for recipe_data in recipes_data:
-            db_recipe = Recipe(
-                recipe_name=recipe_data['recipe_name'],
-                number_of_servings=recipe_data['number_of_servings'],
-                cooking_time=recipe_data['cooking_time'],
-                description=recipe_data['description']
-            )
-            db.add(db_recipe)
-        db.flush()  # Получаем ID для всех рецептов
-
-        # Получаем ID добавленных рецептов
-        for recipe in db.query(Recipe).all():
-            recipe_map[recipe.recipe_name] = recipe.id
-
-        # 4. Добавляем связи рецепт-ингредиент
-        recipe_ingr_data = get_ingredients_and_recipe_db_table(parsed_recipes)
-        for row in recipe_ingr_data:
-            # Получаем реальные ID из наших словарей
-            recipe_names = list(recipe_map.keys())
-            ingredient_names = list(ingredient_map.keys())
-
-            if (row['recipe_id'] <= len(recipe_names) and
-                    row['ingredient_id'] <= len(ingredient_names)):
-
-                recipe_name = recipe_names[row['recipe_id'] - 1]
-                ingredient_name = ingredient_names[row['ingredient_id'] - 1]
-
-                # Проверяем, существует ли уже такая связь
-                existing_link = db.execute(
-                    text(
-                        "SELECT 1 FROM recipe_ingredient WHERE recipe_id = :recipe_id AND ingredient_id = :ingredient_id"),
-                    {"recipe_id": recipe_map[recipe_name], "ingredient_id": ingredient_map[ingredient_name]}
-                ).first()
-
-                if not existing_link:
-                    stmt = recipe_ingredient.insert().values(
-                        recipe_id=recipe_map[recipe_name],
-                        ingredient_id=ingredient_map[ingredient_name],
-                        quantity=row['quantity'],
-                        unit=row['unit']
-                    )
-                    db.execute(stmt)
-
-        # 5. Добавляем связи рецепт-категория  
-        recipe_category_data = get_categories_and_recipe_db_table(parsed_recipes)
-        for row in recipe_category_data:
-            recipe_names = list(recipe_map.keys())
-            category_names = list(category_map.keys())
-
-            if (row['recipe_id'] <= len(recipe_names) and
-                    row['category_id'] <= len(category_names)):
-
-                recipe_name = recipe_names[row['recipe_id'] - 1]
-                category_name = category_names[row['category_id'] - 1]
-
-                # Проверяем, существует ли уже такая связь
-                existing_link = db.execute(
-                    text("SELECT 1 FROM recipe_category WHERE recipe_id = :recipe_id AND category_id = :category_id"),
-                    {"recipe_id": recipe_map[recipe_name], "category_id": category_map[category_name]}
-                ).first()
-
-                if not existing_link:
-                    stmt = recipe_category.insert().values(
-                        recipe_id=recipe_map[recipe_name],
-                        category_id=category_map[category_name]
-                    )
-                    db.execute(stmt)
+        answers = {'cooking_time': cooking_time, 'meal_type': meal_type, 'difficulty': difficulty}
+        query = recipe_filter.apply_filters(
+            db.query(Recipe.id, Recipe.recipe_name, Recipe.number_of_servings, Recipe.cooking_time,
+                     Recipe.description),
+            db, answers
+        )
+        if cursor is not None:
+            query = query.filter(Recipe.id > cursor)
+        # берем на одну строку больше, чтобы понять, есть ли следующая страница
+        rows = query.order_by(Recipe.id).limit(limit + 1).all()
+
+        items = [dict(row._mapping) for row in rows[:limit]]
+        next_cursor = items[-1]['id'] if len(rows) > limit else None
+        return RecipePage(items=items, next_cursor=next_cursor)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка при получении списка рецептов: {str(e)}")
 
-        db.commit()
-        print("База данных успешно заполнена")
+
+# ручка полнотекстового поиска по названиям, описаниям и ингредиентам рецептов (см. search.py).
+# Рецепты отдаются по убыванию релевантности, следующая страница - через offset
+@app.get("/api/search", response_model=List[RecipeSearchHit])
+def search(q: str, limit: int = 20, offset: int = 0, db: Session = Depends(get_read_db)):
+    if not 1 <= limit <= MAX_PAGE_SIZE or offset < 0:
+        raise HTTPException(status_code=400, detail=f"limit должен быть от 1 до {MAX_PAGE_SIZE}, offset - не меньше 0")
+    try:
+        hits = search_recipes(db, q, limit, offset)
+        scores = dict(hits)
+        rows = db.query(Recipe.id, Recipe.recipe_name, Recipe.number_of_servings, Recipe.cooking_time,
+                        Recipe.description).filter(Recipe.id.in_(scores)).all()
+        items = {row.id: dict(row._mapping, score=scores[row.id]) for row in rows}
+        return [items[recipe_id] for recipe_id, _ in hits if recipe_id in items]
 
     except Exception as e:
-        db.rollback()
-        print(f"Ошибка при заполнении базы данных: {e}")
-        raise
+        raise HTTPException(status_code=500, detail=f"Ошибка при поиске рецептов: {str(e)}")
 
 
-@dataclass
-class FilterConfig:
-    name: str
-    filter_func: Callable
-    requires_db: bool = False
-
-
-class RecipeFilter:
-    def __init__(self):
-        self.filters = {
-            'cooking_time': FilterConfig(
-                name='cooking_time',
-                filter_func=self._filter_cooking_time,
-                requires_db=False
-            ),
-            'meal_type': FilterConfig(
-                name='meal_type',
-                filter_func=self._filter_meal_type,
-                requires_db=True
-            ),
-            'difficulty': FilterConfig(
-                name='difficulty',
-                filter_func=self._filter_difficulty,
-                requires_db=True
-            )
-        }
-
-        self._cooking_time_map = {
-            'быстро': ['15', '20', '25', '30', 'мин'],
-            'средне': ['40', '45', '50', '55', '60', 'час'],
-            'долго': ['1.5', '2', '3', 'час']
-        }
-
-        self._meal_type_map = {
-            'завтрак': ['завтрак', 'breakfast', 'утро'],
-            'обед': ['обед', 'lunch', 'первое', 'второе'],
-            'ужин': ['ужин', 'dinner', 'вечер']
-        }
-
-        self._difficulty_map = {
-            'легко': ('<=', 5),
-            'тяжело': ('>', 8)
-        }
-
-    def apply_filters(self, query, db: Session, answers: Dict[str, str]):
-        """Применяет все активные фильтры"""
-        for filter_key, filter_config in self.filters.items():
-            if filter_key in answers and answers[filter_key]:
-                query = filter_config.filter_func(
-                    query,
-                    db if filter_config.requires_db else None,
-                    answers[filter_key]
-                )
-        return query
-
-    def _filter_cooking_time(self, query, db: Optional[Session], cooking_time: str):
-        if cooking_time in self._cooking_time_map:
-            filters = [Recipe.cooking_time.contains(term)
-                       for term in self._cooking_time_map[cooking_time]]
-            return query.filter(or_(*filters))
-        return query
-
-    def _filter_meal_type(self, query, db: Session, meal_type: str):
-        if meal_type in self._meal_type_map:
-            category_filters = self._meal_type_map[meal_type]
-            meal_recipe_ids = db.query(Recipe.id) \
-                .join(recipe_category) \
-                .join(Category) \
-                .filter(or_(*[Category.name.ilike(f'%{cat}%') for cat in category_filters])) \
-                .distinct() \
-                .subquery()
-            return query.filter(Recipe.id.in_(meal_recipe_ids))
-        return query
-
-    def _filter_difficulty(self, query, db: Session, difficulty: str):
-        if difficulty in self._difficulty_map:
-            operator, threshold = self._difficulty_map[difficulty]
-            subquery = db.query(Recipe.id) \
-                .join(recipe_ingredient) \
-                .group_by(Recipe.id)
-
-            if operator == '<=':
-                subquery = subquery.having(func.count(recipe_ingredient.c.ingredient_id) <= threshold)
-            else:
-                subquery = subquery.having(func.count(recipe_ingredient.c.ingredient_id) > threshold)
-
-            return query.filter(Recipe.id.in_(subquery.subquery()))
-        return query
-
-
-def get_recipe_data(db: Session, recipe: Recipe) -> Dict:
-    """Получает полные данные рецепта включая ингредиенты"""
-
-    ingredients_data = db.query(
-        Ingredient.ingredient_name,
-        recipe_ingredient.c.quantity,
-        recipe_ingredient.c.unit
-    ).join(
-        recipe_ingredient, Ingredient.id == recipe_ingredient.c.ingredient_id
-    ).filter(
-        recipe_ingredient.c.recipe_id == recipe.id
-    ).all()
-
-    ingredients = [
-        {
-            "ingredient_name": ing.ingredient_name,
-            "quantity": ing.quantity,
-            "unit": ing.unit or ""
-        }
-        for ing in ingredients_data
-    ]
+# режимы подбора рецептов по ингредиентам
+INGREDIENT_MATCH_MODES = ('all', 'any', 'cookable')
 
-    return {
-        "id": recipe.id,
-        "recipe_name": recipe.recipe_name,
-        "cooking_time": recipe.cooking_time,
-        "number_of_servings": recipe.number_of_servings,
-        "description": recipe.description,
-        "ingredients": ingredients
-    }
 
+# ручка подбора рецептов по ингредиентам (см. ingredient_index.py):
+# all - рецепты, в которых есть все перечисленные ингредиенты;
+# any - рецепты хотя бы с min_matches из них, сначала те, где совпадений больше;
+# cookable - "что приготовить из того, что есть": рецепты, которым не хватает не больше max_missing ингредиентов
+@app.get("/api/recipes/by-ingredients", response_model=List[RecipeIngredientMatch])
+def recipes_by_ingredients(ingredient: List[str] = Query(...), mode: str = 'any', min_matches: int = 1,
+                           max_missing: int = 0, limit: int = 20, db: Session = Depends(get_read_db)):
+    if mode not in INGREDIENT_MATCH_MODES:
+        raise HTTPException(status_code=400, detail=f"Неизвестный режим подбора: {mode}")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit должен быть от 1 до {MAX_PAGE_SIZE}")
+    try:
+        names = {canonical_ingredient(name) for name in ingredient}
+        ingredient_ids = [ingredient_id for ingredient_id, in
+                          db.query(Ingredient.id).filter(Ingredient.ingredient_name.in_(names))]
+        # рецептов со всеми ингредиентами не бывает, если какого-то из них нет в базе
+        if not ingredient_ids or (mode == 'all' and len(ingredient_ids) < len(names)):
+            return []
+
+        if mode == 'all':
+            recipe_ids, matches, missing = ingredient_index.containing_all(ingredient_ids)
+        elif mode == 'any':
+            recipe_ids, matches, missing = ingredient_index.overlapping(ingredient_ids, min_matches)
+        else:
+            recipe_ids, matches, missing = ingredient_index.cookable_with(ingredient_ids, max_missing)
+        recipe_ids, matches, missing = recipe_ids[:limit].tolist(), matches[:limit].tolist(), missing[:limit].tolist()
+
+        rows = db.query(Recipe.id, Recipe.recipe_name, Recipe.number_of_servings, Recipe.cooking_time,
+                        Recipe.description).filter(Recipe.id.in_(recipe_ids)).all()
+        items = {row.id: dict(row._mapping) for row in rows}
+        return [dict(items[recipe_id], matched=matched, missing=lacking)
+                for recipe_id, matched, lacking in zip(recipe_ids, matches, missing) if recipe_id in items]
 
-# глобальный экземпляр фильтра
-recipe_filter = RecipeFilter()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка при подборе рецептов: {str(e)}")
 
 
 @app.post("/api/generate-recipe")
-async def generate_recipe(answers: Dict[str, str], db: Session = Depends(get_db)):
+def generate_recipe(answers: Dict[str, str], db: Session = Depends(get_read_db)):
     try:
         # базовый запрос
         base_query = db.query(Recipe)
 
         # применяем фильтры
         filtered_query = recipe_filter.apply_filters(base_query, db, answers)
-        filtered_recipes = filtered_query.all()
 
-        # если нет результатов после фильтрации, берем все рецепты
-        recipes = filtered_recipes if filtered_recipes else base_query.all()
+        # id подходящих рецептов берем из кэша по комбинации ответов, а если таких нет - id всех рецептов
+        ids = filter_cache.get_ids(recipe_filter.normalize_answers(answers), lambda: _recipe_ids(filtered_query))
+        if not ids:
+            ids = filter_cache.get_ids(None, lambda: _recipe_ids(base_query))
+
+        # выбираем случайный рецепт и сразу загружаем его с ингредиентами одним запросом;
+        # если его успели удалить после заполнения кэша - выбираем прямо из БД
+        recipe_data = get_recipe_data_by_id(db, random.choice(ids)) if ids else None
+        if ids and not recipe_data:
+            selected_recipe = pick_random_recipe(db, filtered_query) or pick_random_recipe(db, base_query)
+            recipe_data = get_recipe_data(db, selected_recipe) if selected_recipe else None
 
-        if not recipes:
+        if not recipe_data:
             raise HTTPException(status_code=404, detail="Рецепты не найдены в базе данных")
 
-        # выбираем случайный рецепт и возвращаем данные
-        selected_recipe = random.choice(recipes)
-        return get_recipe_data(db, selected_recipe)
+        return recipe_data
 
     except HTTPException:
         raise
@@ -0,0 +1,222 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# метрики обхода, разбора, заливки и API в текстовом формате Prometheus (отдает GET /metrics).
+# Свой маленький реестр вместо prometheus_client: нужны только счетчики и гистограммы с метками.
+# Метрики живут в памяти процесса, поэтому то, что считают процессы пула разбора (parse_pool.py),
+# они возвращают в основной процесс вместе с результатом, а записывает уже он
+
+# границы корзин гистограмм времени по умолчанию (как в клиентах Prometheus), в секундах
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry: List['_Metric'] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs) -> str:
+    pairs = list(pairs)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, object]) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Метрика {self.name} ждет метки {self.labelnames}, а не {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        return '\n'.join(lines + self._samples())
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.__values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.__values[key] = self.__values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self.__values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self.__values.items())
+        return [f'{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}'
+                for key, value in values]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.__values: Dict[tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.__values[key] = value
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self.__values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self.__values.items())
+        return [f'{self.name}{_format_labels(zip(self.labelnames, key))} {_format_value(value)}'
+                for key, value in values]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # метки -> [число наблюдений по корзинам (не накопленное), сумма]
+        self.__values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self.__values.get(key)
+            if state is None:
+                state = self.__values[key] = [[0] * len(self.buckets), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    # замер времени блока with в секундах
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            state = self.__values.get(self._key(labels))
+            return sum(state[0]) if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self.__values.items())
+        lines = []
+        for key, (counts, total) in values:
+            pairs = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(pairs + [("le", _format_value(bound))])} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(pairs)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(pairs)} {cumulative}')
+        return lines
+
+
+# все метрики процесса в текстовом формате Prometheus
+def render() -> str:
+    return '\n'.join(metric.render() for metric in _registry) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+# загрузка страниц (page_cache.fetch_with_cache)
+FETCH_SECONDS = Histogram('zavoz_fetch_seconds', 'Время запроса страницы рецепта к сайту')
+FETCH_PAGES = Counter('zavoz_fetch_pages_total', 'Запрошенные страницы по источнику ответа',
+                      ('result',))
+FETCH_BYTES = Counter('zavoz_fetch_bytes_total', 'Байт страниц, скачанных с сайта')
+FETCH_ERRORS = Counter('zavoz_fetch_errors_total', 'Ошибки загрузки страниц: HTTP статус или тип исключения',
+                       ('reason',))
+# повторы и окно конкурентности загрузчика (fetcher.py)
+FETCH_RETRIES = Counter('zavoz_fetch_retries_total', 'Повторные запросы страниц по причине предыдущей неудачи',
+                        ('reason',))
+FETCH_DEAD_LETTERS = Counter('zavoz_fetch_dead_letters_total', 'Страницы, которые не удалось скачать за все попытки')
+FETCH_CONCURRENCY = Gauge('zavoz_fetch_concurrency_limit', 'Текущее число одновременных запросов к сайту')
+
+# разбор страниц (RecipeParser.parse_html, в том числе в пуле процессов)
+PARSE_SECONDS = Histogram('zavoz_parse_seconds', 'Время разбора одной страницы')
+PARSE_FAILURES = Counter('zavoz_parse_failures_total', 'Страницы, из которых не удалось извлечь рецепт',
+                         ('reason',))
+
+# заливка в БД (loader.bulk_fill_database)
+DB_FILL_SECONDS = Histogram('zavoz_db_fill_seconds', 'Время записи пачки рецептов до коммита')
+DB_COMMIT_SECONDS = Histogram('zavoz_db_commit_seconds', 'Время коммита пачки рецептов')
+DB_ROWS_INSERTED = Counter('zavoz_db_rows_inserted_total', 'Вставленные строки по таблицам', ('table',))
+DB_RECIPES = Counter('zavoz_db_recipes_total', 'Рецепты из пачек: новые, перезаписанные и без изменений',
+                     ('result',))
+
+# ручки API
+HTTP_REQUEST_SECONDS = Histogram('zavoz_http_request_duration_seconds', 'Время обработки запроса к API',
+                                 ('method', 'path', 'status'))
+
+
+# разбор одной страницы: время и причина неудачи (None - рецепт извлечен)
+def record_parse(seconds: float, failure: Optional[str] = None):
+    PARSE_SECONDS.observe(seconds)
+    if failure:
+        PARSE_FAILURES.inc(reason=failure)
+
+
+# ASGI middleware: время каждого запроса с шаблоном пути маршрута ("/refill_database/{job_id}", а не
+# конкретный id), методом и статусом ответа. Для потоковых ответов время считается до конца отдачи
+class RequestMetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get('route')
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=scope['method'],
+                                         path=getattr(route, 'path', 'unmatched'), status=status)
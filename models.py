@@ -1,19 +1,25 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Table, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, Table, Float, Boolean, DDL, Index, event
 from sqlalchemy.orm import relationship
 from database import Base
 
 # Вспомагательная таблица для рецептов и категорий
 recipe_category = Table('recipe_category', Base.metadata,
-    Column('recipe_id', Integer, ForeignKey('recipes.id')),
+    Column('recipe_id', Integer, ForeignKey('recipes.id'), index=True),
     Column('category_id', Integer, ForeignKey('categories.id'))
 )
 
-# Вспомогательная таблица для рецептов и ингредиентов
+# Вспомогательная таблица для рецептов и ингредиентов: одна строка - одна строка списка ингредиентов
+# рецепта. Разные строки могут вести к одному словарному ингредиенту ("Сахар" и "Сахарный песок"),
+# поэтому ключ строки - (recipe_id, position), а не (recipe_id, ingredient_id)
 recipe_ingredient = Table('recipe_ingredient', Base.metadata,
-    Column('recipe_id', Integer, ForeignKey('recipes.id')),
+    Column('recipe_id', Integer, ForeignKey('recipes.id'), index=True),
     Column('ingredient_id', Integer, ForeignKey('ingredients.id')),
+    Column('raw_name', String),  # название ингредиента как на сайте (в ingredients - словарная форма)
     Column('quantity', Float),  # количество для данного рецепта
-    Column('unit', String)       # единицы измерения для данного рецепта
+    Column('unit', String),      # единицы измерения для данного рецепта (как на сайте)
+    Column('unit_id', Integer, ForeignKey('units.id')),  # они же из словаря единиц (см. normalize.py)
+    Column('position', Integer),  # номер строки в списке ингредиентов рецепта (у старых строк пусто)
+    Index('ix_recipe_ingredient_line', 'recipe_id', 'position', unique=True)
 )
 
 class Category(Base):
@@ -29,11 +35,18 @@ class Ingredient(Base):
     __tablename__ = "ingredients"
     # id ингредиента
     id                  = Column(Integer, primary_key=True, index=True)
-    # название ингридиента
+    # название ингридиента в словарной форме (см. normalize.canonical_ingredient)
     ingredient_name     = Column(String, unique=True, index=True)
     # связь с рецептами (многие-ко-многим)
     recipes = relationship("Recipe", secondary=recipe_ingredient, back_populates="ingredients")
 
+class Unit(Base):
+    __tablename__ = "units"
+    # id единицы измерения
+    id = Column(Integer, primary_key=True, index=True)
+    # каноническое название ("ст. л.", "г", "шт.")
+    name = Column(String, unique=True, index=True)
+
 class Recipe(Base):
     __tablename__ = "recipes"
     # id рецепта
@@ -46,7 +59,46 @@ class Recipe(Base):
     cooking_time        = Column(String)
     # описание рецепта
     description         = Column(String)
+    # rid страницы рецепта на russianfood (по нему делается upsert при дообходе)
+    source_rid          = Column(Integer, unique=True, index=True)
+    # отпечаток содержимого рецепта, чтобы при повторном обходе перезаписывать только изменившиеся
+    content_hash        = Column(String)
+    # признаки для фильтров генератора, считаются при заливке (см. recipe_features.py):
+    # время приготовления в минутах
+    cooking_minutes     = Column(Integer, index=True)
+    # подходит ли рецепт на завтрак/обед/ужин (по его категориям)
+    is_breakfast        = Column(Boolean, index=True, nullable=False, default=False, server_default='0')
+    is_lunch            = Column(Boolean, index=True, nullable=False, default=False, server_default='0')
+    is_dinner           = Column(Boolean, index=True, nullable=False, default=False, server_default='0')
+    # число различных ингредиентов (сложность рецепта)
+    ingredient_count    = Column(Integer, index=True)
     # связь с ингредиентами (многие-ко-многим)
     ingredients = relationship("Ingredient", secondary=recipe_ingredient, back_populates="recipes")
     # связь с категориями (многие-ко-многим)
     categories = relationship("Category", secondary=recipe_category, back_populates="recipes")
+
+class CrawlState(Base):
+    __tablename__ = "crawl_state"
+    # имя обхода (один сайт - одна строка)
+    source              = Column(String, primary_key=True)
+    # последний rid, до которого все рецепты уже сохранены в БД
+    last_rid            = Column(Integer, nullable=False, default=0)
+
+# страницы, которые обход не смог скачать за все попытки (см. fetcher.DeadLetters). Контрольная точка
+# уходит дальше них, поэтому они хранятся здесь, пока их не перекачает POST /refill_database/retry_failed
+class DeadLetter(Base):
+    __tablename__ = "dead_letters"
+    source              = Column(String, primary_key=True)
+    rid                 = Column(Integer, primary_key=True)
+    # причина последней неудачи (код ответа или тип ошибки сети)
+    reason              = Column(String)
+    attempts            = Column(Integer, nullable=False, default=0)
+    failed_at           = Column(Float)
+
+# Полнотекстовый индекс рецептов (виртуальная таблица FTS5, rowid = id рецепта), см. search.py.
+# create_all виртуальные таблицы не знает, поэтому создаем ее сами сразу после остальных таблиц
+SEARCH_TABLE = "recipes_fts"
+event.listen(Base.metadata, "after_create", DDL(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "recipe_name, description, ingredients, tokenize = 'unicode61 remove_diacritics 2')"
+))
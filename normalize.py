@@ -0,0 +1,190 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+
+# разбор количества и единиц измерения ингредиентов (строки вида "1 ¼ ст. л.", "2-3 шт.", "0,5 кг") и
+# приведение названий ингредиентов к словарной форме. Все шаблоны скомпилированы один раз. Для одной
+# строки - parse_quantity, split_quantity_unit, canonical_unit и canonical_ingredient, для целого
+# столбца строк - parse_quantities, normalize_ingredients, canonical_units и canonical_ingredients: строки ингредиентов сильно повторяются ("1", "200 г",
+# "по вкусу"), поэтому каждая различная строка разбирается один раз, а результат раскладывается
+# обратно по столбцу индексированием numpy массива
+
+# дроби, которые пишутся одним символом (¼, ½, ⅓ ...): символ -> значение по базе Unicode
+VULGAR_FRACTIONS = {
+    chr(code): unicodedata.numeric(chr(code))
+    for code in (*range(0x00BC, 0x00BF), *range(0x2150, 0x218A))
+    if unicodedata.name(chr(code), '').startswith('VULGAR FRACTION')
+}
+_FRACTION_CHARS = ''.join(VULGAR_FRACTIONS)
+
+# все, что не может быть частью количества (буквы, скобки, "~" и т.п.), выбрасываем
+_QUANTITY_NOISE = re.compile(rf'[^\d\s.,/⁄\-–—{_FRACTION_CHARS}]+')
+# диапазон "2-3", "2 — 3": считаем средним
+_RANGE = re.compile(r'\s*[-–—]\s*')
+# одно значение: целое или десятичное (через точку или запятую), смешанная дробь "1 ¼" / "1 1/2",
+# просто дробь "¼" / "1/2"
+_AMOUNT = re.compile(
+    rf'(?:(?P<whole>\d+(?:[.,]\d+)?)\s*)?'
+    rf'(?:(?P<vulgar>[{_FRACTION_CHARS}])|(?P<numerator>\d+)\s*[/⁄]\s*(?P<denominator>\d+))?'
+)
+# количество - все до первой русской буквы, единицы - остальное ("2 ст. л." -> "2", "ст. л.")
+_QUANTITY_UNIT = re.compile(r'(?P<quantity>[^А-Яа-яЁё]*)(?P<unit>.*)', re.DOTALL)
+# ключ для поиска единицы в словаре: без регистра, пробелов и точек ("Ст. л." -> "стл")
+_UNIT_KEY = re.compile(r'[\s.]+')
+# примечания в скобках: "Мука (просеянная)", "Сыр [твердый]"
+_PARENTHETICAL = re.compile(r'\([^()]*\)|\[[^\[\]]*\]')
+# знаки препинания по краям и повторные пробелы в названии ингредиента
+_NAME_PUNCTUATION = re.compile(r'^[\s.,;:!*\-–—]+|[\s.,;:!*\-–—]+$')
+_SPACES = re.compile(r'\s+')
+
+# словарь единиц: каноническое название -> варианты написания на сайте
+UNIT_ALIASES = {
+    'г': ['г', 'гр', 'грамм', 'грамма', 'граммов'],
+    'кг': ['кг', 'килограмм', 'килограмма', 'килограммов'],
+    'мл': ['мл', 'миллилитр', 'миллилитра', 'миллилитров'],
+    'л': ['л', 'литр', 'литра', 'литров'],
+    'шт.': ['шт', 'штука', 'штуки', 'штук'],
+    'ст. л.': ['ст. л.', 'ст. ложка', 'ст. ложки', 'ст. ложек', 'столовая ложка', 'столовые ложки',
+               'столовых ложки', 'столовых ложек'],
+    'ч. л.': ['ч. л.', 'ч. ложка', 'ч. ложки', 'ч. ложек', 'чайная ложка', 'чайные ложки',
+              'чайных ложки', 'чайных ложек'],
+    'стакан': ['стакан', 'стакана', 'стаканов', 'стаканы'],
+    'зубчик': ['зубчик', 'зубчика', 'зубчиков', 'зуб'],
+    'пучок': ['пучок', 'пучка', 'пучков'],
+    'щепотка': ['щепотка', 'щепотки', 'щепоток', 'щепоть'],
+    'упаковка': ['упаковка', 'упаковки', 'упаковок', 'уп'],
+    'банка': ['банка', 'банки', 'банок'],
+    'кусок': ['кусок', 'куска', 'кусков', 'кусочек', 'кусочка', 'кусочков'],
+    'по вкусу': ['по вкусу'],
+}
+
+
+# словарь ингредиентов: словарная форма -> другие названия того же продукта на сайте
+# (сравниваются после приведения регистра, ё -> е и удаления примечаний в скобках)
+INGREDIENT_ALIASES = {
+    'мука': ['мука пшеничная', 'пшеничная мука', 'мука пшеничная в/с', 'мука высшего сорта'],
+    'сахар': ['сахар-песок', 'сахарный песок', 'сахар белый'],
+    'яйца': ['яйцо', 'яйцо куриное', 'яйца куриные', 'куриные яйца'],
+    'масло сливочное': ['сливочное масло'],
+    'масло растительное': ['растительное масло', 'масло подсолнечное', 'подсолнечное масло'],
+    'лук репчатый': ['лук', 'репчатый лук', 'луковица'],
+    'перец черный молотый': ['черный молотый перец', 'перец черный', 'черный перец', 'перец молотый'],
+    'сыр твердый': ['твердый сыр'],
+    'куриное филе': ['филе куриное', 'филе куриной грудки', 'куриная грудка'],
+    'фарш мясной': ['мясной фарш', 'фарш'],
+    'томатная паста': ['паста томатная', 'томат-паста'],
+    'капуста белокочанная': ['белокочанная капуста', 'капуста'],
+    'молоко': ['молоко коровье'],
+    'вода': ['вода питьевая', 'вода кипяченая'],
+    'соль': ['соль поваренная'],
+    'разрыхлитель': ['разрыхлитель теста'],
+    'дрожжи сухие': ['сухие дрожжи'],
+}
+
+
+def _fold(name: str) -> str:
+    name = _PARENTHETICAL.sub(' ', name.casefold().replace('ё', 'е'))
+    return _SPACES.sub(' ', _NAME_PUNCTUATION.sub('', name)).strip()
+
+
+_INGREDIENT_BY_NAME = {
+    _fold(alias): canonical for canonical, aliases in INGREDIENT_ALIASES.items() for alias in [canonical, *aliases]
+}
+
+
+# словарная форма названия ингредиента: "Мука пшеничная (просеянная)" -> "мука", "Лук репчатый" ->
+# "лук репчатый". Названия, которых нет в словаре, только приводятся к нижнему регистру, ё -> е и
+# очищаются от примечаний в скобках. Если от названия ничего не осталось, оно возвращается как есть
+@lru_cache(maxsize=65536)
+def canonical_ingredient(name: str) -> str:
+    folded = _fold(name or '')
+    if not folded:
+        return name
+    return _INGREDIENT_BY_NAME.get(folded, folded)
+
+
+def _unit_key(unit: str) -> str:
+    return _UNIT_KEY.sub('', unit.casefold().replace('ё', 'е'))
+
+
+_UNIT_BY_KEY = {_unit_key(alias): name for name, aliases in UNIT_ALIASES.items() for alias in aliases}
+
+
+def _parse_amount(value: str) -> Optional[float]:
+    match = _AMOUNT.fullmatch(value)
+    if match is None or not any(match.groups()):
+        return None
+    whole, vulgar, numerator, denominator = match.group('whole', 'vulgar', 'numerator', 'denominator')
+    amount = float(whole.replace(',', '.')) if whole else 0.0
+    if vulgar:
+        amount += VULGAR_FRACTIONS[vulgar]
+    elif numerator and int(denominator):
+        amount += int(numerator) / int(denominator)
+    return amount
+
+
+# количество из строки в число: "0,5" -> 0.5, "1 ¼" -> 1.25, "1/2" -> 0.5, "2-3" -> 2.5.
+# Пустое или неразборчивое количество ("по вкусу") - 0, как и раньше
+@lru_cache(maxsize=4096)
+def parse_quantity(value: str) -> float:
+    value = _QUANTITY_NOISE.sub(' ', value or '').strip(' .,')
+    if not value:
+        return 0.0
+    amounts = [_parse_amount(part.strip(' .,')) for part in _RANGE.split(value, 1)]
+    if any(amount is None for amount in amounts):
+        return 0.0
+    return sum(amounts) / len(amounts)
+
+
+# разбиение записи нового формата ("1 ¼ ст. л.") на строку количества и единицы
+def split_quantity_unit(value: str) -> Tuple[str, str]:
+    match = _QUANTITY_UNIT.fullmatch(value or '')
+    return match.group('quantity').strip(), match.group('unit').strip()
+
+
+# каноническое название единицы ("Ст.л." -> "ст. л."); незнакомые единицы остаются как есть, но
+# в нижнем регистре и с одинарными пробелами. None - единиц нет
+@lru_cache(maxsize=4096)
+def canonical_unit(value: Optional[str]) -> Optional[str]:
+    if not value or not value.strip():
+        return None
+    return _UNIT_BY_KEY.get(_unit_key(value)) or ' '.join(value.casefold().split())
+
+
+# различные строки столбца values (в порядке появления) и для каждой строки столбца - номер ее среди
+# различных. Через словарь в несколько раз быстрее, чем np.unique, которому нужна сортировка строк
+def _unique(values: Iterable[Optional[str]]) -> Tuple[list, np.ndarray]:
+    positions = {}
+    inverse = np.array([positions.setdefault('' if value is None else value, len(positions)) for value in values],
+                       dtype=np.intp)
+    return list(positions), inverse
+
+
+# количества для столбца строк (как parse_quantity)
+def parse_quantities(values: Iterable[Optional[str]]) -> np.ndarray:
+    unique, inverse = _unique(values)
+    return np.array([parse_quantity(value) for value in unique], dtype=np.float64)[inverse]
+
+
+# канонические единицы для столбца строк (как canonical_unit); массив объектов, None - единиц нет
+def canonical_units(values: Iterable[Optional[str]]) -> np.ndarray:
+    unique, inverse = _unique(values)
+    return np.array([canonical_unit(value) for value in unique], dtype=object)[inverse]
+
+
+# столбец записей нового формата ("1 ¼ ст. л.") -> (количества, единицы как на сайте)
+def normalize_ingredients(values: Iterable[Optional[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    unique, inverse = _unique(values)
+    pairs = [split_quantity_unit(value) for value in unique]
+    quantities = np.array([parse_quantity(quantity) for quantity, _ in pairs], dtype=np.float64)
+    units = np.array([unit for _, unit in pairs], dtype=object)
+    return quantities[inverse], units[inverse]
+
+
+# словарные формы для столбца названий ингредиентов (как canonical_ingredient)
+def canonical_ingredients(values: Iterable[Optional[str]]) -> np.ndarray:
+    unique, inverse = _unique(values)
+    return np.array([canonical_ingredient(value) for value in unique], dtype=object)[inverse]
@@ -0,0 +1,227 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Iterator, List, NamedTuple, Optional
+
+import metrics
+
+
+# локальный кэш скачанных страниц. Сами страницы лежат сжатыми файлами, адресованными по sha256
+# содержимого (одинаковые страницы хранятся один раз), а индекс rid -> страница с ETag/Last-Modified
+# и временем последнего обращения - в маленькой sqlite базе рядом. Когда суммарный размер файлов
+# превышает max_bytes, выбрасываются страницы, к которым дольше всего не обращались
+
+PAGE_CACHE_DIR = './page_cache'
+
+# режимы работы с кэшем при загрузке страницы:
+# use - страница из кэша, если она там есть, иначе из сети (и кладется в кэш)
+# refresh - страница из кэша перепроверяется на сайте условным запросом (If-None-Match/If-Modified-Since)
+# offline - только кэш, в сеть не ходим вообще
+CACHE_USE = 'use'
+CACHE_REFRESH = 'refresh'
+CACHE_OFFLINE = 'offline'
+CACHE_MODES = (CACHE_USE, CACHE_REFRESH, CACHE_OFFLINE)
+
+# время обращения к странице копится в памяти и пишется в индекс пачкой раз в столько чтений
+# (а также перед вытеснением и при закрытии кэша), чтобы офлайн переразбор не упирался в commit на каждой странице
+ACCESS_FLUSH_EVERY = 256
+
+
+class CachedPage(NamedTuple):
+    rid: int
+    content: bytes
+    encoding: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+
+class PageCache:
+    def __init__(self, directory: str = PAGE_CACHE_DIR, max_bytes: int = 2 * 1024 ** 3, level: int = 6):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.__level = level
+        self.__lock = threading.Lock()
+        self.__accessed = {}
+        os.makedirs(os.path.join(directory, 'blobs'), exist_ok=True)
+        self.__db = sqlite3.connect(os.path.join(directory, 'index.sqlite'), check_same_thread=False)
+        self.__db.executescript('''
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                rid INTEGER PRIMARY KEY,
+                digest TEXT NOT NULL REFERENCES blobs(digest),
+                encoding TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_pages_accessed_at ON pages(accessed_at);
+            CREATE INDEX IF NOT EXISTS ix_pages_digest ON pages(digest);
+        ''')
+        # суммарный размер файлов считается один раз и дальше ведется в put/__evict
+        self.__total = self.__db.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+
+    def __blob_path(self, digest: str) -> str:
+        return os.path.join(self.directory, 'blobs', digest[:2], f'{digest}.z')
+
+    # функция получения страницы из кэша (None, если ее там нет)
+    def get(self, rid: int) -> Optional[CachedPage]:
+        with self.__lock:
+            row = self.__db.execute(
+                'SELECT digest, encoding, etag, last_modified FROM pages WHERE rid = ?', (rid,)
+            ).fetchone()
+            if row is None:
+                return None
+            digest, encoding, etag, last_modified = row
+            try:
+                with open(self.__blob_path(digest), 'rb') as f:
+                    content = zlib.decompress(f.read())
+            except (OSError, zlib.error):
+                # файл пропал или испорчен - считаем, что страницы в кэше нет
+                self.__accessed.pop(rid, None)
+                self.__db.execute('DELETE FROM pages WHERE rid = ?', (rid,))
+                self.__db.commit()
+                return None
+            self.__accessed[rid] = time.time()
+            if len(self.__accessed) >= ACCESS_FLUSH_EVERY:
+                self.__flush_accessed()
+                self.__db.commit()
+        return CachedPage(rid, content, encoding, etag, last_modified)
+
+    # функция сохранения страницы в кэш
+    def put(self, rid: int, content: bytes, encoding: str = None, etag: str = None, last_modified: str = None):
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.__blob_path(digest)
+        with self.__lock:
+            known = self.__db.execute('SELECT 1 FROM blobs WHERE digest = ?', (digest,)).fetchone()
+            if not known:
+                compressed = zlib.compress(content, self.__level)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(compressed)
+                os.replace(path + '.tmp', path)
+                self.__db.execute('INSERT INTO blobs (digest, size) VALUES (?, ?)', (digest, len(compressed)))
+                self.__total += len(compressed)
+            now = time.time()
+            self.__accessed.pop(rid, None)
+            self.__db.execute(
+                'INSERT OR REPLACE INTO pages (rid, digest, encoding, etag, last_modified, fetched_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (rid, digest, encoding, etag, last_modified, now, now)
+            )
+            self.__evict()
+            self.__db.commit()
+
+    # отметка, что сайт подтвердил актуальность страницы (ответил 304)
+    def touch(self, rid: int):
+        with self.__lock:
+            now = time.time()
+            self.__accessed.pop(rid, None)
+            self.__db.execute('UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE rid = ?', (now, now, rid))
+            self.__db.commit()
+
+    # запись накопленных времен обращения в индекс (commit делает вызывающий)
+    def __flush_accessed(self):
+        if self.__accessed:
+            self.__db.executemany('UPDATE pages SET accessed_at = ? WHERE rid = ?',
+                                  [(accessed_at, rid) for rid, accessed_at in self.__accessed.items()])
+            self.__accessed.clear()
+
+    # вытеснение давно не использованных страниц, пока файлы не влезут в max_bytes
+    def __evict(self):
+        if self.__total <= self.max_bytes:
+            return
+        # кэш могли пополнять другие процессы - перед вытеснением сверяемся с индексом
+        self.__total = self.__db.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+        while self.__total > self.max_bytes:
+            # иначе недавно прочитанные страницы выглядели бы давно не использованными
+            self.__flush_accessed()
+            victims = self.__db.execute('SELECT rid FROM pages ORDER BY accessed_at LIMIT 100').fetchall()
+            if not victims:
+                break
+            self.__db.executemany('DELETE FROM pages WHERE rid = ?', victims)
+            orphans = self.__db.execute(
+                'SELECT digest, size FROM blobs WHERE digest NOT IN (SELECT digest FROM pages)'
+            ).fetchall()
+            for digest, size in orphans:
+                try:
+                    os.remove(self.__blob_path(digest))
+                except FileNotFoundError:
+                    pass
+                self.__total -= size
+            self.__db.executemany('DELETE FROM blobs WHERE digest = ?', [(digest,) for digest, _ in orphans])
+
+    # все rid, страницы которых лежат в кэше, по возрастанию
+    def rids(self) -> List[int]:
+        with self.__lock:
+            return [rid for rid, in self.__db.execute('SELECT rid FROM pages ORDER BY rid')]
+
+    # все закэшированные страницы (rid, html) по возрастанию rid - для офлайн переразбора
+    def iter_pages(self) -> Iterator[tuple]:
+        for rid in self.rids():
+            page = self.get(rid)
+            if page is not None:
+                yield rid, page.text
+
+    def size(self) -> int:
+        with self.__lock:
+            return self.__total
+
+    def close(self):
+        with self.__lock:
+            self.__flush_accessed()
+            self.__db.commit()
+            self.__db.close()
+
+
+# загрузка страницы с учетом кэша (session - requests или requests.Session, cache может быть None).
+# Возвращает текст страницы или None, если страницы нет в кэше в режиме offline; ошибки сети
+# пробрасываются как есть. throttle вызывается непосредственно перед походом в сеть (ограничение частоты)
+def fetch_with_cache(session, url: str, rid: int, cache: Optional[PageCache], mode: str = CACHE_USE,
+                     headers: dict = None, timeout: float = None, throttle=None) -> Optional[str]:
+    cached = cache.get(rid) if cache is not None else None
+    if cached is not None and mode in (CACHE_USE, CACHE_OFFLINE):
+        metrics.FETCH_PAGES.inc(result='cache')
+        return cached.text
+    if cache is not None and mode == CACHE_OFFLINE:
+        metrics.FETCH_PAGES.inc(result='missing')
+        return None
+
+    request_headers = dict(headers or {})
+    if cached is not None:
+        if cached.etag:
+            request_headers['If-None-Match'] = cached.etag
+        if cached.last_modified:
+            request_headers['If-Modified-Since'] = cached.last_modified
+
+    if throttle is not None:
+        throttle()
+    try:
+        with metrics.FETCH_SECONDS.time():
+            response = session.get(url, headers=request_headers, timeout=timeout)
+    except Exception as e:
+        metrics.FETCH_ERRORS.inc(reason=type(e).__name__)
+        raise
+    if response.status_code == 304 and cached is not None:
+        metrics.FETCH_PAGES.inc(result='not_modified')
+        cache.touch(rid)
+        return cached.text
+    if response.status_code >= 400:
+        metrics.FETCH_ERRORS.inc(reason=response.status_code)
+    response.raise_for_status()
+    metrics.FETCH_PAGES.inc(result='network')
+    metrics.FETCH_BYTES.inc(len(response.content))
+    if cache is not None:
+        cache.put(rid, response.content, response.encoding,
+                  response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return response.text
@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import metrics
+from entities import RecipeRecord
+from parsing import RecipeParser, BASE_URL, recipe_to_record
+
+# стадия разбора html -> рецепт в пуле процессов: BeautifulSoup + lxml упираются в CPU, и в потоках
+# они все равно работают на одном ядре из-за GIL. На вход идут пары (rid, сырые байты страницы),
+# обратно возвращаются RecipeRecord (обычные кортежи, которые дешево пиклятся) или None.
+# Метрики разбора процессы пула не пишут сами (у каждого процесса свой реестр), а возвращают вместе с
+# результатом время разбора и причину неудачи, и в метрики их записывает основной процесс
+
+# парсер, созданный один раз в каждом процессе пула
+_parser = None
+
+
+def _init_worker():
+    global _parser
+    _parser = RecipeParser(BASE_URL)
+
+
+# разбор одной страницы в процессе пула: (рецепт, время разбора, причина неудачи). Рецепт None -
+# на странице нет рецепта или ее не удалось разобрать
+def _parse_page_timed(page: Tuple[int, bytes]) -> Tuple[Optional[RecipeRecord], float, Optional[str]]:
+    global _parser
+    if _parser is None:
+        _init_worker()
+    rid, html = page
+    started = time.perf_counter()
+    try:
+        recipe = _parser.parse_html(html, rid)
+    except Exception as e:
+        print(f"Ошибка при разборе страницы rid={rid}: {e}")
+        return None, time.perf_counter() - started, type(e).__name__
+    seconds = time.perf_counter() - started
+    if not recipe.recipe_name:
+        return None, seconds, 'NoRecipe'
+    return recipe_to_record(recipe), seconds, None
+
+
+# разбор одной страницы; None - на странице нет рецепта или ее не удалось разобрать
+def parse_page(page: Tuple[int, bytes]) -> Optional[RecipeRecord]:
+    return _parse_page_timed(page)[0]
+
+
+def parse_pages(pages: List[Tuple[int, bytes]]) -> List[tuple]:
+    return [_parse_page_timed(page) for page in pages]
+
+
+# результат _parse_page_timed в основном процессе: метрики записываются, наружу уходит только рецепт
+def _report(result: tuple) -> Optional[RecipeRecord]:
+    record, seconds, failure = result
+    metrics.record_parse(seconds, failure)
+    return record
+
+
+class ParseStage:
+    # workers - число процессов (по умолчанию по числу ядер), chunksize - сколько страниц уходит
+    # в процесс одной задачей, чтобы не платить за пересылку каждой страницы отдельно
+    def __init__(self, workers: int = None, chunksize: int = 16):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = max(1, chunksize)
+        # процессы запускаются через spawn, а не fork: пул создается в процессе, где уже работают потоки
+        # (uvicorn, фоновые задачи, загрузка страниц), и при fork процесс пула мог бы унаследовать
+        # чужую захваченную блокировку (метрик, кэша страниц) и повиснуть на ней навсегда
+        self.__pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                          mp_context=multiprocessing.get_context('spawn'))
+
+    # отдельная задача на одну страницу (для конкурентного обходчика, которому страницы приходят по одной)
+    def submit(self, rid: int, html) -> Future:
+        result = Future()
+
+        def done(future: Future):
+            try:
+                result.set_result(_report(future.result()))
+            except BaseException as e:
+                result.set_exception(e)
+
+        self.__pool.submit(_parse_page_timed, (rid, html)).add_done_callback(done)
+        return result
+
+    # разбор потока страниц с сохранением порядка. В работе одновременно не больше 2 * workers пачек,
+    # поэтому поток может быть сколь угодно длинным: память не растет вместе с ним
+    def map(self, pages: Iterable[Tuple[int, bytes]]) -> Iterator[Optional[RecipeRecord]]:
+        iterator = iter(pages)
+        in_flight = deque()
+        while True:
+            while len(in_flight) < 2 * self.workers:
+                chunk = list(islice(iterator, self.chunksize))
+                if not chunk:
+                    break
+                in_flight.append(self.__pool.submit(parse_pages, chunk))
+            if not in_flight:
+                return
+            for result in in_flight.popleft().result():
+                yield _report(result)
+
+    def close(self):
+        self.__pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,72 +1,140 @@
 import requests
 from bs4 import BeautifulSoup
+import hashlib
 import json
 import time
 from urllib.parse import urljoin
-from entities import IngredientBase, RecipeBase
-from typing import List, Tuple
-import re
+from entities import IngredientBase, RecipeBase, IngredientRecord, RecipeRecord
+from page_cache import PageCache, CACHE_USE
+from fetcher import Fetcher, DeadLetters
+from recipe_features import parse_cooking_minutes, meal_type_flags
+from normalize import parse_quantity, split_quantity_unit, canonical_ingredient
+import metrics
+from typing import Dict, Iterator, List, Tuple
 
 BASE_URL = "https://www.russianfood.com/recipes/recipe.php" 
 
+# заголовки, с которыми ходим на сайт (общие для последовательного и конкурентного обхода)
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
 class RecipeParser:
-    # единственное поле - URL страницы, которую парсим
+    # URL страницы, которую парсим
     __URL = None
-    def __init__(self, url):
+    # локальный кэш страниц (page_cache.PageCache) и режим работы с ним; без кэша всегда идем в сеть
+    __cache = None
+    __cache_mode = CACHE_USE
+    # загрузчик страниц с повторами (fetcher.Fetcher); недокачанные rid копятся в dead_letters
+    __fetcher = None
+    def __init__(self, url, cache : PageCache = None, cache_mode : str = CACHE_USE, dead_letters : DeadLetters = None):
         self.__URL = url
+        self.__cache = cache
+        self.__cache_mode = cache_mode
+        self.__fetcher = Fetcher(requests, url, cache, cache_mode, HEADERS, dead_letters=dead_letters)
+    # rid, которые не удалось скачать за все попытки
+    @property
+    def dead_letters(self) -> DeadLetters:
+        return self.__fetcher.dead_letters
     # основная функция парсинга
     def parsing(self, count : int) -> List[RecipeBase]:
+        return list(self.iter_parsing(count))
+    # генератор рецептов: отдает рецепты по одному сразу после разбора страницы, не копя их в памяти
+    # start_rid - с какого rid начинать обход (для дообхода с сохраненной контрольной точки)
+    def iter_parsing(self, count : int, start_rid : int = 1) -> Iterator[RecipeBase]:
 
-        recipes = []
-        recipe = RecipeBase()
-
-        page_num = 0
+        found = 0
+        page_num = start_rid - 1
 
-        while len(recipes) < count:
+        while found < count:
             page_num += 1
             # собираем готовый url
             url = f"{self.__URL}?rid={page_num}"
             print(f"Парсинг страницы: {url}")
             
-            # получаем html страницу по url
-            html = self.__get_page(url)
+            # получаем html страницу по url (None - рецепта нет или страницу не удалось скачать)
+            html = self.__get_page(page_num)
             if not html:
                 continue
                 
-            soup = BeautifulSoup(html, 'lxml')
-            
-            # парсим преобразованную html страницу и получаем готовый рецепт
-            recipe = self.__get_full_recipe(soup)
+            # парсим html страницу и получаем готовый рецепт
+            recipe = self.parse_html(html, page_num)
             if recipe.recipe_name:
-                recipes.append(recipe)
-        return recipes
-    # функция получения html страницы по url
-    def __get_page(self, url) -> str:
-
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
+                found += 1
+                yield recipe
+    # повторная загрузка страниц из dead_letters (см. Fetcher.refetch_dead_letters): отдает рецепты
+    # со страниц, которые на этот раз скачались; снова не скачавшиеся остаются в dead_letters
+    def iter_refetched(self) -> Iterator[RecipeBase]:
+        for result in self.__fetcher.refetch_dead_letters():
+            if not result.html:
+                continue
+            recipe = self.parse_html(result.html, result.rid)
+            if recipe.recipe_name:
+                yield recipe
+    # функция разбора уже скачанной html страницы (используется и конкурентным обходчиком из crawler.py);
+    # время разбора и неудачи пишутся в метрики (см. metrics.py)
+    def parse_html(self, html, rid : int = None) -> RecipeBase:
+        started = time.perf_counter()
         try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            return response.text
-        except requests.exceptions.RequestException as e:
-            print(f"Ошибка при загрузке страницы: {e}")
-            return None
+            soup = BeautifulSoup(html, 'lxml')
+            recipe = self.__get_full_recipe(soup)
+        except Exception as e:
+            metrics.record_parse(time.perf_counter() - started, type(e).__name__)
+            raise
+        metrics.record_parse(time.perf_counter() - started, None if recipe.recipe_name else 'NoRecipe')
+        recipe.source_rid = rid
+        return recipe
+    # функция получения html страницы по rid (через кэш, если он задан, с повторами при временных ошибках)
+    def __get_page(self, rid : int) -> str:
+        return self.__fetcher.fetch(rid).html
     # функция получения полной информации о рецепте
     def __get_full_recipe(self, soup) -> RecipeBase:
+        nodes = self.__locate_nodes(soup)
+        sub_info = self.__get_recipe_subinfo(nodes['sub_info'])
         recipe = RecipeBase()
-        recipe.recipe_name = self.__get_recipe_title(soup)
-        recipe.cooking_time = self.__get_recipe_subinfo(soup)['total_time']
-        recipe.categories = self.__get_recipe_categories(soup)
-        recipe.description = self.__get_recipe_description(soup)
-        recipe.ingredients = self.__get_ingredients(soup)
-        recipe.number_of_servings = self.__get_recipe_subinfo(soup)['portions']
+        recipe.recipe_name = self.__get_recipe_title(nodes['title'])
+        recipe.cooking_time = sub_info['total_time']
+        recipe.categories = self.__get_recipe_categories(nodes['razdels'])
+        recipe.description = self.__get_recipe_description(nodes['description'], nodes['title'])
+        recipe.ingredients = self.__get_ingredients(nodes['ingredients'])
+        recipe.number_of_servings = sub_info['portions']
         return recipe
+    # функция поиска всех нужных узлов страницы за один проход по дереву (раньше каждый помощник
+    # делал свой soup.find по всей странице, а __get_recipe_subinfo вызывался дважды)
+    def __locate_nodes(self, soup) -> dict:
+        nodes = {'title': None, 'sub_info': None, 'razdels': None, 'ingredients': None, 'description': None}
+        seen_div = False
+        remaining = len(nodes)
+        for tag in soup.find_all(True):
+            name = tag.name
+            if name == 'p':
+                # описание - первый абзац после первого div на странице (как soup.find('div').find_next('p'))
+                if seen_div and nodes['description'] is None:
+                    nodes['description'] = tag
+                    remaining -= 1
+            elif name == 'div':
+                seen_div = True
+                classes = tag.get('class') or ()
+                if nodes['sub_info'] is None and 'sub_info' in classes:
+                    nodes['sub_info'] = tag
+                    remaining -= 1
+                elif nodes['razdels'] is None and ' '.join(classes) == 'razdels padding_l':
+                    nodes['razdels'] = tag
+                    remaining -= 1
+            elif name == 'h1':
+                if nodes['title'] is None and 'title' in (tag.get('class') or ()):
+                    nodes['title'] = tag
+                    remaining -= 1
+            elif name == 'table':
+                if nodes['ingredients'] is None and 'ingr' in (tag.get('class') or ()):
+                    nodes['ingredients'] = tag
+                    remaining -= 1
+            if not remaining:
+                break
+        return nodes
     # функция получения категорий, к которым относится блюдо
-    def __get_recipe_categories(self, soup) -> List[str]:
+    def __get_recipe_categories(self, categories_div) -> List[str]:
         
-        categories_div = soup.find('div', class_='razdels padding_l')
         if not categories_div:
             return []
         
@@ -88,30 +156,27 @@ class RecipeParser:
         
         return categories
     # функция получения названия блюда
-    def __get_recipe_title(self, soup) -> str:
-        recipe_title = soup.find('h1', class_='title')
+    def __get_recipe_title(self, recipe_title) -> str:
         if recipe_title:
             return recipe_title.get_text(strip=True)
         return ""
     # функция получения доп информации
-    def __get_recipe_subinfo(self, soup) -> dict:
+    def __get_recipe_subinfo(self, sub_info) -> dict:
         info = {
             'portions': '',
             'total_time': '',
             'prep_time': '',
         }
         
-        sub_info = soup.find('div', class_='sub_info')
         if not sub_info:
             return info
         
+        time_elements = sub_info.find_all('span', class_='hl')
         # Извлекаем порции
-        portions = sub_info.find('span', class_='hl')
-        if portions:
-            info['portions'] = int(portions.get_text(strip=True))
+        if time_elements:
+            info['portions'] = int(time_elements[0].get_text(strip=True))
         
         # Извлекаем время готовки
-        time_elements = sub_info.find_all('span', class_='hl')
         if len(time_elements) >= 2:
             info['total_time'] = str(time_elements[1].get_text(strip=True))  # общее время
         if len(time_elements) >= 3:
@@ -120,14 +185,12 @@ class RecipeParser:
             info['total_time'] = "0"
         return info
     # функция получения краткого описания рецепта
-    def __get_recipe_description(self, soup) -> str:
-        # ищем первый абзац после заголовка
-        description_p = soup.find('div').find_next('p')
+    def __get_recipe_description(self, description_p, title) -> str:
+        # первый абзац после заголовка
         if description_p:
             return description_p.get_text(strip=True)
         
         # альтернативный способ: ищем в div после title
-        title = soup.find('h1', class_='title')
         if title:
             # ищем следующий div с описанием
             next_div = title.find_next('div')
@@ -138,10 +201,7 @@ class RecipeParser:
         
         return ""
     # функция получения ингредиентов для рецепта из преобразованной html страницы
-    def __get_ingredients(self, soup) -> List[IngredientBase]:
-        
-        # ищем класс 'ingr' с тэгом 'table'
-        ingredients_table = soup.find('table', class_='ingr')  
+    def __get_ingredients(self, ingredients_table) -> List[IngredientBase]:
             
         ingredients = []
         if not ingredients_table:
@@ -179,34 +239,12 @@ class RecipeParser:
         ingredient.ingredient_name = name_span.get_text(strip=True) if name_span else name_cell.get_text(strip=True)
         # получаем его количество
         quantity_cell = cells[1]
-        ingredient.ingredient_quantity = self.__convert_quantity_from_str_to_float(quantity_cell.get_text(strip=True))
+        ingredient.ingredient_quantity = parse_quantity(quantity_cell.get_text(strip=True))
         # получаем единицы измерения
         unit_cell = cells[2]
         unit_nobr = unit_cell.find('nobr')
         ingredient.ingredient_unit = unit_nobr.get_text(strip=True) if unit_nobr else unit_cell.get_text(strip=True)
         return ingredient
-    # перевод количества ингридиента из str в float
-    def __convert_quantity_from_str_to_float(self, quantity : str):
-        result = 0
-        quantity = re.sub(r'[a-zA-Zа-яА-Я]', '', quantity)
-        quantity = quantity.replace(',', ' ')
-        quantity = quantity.replace('.', ' ')
-        quantity = quantity.strip()
-        quantity = quantity.replace(' ', '.')
-        if quantity == '':
-            return 0
-        if '-' in quantity:
-            parts = quantity.split('-', 1) 
-            for part in parts:
-                result += float(part)
-            return result / len(parts)
-        elif '—' in quantity:
-            parts = quantity.split('—', 1) 
-            for part in parts:
-                result += float(part)
-            return result / len(parts)
-        # еще были случаи ¼, но если вылезут то нужно будет обработать
-        return float(quantity)
     # парсинг нового формата рецептов
     def __parse_new_format(self, cell) -> IngredientBase:
 
@@ -232,26 +270,12 @@ class RecipeParser:
             ingredient.ingredient_name = parts[0].strip()
             quantity_unit = parts[1].strip()
 
-            quantity, unit = self.__extract_quantity_and_unit(quantity_unit)
-            ingredient.ingredient_quantity = self.__convert_quantity_from_str_to_float(quantity)
+            quantity, unit = split_quantity_unit(quantity_unit)
+            ingredient.ingredient_quantity = parse_quantity(quantity)
             ingredient.ingredient_unit = unit
         else:
             ingredient.ingredient_name = full_text
         return ingredient
-    # функция для разбиения количества и единиц измерения из новой записи ингридиента на сайте
-    def __extract_quantity_and_unit(self, quantity_unit) -> Tuple[str, str]:
-        quantity, unit = '', ''
-        # суть в том, что пока мы не встретили подстроку "пробел|\t + русская буква" - это все прибавляем к количеству, 
-        # а остальное что осталось к единицам измеререния
-        for i in range(len(quantity_unit) - 1):
-            # 1040 - А
-            # 1103 - я
-            if (quantity_unit[i] == ' ' or quantity_unit[i] == '\t') and (ord(quantity_unit[i + 1]) >= 1040 and ord(quantity_unit[i + 1]) <= 1103):
-                unit = quantity_unit[i+1:]
-                break
-            else:
-                quantity += quantity_unit[i]
-        return quantity, unit
 
 # функция, возвращающая список всех категорий, которые встретились при парсинге, для добавления в 
 # таблицу categories в БД
@@ -263,16 +287,16 @@ def get_all_categories(recipes : List[RecipeBase]) -> set[str]:
     return set(categories)
 
 # функция, возвращающая список всех ингредиентов, которые встретились при парсинге, для добавления в 
-# таблицу ingredients в БД
+# таблицу ingredients в БД (в словарной форме, см. normalize.canonical_ingredient)
 def get_all_ingredients(recipes : List[RecipeBase]) -> set[str]:
     ingredients = []
     for recipe in recipes:
         for ingredient in recipe.ingredients:
-            ingredients.append(ingredient.ingredient_name)
+            ingredients.append(canonical_ingredient(ingredient.ingredient_name))
     return set(ingredients)
 
 # функция, возвращающая список всех рецептов, которые встретились при парсинге, но без списка ингредиентов
-# и категорий, для добавления в таблицу categories в БД
+# и категорий, для добавления в таблицу categories в БД (вместе с посчитанными признаками для фильтров)
 def get_all_recipes(recipes : List[RecipeBase]) -> list:
     result_recipes = []
     for recipe in recipes:
@@ -280,45 +304,99 @@ def get_all_recipes(recipes : List[RecipeBase]) -> list:
             'recipe_name': recipe.recipe_name,
             'number_of_servings': recipe.number_of_servings,
             'cooking_time': recipe.cooking_time,
-            'description': recipe.description
+            'description': recipe.description,
+            'source_rid': recipe.source_rid,
+            'content_hash': recipe_fingerprint(recipe),
+            'cooking_minutes': parse_cooking_minutes(recipe.cooking_time),
+            'ingredient_count': len({canonical_ingredient(i.ingredient_name) for i in recipe.ingredients}),
+            **meal_type_flags(recipe.categories)
         }
         result_recipes.append(current_recipe)
     return result_recipes
 
-# функция поиска строки в массиве строк, возвращаемое значение - {индекс искомой строки в массиве + 1}
-def search_string_in_string_list(list : List[str], finding_string : str) -> int:
-    if finding_string not in list:
-        raise RuntimeError('Array does not contain the given string')
-    for i in range(len(list)):
-        if list[i] == finding_string:
-            return i + 1
+# перевод рецепта в компактную неизменяемую запись (для передачи между процессами)
+def recipe_to_record(recipe : RecipeBase) -> RecipeRecord:
+    return RecipeRecord(
+        recipe_name=recipe.recipe_name,
+        ingredients=[
+            IngredientRecord(i.ingredient_name, i.ingredient_quantity, i.ingredient_unit) if i is not None else None
+            for i in recipe.ingredients
+        ],
+        number_of_servings=recipe.number_of_servings,
+        cooking_time=recipe.cooking_time,
+        categories=list(recipe.categories),
+        description=recipe.description,
+        source_rid=recipe.source_rid
+    )
+
+# отпечаток содержимого рецепта: меняется, только если на странице поменялось что-то, что мы сохраняем в БД
+def recipe_fingerprint(recipe : RecipeBase) -> str:
+    content = [
+        recipe.recipe_name, recipe.number_of_servings, recipe.cooking_time, recipe.description,
+        [(i.ingredient_name, i.ingredient_quantity, i.ingredient_unit) for i in recipe.ingredients],
+        recipe.categories
+    ]
+    return hashlib.sha1(json.dumps(content, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+# интернирование имен (ингредиентов или категорий): каждому различному имени один раз выдается
+# стабильный id, дальше поиск id - это обращение к словарю, а не линейный проход по списку.
+# existing - уже лежащие в БД имена с их id, next_id - первый свободный id в таблице. Так id из
+# индекса совпадают с id в БД, и новые имена можно вставлять сразу с этими id
+class NameIndex:
+    def __init__(self, existing: Dict[str, int] = None, next_id: int = None):
+        self.__ids = dict(existing or {})
+        self.__next_id = next_id if next_id is not None else max(self.__ids.values(), default=0) + 1
+        self.__new = []
+    # id имени; если имя встречается впервые, ему выдается следующий свободный id
+    def id_of(self, name: str) -> int:
+        name_id = self.__ids.get(name)
+        if name_id is None:
+            name_id = self.__next_id
+            self.__next_id += 1
+            self.__ids[name] = name_id
+            self.__new.append((name_id, name))
+        return name_id
+    # имена, которым id был выдан этим индексом (в БД их еще нет), в порядке выдачи
+    def new_names(self) -> List[Tuple[int, str]]:
+        return list(self.__new)
+    def ids(self) -> Dict[str, int]:
+        return dict(self.__ids)
+    def __contains__(self, name) -> bool:
+        return name in self.__ids
+    def __len__(self) -> int:
+        return len(self.__ids)
 
-# функция, формирующая список со строчками для сводной таблицы recipe|ingredient
-def get_ingredients_and_recipe_db_table(recipes: List[RecipeBase]) -> list:
+# функция, формирующая список со строчками для сводной таблицы recipe|ingredient.
+# Без переданного индекса id ингредиентов раздаются с 1 в порядке первого появления в recipes,
+# без recipe_ids рецепты нумеруются с 1 в порядке списка. id выдается словарной форме названия,
+# а название как на сайте сохраняется в raw_name
+def get_ingredients_and_recipe_db_table(recipes: List[RecipeBase], ingredient_index: NameIndex = None,
+                                        recipe_ids: List[int] = None) -> list:
     result_list = []
-    ingredients_set = get_all_ingredients(recipes)
-    ingredients_list = list(ingredients_set)
+    ingredient_index = ingredient_index if ingredient_index is not None else NameIndex()
     for i in range(len(recipes)):
-        for ingredient in recipes[i].ingredients:
+        for position, ingredient in enumerate(recipes[i].ingredients):
             current_row = {
-                'recipe_id': i + 1,
-                'ingredient_id': search_string_in_string_list(ingredients_list, ingredient.ingredient_name),
+                'recipe_id': recipe_ids[i] if recipe_ids else i + 1,
+                'ingredient_id': ingredient_index.id_of(canonical_ingredient(ingredient.ingredient_name)),
+                'raw_name': ingredient.ingredient_name,
                 'quantity': ingredient.ingredient_quantity,
-                'unit': ingredient.ingredient_unit
+                'unit': ingredient.ingredient_unit,
+                'position': position
             }
             result_list.append(current_row)
     return result_list
 
 # функция, формирующая список со строчками для сводной таблицы recipe|category 
-def get_categories_and_recipe_db_table(recipes: List[RecipeBase]) -> list:
+def get_categories_and_recipe_db_table(recipes: List[RecipeBase], category_index: NameIndex = None,
+                                       recipe_ids: List[int] = None) -> list:
     result_list = []
-    categories_set = get_all_categories(recipes)
-    categories_list = list(categories_set)
+    category_index = category_index if category_index is not None else NameIndex()
     for i in range(len(recipes)):
         for category in recipes[i].categories:
             current_row = {
-                'recipe_id': i + 1,
-                'category_id': search_string_in_string_list(categories_list, category)
+                'recipe_id': recipe_ids[i] if recipe_ids else i + 1,
+                'category_id': category_index.id_of(category)
             }
             result_list.append(current_row)
     return result_list
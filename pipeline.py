@@ -0,0 +1,92 @@
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from entities import RecipeBase
+from parsing import RecipeParser, BASE_URL
+from crawler import ConcurrentCrawler
+from parse_pool import ParseStage
+from page_cache import PageCache, CACHE_USE
+from fetcher import DeadLetters
+from loader import fill_database, save_dead_letters
+
+# потоковый конвейер наполнения БД: страницы -> рецепты -> пачки фиксированного размера -> коммит пачки.
+# В памяти одновременно живет не больше одной пачки, а все закоммиченные пачки переживают падение обхода
+
+DEFAULT_BATCH_SIZE = 500
+
+
+# генератор разобранных рецептов: последовательный обход или конкурентный, если concurrency > 1
+# (parse_processes > 0 дополнительно выносит разбор страниц в пул процессов).
+# Рецепты идут по возрастанию rid, начиная со start_rid. rid страниц, которые не удалось скачать
+# за все попытки, складываются в dead_letters (если он задан)
+def iter_parsed_recipes(count: int, concurrency: int = 1, url: str = BASE_URL,
+                        start_rid: int = 1, parse_processes: int = 0,
+                        cache: PageCache = None, cache_mode: str = CACHE_USE,
+                        dead_letters: DeadLetters = None) -> Iterator[RecipeBase]:
+    if concurrency > 1:
+        crawler = ConcurrentCrawler(url, concurrency=concurrency, parse_processes=parse_processes,
+                                    cache=cache, cache_mode=cache_mode, dead_letters=dead_letters)
+        for _, recipe in crawler.iter_recipes(count, start_rid):
+            yield recipe
+    else:
+        yield from RecipeParser(url, cache, cache_mode, dead_letters).iter_parsing(count, start_rid)
+
+
+# повторная загрузка страниц из dead_letters (например, загруженных из БД через loader.load_dead_letters).
+# Рецепты идут по возрастанию rid; скачавшиеся страницы уходят из dead_letters
+def iter_refetched_recipes(dead_letters: DeadLetters, url: str = BASE_URL, cache: PageCache = None,
+                           cache_mode: str = CACHE_USE) -> Iterator[RecipeBase]:
+    yield from RecipeParser(url, cache, cache_mode, dead_letters).iter_refetched()
+
+
+# офлайн переразбор закэшированных страниц (например, после правок в извлечении рецепта):
+# в сеть не ходим вообще, это чисто CPU работа. Рецепты идут по возрастанию rid, начиная со start_rid
+def iter_cached_recipes(cache: PageCache, count: int = None, parse_processes: int = 0,
+                        start_rid: int = 1) -> Iterator[RecipeBase]:
+    pages = ((rid, html) for rid, html in cache.iter_pages() if rid >= start_rid)
+    if parse_processes > 0:
+        with ParseStage(parse_processes) as stage:
+            recipes = (record for record in stage.map(pages) if record is not None)
+            yield from islice(recipes, count)
+        return
+    parser = RecipeParser(BASE_URL)
+    recipes = (parser.parse_html(html, rid) for rid, html in pages)
+    yield from islice((recipe for recipe in recipes if recipe.recipe_name), count)
+
+
+# разбиение потока на списки по size элементов (последний список может быть короче)
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+# заливка потока рецептов в БД пачками; каждая пачка коммитится внутри fill_database вместе
+# с контрольной точкой обхода, так что убитый обход можно продолжить с get_checkpoint(db) + 1.
+# on_batch вызывается после каждого коммита с общим числом сохраненных рецептов,
+# on_recipes - с id рецептов, записанных этой пачкой (новых и перезаписанных).
+# dead_letters (если задан) - недокачанные страницы обхода: они сохраняются в БД с каждой пачкой
+# и еще раз после последней
+def ingest(db: Session, recipes: Iterable[RecipeBase], batch_size: int = DEFAULT_BATCH_SIZE,
+           on_batch: Optional[Callable[[int], None]] = None,
+           on_recipes: Optional[Callable[[List[int]], None]] = None,
+           dead_letters: DeadLetters = None) -> int:
+    stored = 0
+    for batch in batched(recipes, batch_size):
+        written = fill_database(db, batch, dead_letters)
+        stored += len(batch)
+        # сбрасываем identity map сессии, иначе ORM объекты всех пачек копятся в памяти
+        db.expunge_all()
+        print(f"Сохранено рецептов: {stored}")
+        if on_batch:
+            on_batch(stored)
+        if on_recipes and written:
+            on_recipes(written)
+    if dead_letters is not None:
+        save_dead_letters(db, dead_letters)
+    return stored
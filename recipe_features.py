@@ -0,0 +1,47 @@
+import re
+from typing import Dict, Iterable, Optional
+
+# признаки рецепта, которые считаются один раз при заливке в БД и хранятся в индексируемых колонках
+# recipes, чтобы фильтры генератора были сравнениями по индексу, а не LIKE по строкам и GROUP BY
+
+# слова в названиях категорий, по которым рецепт относится к приему пищи: тип -> (колонка, слова)
+MEAL_TYPE_TERMS = {
+    'завтрак': ('is_breakfast', ['завтрак', 'breakfast', 'утро']),
+    'обед': ('is_lunch', ['обед', 'lunch', 'первое', 'второе']),
+    'ужин': ('is_dinner', ['ужин', 'dinner', 'вечер']),
+}
+
+# время приготовления в минутах: ответ -> (от, до) включительно, None - без границы
+COOKING_TIME_RANGES = {
+    'быстро': (None, 30),
+    'средне': (31, 60),
+    'долго': (61, None),
+}
+
+# число ингредиентов: ответ -> (от, до) включительно
+DIFFICULTY_RANGES = {
+    'легко': (None, 5),
+    'тяжело': (9, None),
+}
+
+_TIME_PART = re.compile(r'(\d+(?:[.,]\d+)?)\s*(сут|дн|ден|ч|мин)', re.IGNORECASE)
+_MINUTES_IN = {'сут': 1440, 'дн': 1440, 'ден': 1440, 'ч': 60, 'мин': 1}
+
+
+# перевод строки времени с сайта ("1 час 30 мин", "45 мин", "1,5 часа") в минуты; None - время неизвестно
+def parse_cooking_minutes(cooking_time: Optional[str]) -> Optional[int]:
+    if not cooking_time:
+        return None
+    total = 0.0
+    for number, unit in _TIME_PART.findall(cooking_time):
+        total += float(number.replace(',', '.')) * _MINUTES_IN[unit.lower()]
+    return round(total) if total > 0 else None
+
+
+# флаги приема пищи по названиям категорий рецепта: {'is_breakfast': bool, ...}
+def meal_type_flags(categories: Iterable[str]) -> Dict[str, bool]:
+    names = [category.lower() for category in categories or ()]
+    return {
+        column: any(term in name for name in names for term in terms)
+        for column, terms in MEAL_TYPE_TERMS.values()
+    }
@@ -55,4 +55,19 @@ class RecipeUpdate(BaseModel):
 class Recipe(RecipeBase):
     id: int
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+# страница списка рецептов: сами рецепты без ингредиентов и курсор (id последнего рецепта) для следующей
+# страницы; next_cursor = None - страница последняя
+class RecipePage(BaseModel):
+    items: List[Recipe]
+    next_cursor: Optional[int] = None
+
+# рецепт в результатах поиска: score - релевантность по bm25, чем больше, тем лучше
+class RecipeSearchHit(Recipe):
+    score: float
+
+# рецепт в подборе по ингредиентам: сколько из переданных ингредиентов в нем есть и скольких не хватает
+class RecipeIngredientMatch(Recipe):
+    matched: int
+    missing: int
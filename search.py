@@ -0,0 +1,141 @@
+import re
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import text, select, func, bindparam, Table, MetaData, Column, Integer, Text
+from sqlalchemy.orm import Session
+
+from database import IN_CHUNK_SIZE
+from models import Recipe, Ingredient, recipe_ingredient, SEARCH_TABLE
+
+# полнотекстовый поиск по рецептам: виртуальная таблица SQLite FTS5 recipes_fts (rowid = id рецепта)
+# с колонками название, описание и ингредиенты. В таблицу пишутся не исходные тексты, а основы слов
+# (грубый стемминг ниже), а запрос ищет эти основы как префиксы, поэтому "картофель", "картофеля" и
+# "картофелем" находят друг друга. Результаты ранжируются через bm25 с весами колонок
+
+# веса колонок для bm25: совпадение в названии важнее, чем в ингредиентах, и тем более в описании
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+INGREDIENTS_WEIGHT = 4.0
+
+_WORD = re.compile(r'\w+')
+
+# описание recipes_fts для выгрузки и загрузки корпуса (corpus_io): индекс переносится вместе с рецептами,
+# чтобы не строить его заново. Таблица в отдельной MetaData, чтобы create_all не пытался ее создать -
+# ее создает DDL в models
+search_table = Table(
+    SEARCH_TABLE, MetaData(),
+    Column('rowid', Integer, primary_key=True),
+    Column('recipe_name', Text),
+    Column('description', Text),
+    Column('ingredients', Text),
+)
+
+# окончания, которые отрезаются от слова, самые длинные первыми
+_ENDINGS = sorted([
+    'иями', 'ями', 'ами', 'ией', 'ием', 'иях', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ой', 'ей', 'ий', 'ый', 'ую', 'юю', 'ом', 'ем', 'ам', 'ям',
+    'ах', 'ях', 'ов', 'ев', 'ых', 'их', 'ия', 'ью', 'ть',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+], key=len, reverse=True)
+
+# основа должна остаться не короче этого, иначе слово оставляем как есть ("суп" не превращается в "су")
+_MIN_STEM = 3
+
+
+# грубый стемминг русского слова: нижний регистр, ё -> е и отрезание одного окончания
+def stem(word: str) -> str:
+    word = word.lower().replace('ё', 'е')
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+# текст -> строка основ через пробел (в таком виде он и лежит в recipes_fts)
+def stem_text(value: str) -> str:
+    return ' '.join(stem(word) for word in _WORD.findall(value or ''))
+
+
+# строка запроса -> выражение MATCH: каждая основа как префикс, все слова обязательны.
+# Основы берутся в кавычки, поэтому операторы FTS5 (AND, NEAR, -) в запросе пользователя не работают
+def build_match_query(query: str) -> str:
+    stems = [stem(word) for word in _WORD.findall(query or '')]
+    return ' '.join(f'"{word}"*' for word in stems if word)
+
+
+# строки для индекса по id рецептов: (id, название, описание, ингредиенты) с ингредиентами через пробел
+def _search_rows(db: Session, recipe_ids: List[int]) -> List[Tuple[int, str, str, str]]:
+    ingredients = (
+        select(func.group_concat(func.coalesce(recipe_ingredient.c.raw_name, Ingredient.ingredient_name), ' '))
+        .select_from(recipe_ingredient.join(Ingredient, Ingredient.id == recipe_ingredient.c.ingredient_id))
+        .where(recipe_ingredient.c.recipe_id == Recipe.id)
+        .scalar_subquery()
+    )
+    rows = []
+    for i in range(0, len(recipe_ids), IN_CHUNK_SIZE):
+        chunk = recipe_ids[i:i + IN_CHUNK_SIZE]
+        rows.extend(db.execute(
+            select(Recipe.id, Recipe.recipe_name, Recipe.description, ingredients).where(Recipe.id.in_(chunk))
+        ).all())
+    return rows
+
+
+_delete_rows = text(f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN :ids").bindparams(bindparam('ids', expanding=True))
+
+
+def _write_rows(db: Session, rows: Iterable[tuple]):
+    params = [
+        {'id': recipe_id, 'name': stem_text(name), 'description': stem_text(description),
+         'ingredients': stem_text(ingredients)}
+        for recipe_id, name, description, ingredients in rows
+    ]
+    if params:
+        db.execute(text(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, recipe_name, description, ingredients) "
+            "VALUES (:id, :name, :description, :ingredients)"
+        ), params)
+
+
+# переиндексация рецептов по id (новых, измененных или удаленных) в текущей транзакции сессии:
+# вызывается из заливки перед коммитом, поэтому индекс всегда совпадает с таблицей recipes
+def index_recipes(db: Session, recipe_ids: List[int]):
+    for i in range(0, len(recipe_ids), IN_CHUNK_SIZE):
+        chunk = recipe_ids[i:i + IN_CHUNK_SIZE]
+        db.execute(_delete_rows, {'ids': chunk})
+    _write_rows(db, _search_rows(db, recipe_ids))
+
+
+# полная пересборка индекса, если он пуст, а рецепты есть (база, залитая до появления поиска).
+# Возвращает число проиндексированных рецептов
+def rebuild_search_index(db: Session, batch_size: int = 10000) -> int:
+    indexed = db.execute(text(f"SELECT COUNT(*) FROM {SEARCH_TABLE}")).scalar()
+    if indexed:
+        return 0
+    try:
+        recipe_ids = db.execute(select(Recipe.id).order_by(Recipe.id)).scalars().all()
+        for i in range(0, len(recipe_ids), batch_size):
+            _write_rows(db, _search_rows(db, recipe_ids[i:i + batch_size]))
+        db.execute(text(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"))
+        db.commit()
+        if recipe_ids:
+            print(f"Поисковый индекс построен для {len(recipe_ids)} рецептов")
+        return len(recipe_ids)
+
+    except Exception as e:
+        db.rollback()
+        print(f"Ошибка при построении поискового индекса: {e}")
+        raise
+
+
+# поиск рецептов: список (id, оценка) по убыванию релевантности. bm25 в SQLite возвращает
+# отрицательные числа (чем меньше, тем лучше), наружу отдаем их со знаком минус
+def search_recipes(db: Session, query: str, limit: int = 20, offset: int = 0) -> List[Tuple[int, float]]:
+    match = build_match_query(query)
+    if not match:
+        return []
+    rows = db.execute(text(
+        f"SELECT rowid, bm25({SEARCH_TABLE}, :name_weight, :description_weight, :ingredients_weight) AS rank "
+        f"FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match ORDER BY rank LIMIT :limit OFFSET :offset"
+    ), {'match': match, 'limit': limit, 'offset': offset, 'name_weight': NAME_WEIGHT,
+        'description_weight': DESCRIPTION_WEIGHT, 'ingredients_weight': INGREDIENTS_WEIGHT})
+    return [(recipe_id, -rank) for recipe_id, rank in rows]
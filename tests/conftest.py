@@ -0,0 +1,39 @@
+import contextlib
+import io
+import os
+import sys
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY)
+
+
+# приложение, поднятое во временной папке: main при импорте открывает recipes.db в текущей папке и ищет
+# рядом static и templates. Папка остается текущей до конца прогона, потому что пути к БД относительные
+@pytest.fixture(scope='session')
+def app_main(tmp_path_factory):
+    directory = tmp_path_factory.mktemp('app')
+    for name in ('static', 'templates'):
+        os.symlink(os.path.join(REPOSITORY, name), directory / name)
+    previous = os.getcwd()
+    os.chdir(directory)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            import main
+        yield main
+        main.job_runner.shutdown()
+    finally:
+        os.chdir(previous)
+
+
+# фабрика сессий к отдельной пустой БД со схемой (рабочую БД приложения не трогает)
+@pytest.fixture
+def sessions(app_main, tmp_path):
+    from database import Base, make_engine, sqlite_url
+
+    engine = make_engine(sqlite_url(tmp_path / 'test.db'))
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autoflush=False, autocommit=False, bind=engine)
+    engine.dispose()
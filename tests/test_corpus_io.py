@@ -0,0 +1,62 @@
+import contextlib
+import io
+import json
+
+from benchmarks.corpus import generate_recipes
+
+# выгрузка читает все таблицы одним снимком БД: рецепты, дописанные дообходом посреди выгрузки,
+# не должны попасть в нее связями без самих рецептов
+
+RECIPES = 20
+
+
+def test_export_is_consistent_while_recipes_are_written(sessions):
+    from corpus_io import iter_export_lines
+    from loader import bulk_fill_database
+
+    recipes = generate_recipes(2 * RECIPES)
+    with sessions() as db, contextlib.redirect_stdout(io.StringIO()):
+        bulk_fill_database(db, recipes[:RECIPES])
+
+    rows = {}
+    with sessions() as reader:
+        for line in iter_export_lines(reader, batch_size=5):
+            data = json.loads(line)
+            table = data.get('table')
+            if table == 'recipes' and table not in rows:
+                # таблица рецептов уже читается, связи еще нет: дописываем рецепты из другой сессии
+                with sessions() as writer, contextlib.redirect_stdout(io.StringIO()):
+                    bulk_fill_database(writer, recipes[RECIPES:])
+            if table:
+                rows.setdefault(table, []).extend(zip(*data['columns'].values()))
+            elif data.get('end'):
+                counts = data['rows']
+
+    recipe_ids = {row[0] for row in rows['recipes']}
+    assert len(recipe_ids) == counts['recipes'] == RECIPES
+    for table in ('recipe_category', 'recipe_ingredient'):
+        linked = {row[0] for row in rows[table]}
+        assert linked <= recipe_ids, f"{table}: связи рецептов {sorted(linked - recipe_ids)} без самих рецептов"
+
+
+# пока тело загрузки принимается, другой запрос успевает запустить задачу над БД: загрузка получает 409,
+# а принятый временный файл удаляется
+def test_import_conflicting_with_job_started_during_upload(app_main, tmp_path, monkeypatch):
+    import tempfile
+    import threading
+    from fastapi.testclient import TestClient
+
+    release = threading.Event()
+    job = app_main.job_runner.submit_exclusive(app_main.DATABASE_JOBS, app_main.REFILL_JOB, {},
+                                               lambda job: release.wait())
+    # проверка до приема тела прошла раньше, чем запустилась задача
+    monkeypatch.setattr(app_main, '_ensure_no_database_job', lambda: None)
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+    try:
+        with TestClient(app_main.app) as client:
+            response = client.post('/api/import', content=b'{"format": "recipes-corpus"}\n')
+    finally:
+        release.set()
+    assert response.status_code == 409, response.text
+    assert job.id in response.json()['detail']
+    assert list(tmp_path.iterdir()) == []
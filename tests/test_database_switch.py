@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from conftest import REPOSITORY
+
+# приложение в нескольких процессах: БД переключает один процесс, остальные должны заметить новый
+# файл-указатель, а файл, который еще держит другой процесс, не должен удаляться при переключении
+
+# другой процесс приложения: собирает теневую БД с recipes рецептами и переключает на нее рабочую
+SWITCH_SCRIPT = """
+import contextlib, io, sys
+import models
+from benchmarks.corpus import generate_recipes
+from database import shadow_database
+from loader import bulk_fill_database
+
+with contextlib.redirect_stdout(io.StringIO()), shadow_database() as db:
+    bulk_fill_database(db, list(generate_recipes(int(sys.argv[1]))))
+"""
+
+
+def switch_in_other_process(recipes: int):
+    env = dict(os.environ, PYTHONPATH=REPOSITORY)
+    subprocess.run([sys.executable, '-c', SWITCH_SCRIPT, str(recipes)], env=env, check=True)
+
+
+def recipe_count(client) -> int:
+    response = client.get('/api/recipes', params={'limit': 100})
+    assert response.status_code == 200, response.text
+    return len(response.json()['items'])
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="блокировки файлов БД есть только на POSIX")
+def test_other_process_picks_up_switch_and_keeps_files_in_use(app_main):
+    import database
+
+    with TestClient(app_main.app) as client:
+        switch_in_other_process(3)
+        assert recipe_count(client) == 3
+        in_use = database.db_path
+        assert os.path.basename(in_use).startswith('recipes-')
+
+        # два переключения подряд: файл, с которым работает этот процесс, становится лишним,
+        # но пока мы его держим, он остается на диске
+        switch_in_other_process(4)
+        switch_in_other_process(5)
+        assert database.db_path == in_use
+        assert os.path.exists(in_use)
+
+        assert recipe_count(client) == 5
+        assert database.db_path != in_use
+
+        # теперь файл никто не держит, и следующее переключение его удаляет
+        switch_in_other_process(6)
+        assert not os.path.exists(in_use)
+        assert recipe_count(client) == 6
+
+
+def test_ingredient_write_is_rejected_while_new_database_is_built(app_main):
+    import database
+
+    with TestClient(app_main.app) as client:
+        with database.shadow_database():
+            response = client.post('/ingredients/', json={'ingredient_name': 'кардамон'})
+            assert response.status_code == 409, response.text
+
+        response = client.post('/ingredients/', json={'ingredient_name': 'кардамон'})
+        assert response.status_code == 200, response.text
@@ -0,0 +1,68 @@
+import contextlib
+import io
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.stub_server import StubServer
+
+# страницы, которые обход не смог скачать, сохраняются в БД рядом с контрольной точкой
+# и перекачиваются POST /refill_database/retry_failed, хотя контрольная точка уже ушла дальше них
+
+PAGES = 40
+COUNT = 25
+
+
+def wait_job(client, response) -> dict:
+    assert response.status_code == 202, response.text
+    job_id = response.json()['job_id']
+    while True:
+        status = client.get(f'/refill_database/{job_id}').json()
+        if status['status'] in ('done', 'failed'):
+            return status
+        time.sleep(0.05)
+
+
+def stored_dead_letters(app_main) -> list:
+    from models import DeadLetter
+
+    with app_main.read_session_local() as db:
+        return [rid for rid, in db.query(DeadLetter.rid).order_by(DeadLetter.rid)]
+
+
+def stored_rids(app_main) -> set:
+    with app_main.read_session_local() as db:
+        return {rid for rid, in db.query(app_main.Recipe.source_rid)}
+
+
+@pytest.fixture
+def server(app_main, monkeypatch):
+    from fetcher import Fetcher
+
+    # без задержек между повторами: проверяем, что делается с неудачами, а не сколько ждем
+    monkeypatch.setattr(Fetcher, 'backoff_delay', lambda self, attempt, retry_after=None: 0.0)
+    with StubServer(pages=PAGES, error_rate=0.7, seed=1) as server, contextlib.redirect_stdout(io.StringIO()):
+        monkeypatch.setattr(app_main, 'SOURCE_URL', server.url)
+        yield server
+
+
+def test_failed_pages_are_stored_and_refetched(app_main, server):
+    with TestClient(app_main.app) as client:
+        status = wait_job(client, client.post('/refill_database/', params={
+            'count': COUNT, 'batch_size': 10, 'resume': 'false'}))
+        assert status['status'] == 'done', status
+        dead = status['progress']['dead_letters']
+        assert dead, "при error_rate=0.7 часть страниц должна остаться недокачанной"
+        assert stored_dead_letters(app_main) == dead
+        assert not set(dead) & stored_rids(app_main)
+
+        server.error_rate = 0.0
+        status = wait_job(client, client.post('/refill_database/retry_failed'))
+        assert status['status'] == 'done', status
+        assert status['progress']['retried'] == len(dead)
+        assert status['result']['parsed_recipes'] == len(dead)
+        assert status['result']['dead_letters'] == 0
+        assert stored_dead_letters(app_main) == []
+        assert set(dead) <= stored_rids(app_main)
+        assert len(stored_rids(app_main)) == COUNT + len(dead)
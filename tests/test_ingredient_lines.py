@@ -0,0 +1,69 @@
+import contextlib
+import io
+
+import pytest
+
+from entities import IngredientBase, RecipeBase
+
+# несколько строк рецепта могут вести к одному словарному ингредиенту ("Сахар" и "Сахарный песок"):
+# в recipe_ingredient остаются все строки со своими названием, количеством и единицей,
+# а различные ингредиенты считаются только там, где нужен их набор (ingredient_count)
+
+LINES = [
+    ('Масло сливочное', 100, 'г'),
+    ('Сахар', 150, 'г'),
+    ('Сахарный песок', 2, 'ст. л.'),
+    ('Масло сливочное (для смазывания формы)', 10, 'г'),
+]
+
+
+def make_recipe() -> RecipeBase:
+    return RecipeBase(
+        recipe_name='Песочное печенье', number_of_servings=4, cooking_time='1 ч', categories=['Выпечка'],
+        description='Печенье', source_rid=1,
+        ingredients=[IngredientBase(name, quantity, unit) for name, quantity, unit in LINES],
+    )
+
+
+@pytest.mark.parametrize('fill', ['bulk_fill_database', 'fill_database_rowwise'])
+def test_lines_with_same_canonical_ingredient_are_kept(sessions, fill):
+    import loader
+    from hydration import get_recipes_data
+    from models import Recipe
+
+    with sessions() as db, contextlib.redirect_stdout(io.StringIO()):
+        getattr(loader, fill)(db, [make_recipe()])
+        recipe_id = db.query(Recipe.id).scalar()
+        recipe = get_recipes_data(db, [recipe_id])[0]
+        ingredient_count = db.query(Recipe.ingredient_count).scalar()
+
+    lines = [(line['ingredient_name'], line['quantity'], line['unit']) for line in recipe['ingredients']]
+    assert sorted(lines) == sorted(LINES)
+    # масло сливочное и сахар
+    assert ingredient_count == 2
+
+
+# база, залитая до словарных названий: в ingredients названия как на сайте, raw_name пуст
+def test_vocabulary_backfill_keeps_lines_of_merged_ingredients(sessions):
+    from sqlalchemy import select
+    from loader import backfill_ingredient_vocabulary
+    from models import Ingredient, Recipe, recipe_ingredient
+
+    with sessions() as db, contextlib.redirect_stdout(io.StringIO()):
+        db.execute(Recipe.__table__.insert(), [{'id': 1, 'recipe_name': 'Блины', 'ingredient_count': 2}])
+        db.execute(Ingredient.__table__.insert(), [{'id': 1, 'ingredient_name': 'Мука пшеничная'},
+                                                   {'id': 2, 'ingredient_name': 'мука'}])
+        db.execute(recipe_ingredient.insert(), [
+            {'recipe_id': 1, 'ingredient_id': 1, 'quantity': 200, 'unit': 'г'},
+            {'recipe_id': 1, 'ingredient_id': 2, 'quantity': 2, 'unit': 'г'},
+        ])
+        db.commit()
+
+        assert backfill_ingredient_vocabulary(db) == 1
+        lines = db.execute(select(recipe_ingredient.c.ingredient_id, recipe_ingredient.c.raw_name,
+                                  recipe_ingredient.c.quantity, recipe_ingredient.c.unit)).all()
+        ingredient_count = db.query(Recipe.ingredient_count).scalar()
+
+    assert sorted(lines) == [(2, 'Мука пшеничная', 200, 'г'), (2, 'мука', 2, 'г')]
+    assert ingredient_count == 1
+
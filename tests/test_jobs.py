@@ -0,0 +1,44 @@
+import threading
+import time
+
+import pytest
+
+from jobs import JobConflict, JobRunner
+
+# задачи, меняющие рабочую БД, запускаются через submit_exclusive: из одновременных запросов
+# задачу должен запустить ровно один, остальные получают JobConflict с уже идущей задачей
+
+THREADS = 16
+
+
+def test_only_one_of_concurrent_exclusive_submits_starts():
+    runner = JobRunner(max_workers=2)
+    release = threading.Event()
+    start = threading.Barrier(THREADS)
+    started, conflicts = [], []
+
+    def submit():
+        start.wait()
+        try:
+            started.append(runner.submit_exclusive(('refill', 'import'), 'refill', {}, lambda job: release.wait()))
+        except JobConflict as e:
+            conflicts.append(e.job)
+
+    threads = [threading.Thread(target=submit) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(started) == 1
+    assert len(conflicts) == THREADS - 1
+    assert all(job is started[0] for job in conflicts)
+    with pytest.raises(JobConflict):
+        runner.submit_exclusive(('refill', 'import'), 'import', {}, lambda job: None)
+
+    # задача завершилась - следующую уже можно запустить
+    release.set()
+    while not started[0].finished:
+        time.sleep(0.01)
+    runner.submit_exclusive(('refill', 'import'), 'import', {}, lambda job: None)
+    runner.shutdown()
@@ -0,0 +1,43 @@
+import os
+import sqlite3
+
+from page_cache import PageCache
+
+# время обращения к страницам пишется в индекс не на каждое чтение, а пачкой:
+# при закрытии кэша оно не должно теряться, иначе вытеснение выбросит как раз читаемые страницы
+
+
+def accessed_at(directory) -> dict:
+    with sqlite3.connect(os.path.join(directory, 'index.sqlite')) as db:
+        return dict(db.execute('SELECT rid, accessed_at FROM pages'))
+
+
+def test_access_times_are_written_on_close(tmp_path):
+    cache = PageCache(str(tmp_path))
+    for rid in (1, 2, 3):
+        cache.put(rid, f'<html>{rid}</html>'.encode())
+    before = accessed_at(tmp_path)
+
+    assert cache.get(2).text == '<html>2</html>'
+    cache.close()
+
+    after = accessed_at(tmp_path)
+    assert after[2] > before[2]
+    assert after[1] == before[1] and after[3] == before[3]
+
+
+# размер кэша ведется счетчиком, а не пересчитывается на каждом put: после вытеснения он
+# должен совпадать с тем, что на самом деле лежит на диске
+def test_running_size_matches_files_after_eviction(tmp_path):
+    pages = {rid: os.urandom(1000) for rid in range(150)}
+    cache = PageCache(str(tmp_path), max_bytes=120 * 1000)
+    for rid, content in pages.items():
+        cache.put(rid, content)
+
+    on_disk = sum(entry.stat().st_size for entry in (tmp_path / 'blobs').rglob('*.z'))
+    assert cache.size() == on_disk <= cache.max_bytes
+    assert cache.rids() == list(range(100, 150))
+    assert cache.get(149).content == pages[149]
+    cache.close()
+
+    assert PageCache(str(tmp_path)).size() == on_disk
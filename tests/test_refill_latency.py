@@ -0,0 +1,92 @@
+import asyncio
+import contextlib
+import io
+import time
+
+import httpx
+import pytest
+
+from benchmarks.corpus import generate_recipes
+from benchmarks.stub_server import StubServer
+
+# /api/generate-recipe не должен ждать перезаполнения БД: заливка идет фоновой задачей в своем потоке,
+# а ручка читает через read_engine. Клиент ходит в приложение через ASGITransport в том же event loop,
+# поэтому любая блокирующая работа в loop сразу видна в задержке (прежняя async ручка заливки держала
+# loop все время заливки, и за это время успевал пройти один запрос)
+
+ANSWERS = {'cooking_time': 'средне', 'meal_type': '', 'difficulty': ''}
+RECIPES = 5000
+REFILL_PAGES = 150
+# p99 во время заливки не больше LATENCY_FACTOR * p99 без нее (но не строже LATENCY_FLOOR секунд)
+LATENCY_FACTOR = 5
+LATENCY_FLOOR = 0.1
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def sample_latency(client, stop: asyncio.Event, requests: int = None, interval: float = 0.01) -> list:
+    latencies = []
+    while not stop.is_set() and (requests is None or len(latencies) < requests):
+        started = time.perf_counter()
+        response = await client.post('/api/generate-recipe', json=ANSWERS)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.text
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def measure(app_main, server_url: str):
+    transport = httpx.ASGITransport(app=app_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test', timeout=120) as client:
+        idle = await sample_latency(client, asyncio.Event(), requests=100)
+
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_latency(client, stop))
+        started = time.perf_counter()
+        response = await client.post('/refill_database/', params={
+            'count': REFILL_PAGES, 'incremental': 'true', 'batch_size': 50})
+        assert response.status_code == 202, response.text
+        job_id = response.json()['job_id']
+        while True:
+            status = (await client.get(f'/refill_database/{job_id}')).json()
+            if status['status'] in ('done', 'failed'):
+                break
+            await asyncio.sleep(0.1)
+        refill_seconds = time.perf_counter() - started
+        stop.set()
+        during = await sampler
+    return idle, during, refill_seconds, status
+
+
+# своя рабочая БД: дообход идет с контрольной точки, и рецепты, залитые другими тестами, сдвинули бы ее
+# за последнюю страницу стаба
+@pytest.fixture
+def filled_app(app_main):
+    from loader import bulk_fill_database
+    from pipeline import batched
+
+    with app_main.shadow_database() as db, contextlib.redirect_stdout(io.StringIO()):
+        for batch in batched(generate_recipes(RECIPES), 1000):
+            bulk_fill_database(db, batch)
+    app_main._reload_database_state()
+    return app_main
+
+
+def test_generate_recipe_latency_stays_flat_during_refill(filled_app, monkeypatch):
+    with StubServer(pages=REFILL_PAGES, latency=0.01) as server, contextlib.redirect_stdout(io.StringIO()):
+        monkeypatch.setattr(filled_app, 'SOURCE_URL', server.url)
+        idle, during, refill_seconds, status = asyncio.run(measure(filled_app, server.url))
+
+    assert status['status'] == 'done', status
+    assert status['result']['parsed_recipes'] == REFILL_PAGES
+    # запросы шли все время заливки, а не один раз после нее
+    assert len(during) >= 20, f"за {refill_seconds:.1f} с заливки прошло всего {len(during)} запросов"
+    # ни один запрос не ждал заливку целиком
+    assert max(during) < refill_seconds / 2, f"запрос ждал {max(during):.2f} с при заливке {refill_seconds:.2f} с"
+    bound = max(LATENCY_FACTOR * percentile(idle, 0.99), LATENCY_FLOOR)
+    assert percentile(during, 0.99) <= bound, (
+        f"p99 во время заливки {percentile(during, 0.99) * 1000:.1f} мс, "
+        f"без заливки {percentile(idle, 0.99) * 1000:.1f} мс")
@@ -0,0 +1,128 @@
+import contextlib
+import io
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.stub_server import StubServer
+
+# полное перезаполнение, упавшее посреди заливки, оставляет теневую БД с закоммиченными пачками,
+# и следующее полное перезаполнение продолжает ее с контрольной точки, а не качает все заново
+
+PAGES = 60
+BATCH_SIZE = 20
+
+
+def run_refill(client, **params) -> dict:
+    response = client.post('/refill_database/', params=dict(count=PAGES, batch_size=BATCH_SIZE, **params))
+    assert response.status_code == 202, response.text
+    return wait_refill(client, response.json()['job_id'])
+
+
+def wait_refill(client, job_id: str) -> dict:
+    while True:
+        status = client.get(f'/refill_database/{job_id}').json()
+        if status['status'] in ('done', 'failed'):
+            return status
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def client(app_main, monkeypatch):
+    with StubServer(pages=PAGES) as server, contextlib.redirect_stdout(io.StringIO()):
+        monkeypatch.setattr(app_main, 'SOURCE_URL', server.url)
+        with TestClient(app_main.app) as client:
+            yield client
+
+
+def test_failed_full_refill_resumes_from_kept_shadow(app_main, client, monkeypatch):
+    import database
+    import pipeline
+
+    fill_database = pipeline.fill_database
+    calls = []
+
+    # третья пачка падает: две пачки уже закоммичены в теневую БД
+    def failing_fill_database(db, batch, *args, **kwargs):
+        calls.append(len(batch))
+        if len(calls) == 3:
+            raise RuntimeError("обрыв заливки")
+        return fill_database(db, batch, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline, 'fill_database', failing_fill_database)
+    working = database.db_path
+    status = run_refill(client)
+    assert status['status'] == 'failed', status
+    assert database.db_path == working
+    shadow = database.unfinished_shadow_path()
+    assert shadow is not None and os.path.exists(shadow)
+
+    monkeypatch.setattr(pipeline, 'fill_database', fill_database)
+    status = run_refill(client)
+    assert status['status'] == 'done', status
+    assert status['progress']['resumed'] == 2 * BATCH_SIZE
+    assert status['progress']['start_rid'] == 2 * BATCH_SIZE + 1
+    assert status['result']['parsed_recipes'] == PAGES
+    assert database.db_path == shadow
+    assert database.unfinished_shadow_path() is None
+    with app_main.read_session_local() as db:
+        assert db.query(app_main.Recipe).count() == PAGES
+
+
+def test_refill_without_resume_discards_kept_shadow(app_main, client, monkeypatch):
+    import database
+    import pipeline
+
+    fill_database = pipeline.fill_database
+    calls = []
+
+    def failing_fill_database(db, batch, *args, **kwargs):
+        calls.append(len(batch))
+        if len(calls) == 2:
+            raise RuntimeError("обрыв заливки")
+        return fill_database(db, batch, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline, 'fill_database', failing_fill_database)
+    assert run_refill(client)['status'] == 'failed'
+    shadow = database.unfinished_shadow_path()
+    assert shadow is not None
+
+    monkeypatch.setattr(pipeline, 'fill_database', fill_database)
+    status = run_refill(client, resume='false')
+    assert status['status'] == 'done', status
+    assert 'resumed' not in status['progress']
+    assert status['progress']['start_rid'] == 1
+    assert status['result']['parsed_recipes'] == PAGES
+    assert database.unfinished_shadow_path() is None
+
+
+# другой процесс продолжает недозалитую БД: перезаполнение с resume=false ждет конца его сборки,
+# а не удаляет файл у него из-под ног
+def test_discard_waits_for_build_in_progress(app_main, client, monkeypatch):
+    import database
+    import pipeline
+
+    def failing_fill_database(db, batch, *args, **kwargs):
+        raise RuntimeError("обрыв заливки")
+
+    fill_database = pipeline.fill_database
+    monkeypatch.setattr(pipeline, 'fill_database', failing_fill_database)
+    assert run_refill(client)['status'] == 'failed'
+    monkeypatch.setattr(pipeline, 'fill_database', fill_database)
+    shadow = database.unfinished_shadow_path()
+
+    with pytest.raises(RuntimeError):
+        with database.shadow_database(resumable=True):
+            response = client.post('/refill_database/', params={
+                'count': PAGES, 'batch_size': BATCH_SIZE, 'resume': 'false'})
+            assert response.status_code == 202, response.text
+            time.sleep(0.5)
+            assert os.path.exists(shadow)
+            assert client.get(f"/refill_database/{response.json()['job_id']}").json()['status'] == 'running'
+            raise RuntimeError("сборка другого процесса упала")
+
+    status = wait_refill(client, response.json()['job_id'])
+    assert status['status'] == 'done', status
+    assert status['result']['parsed_recipes'] == PAGES